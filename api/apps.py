@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        if getattr(settings, 'METRICS_ENABLED', True):
+            from grocery_pos_backend import metrics
+            connection_created.connect(metrics.install_query_recorder, dispatch_uid='metrics.record_query')
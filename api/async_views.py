@@ -0,0 +1,187 @@
+"""
+Async versions of the read-heavy endpoints, served by the ASGI entry point.
+
+Each view runs on the event loop: the user comes from the authentication
+cache (when a shared cache is configured), scans from the scan cache's local tier, and database work goes through
+Django's async query API. A request waiting on the database or on a slow
+terminal holds a coroutine instead of a whole worker. Django 4.2 still runs
+each query on a thread, so the gain is in concurrency, not per-request time.
+
+Responses match the DRF views they stand in for: same paths and URL names,
+pagination, ETags and JSON rendering. Other methods on a shared URL (e.g.
+POST to the product list) are handed to the DRF view.
+"""
+import math
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+from grocery_pos_backend.metrics import JSONRenderer
+from products import conditional, scan_cache, search
+from products.models import InventorySummary, Product
+from products.serializers import InventorySerializer, ProductByIdSerializer
+from products.views import InventoryViewSet, ProductPagination, ProductViewSet, parse_limit
+from sales import receipts, views as sales_views
+from sales.serializers import ProductSerializer
+from users.authentication import CachedJWTAuthentication
+
+
+def render(data, status=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), content_type="application/json", status=status)
+
+
+def not_found(detail="Not found."):
+    return render({"detail": detail}, status=status.HTTP_404_NOT_FOUND)
+
+
+async def paginate(request, queryset, serializer_class):
+    """ProductPagination (page number) for an async view; same response shape and errors."""
+    page_size = ProductPagination.page_size
+    try:
+        requested = int(request.GET[ProductPagination.page_size_query_param])
+        if requested > 0:
+            page_size = min(requested, ProductPagination.max_page_size)
+    except (KeyError, ValueError):
+        pass
+
+    count = await queryset.acount()
+    pages = max(1, math.ceil(count / page_size))
+    param = ProductPagination.page_query_param
+    number = request.GET.get(param, 1)
+    if number in ProductPagination.last_page_strings:
+        number = pages
+    try:
+        number = int(number)
+    except ValueError:
+        number = 0
+    if not 1 <= number <= pages:
+        return not_found("Invalid page.")
+
+    offset = (number - 1) * page_size
+    objects = [obj async for obj in queryset[offset:offset + page_size]]
+    url = request.build_absolute_uri()
+    if number == 1:
+        previous = None
+    elif number == 2:
+        previous = remove_query_param(url, param)
+    else:
+        previous = replace_query_param(url, param, number - 1)
+    return render({
+        "count": count,
+        "next": replace_query_param(url, param, number + 1) if number < pages else None,
+        "previous": previous,
+        "results": serializer_class(objects, many=True).data,
+    })
+
+
+class AsyncReadView(View):
+    """GET/HEAD served natively async behind the same JWT authentication as the API.
+
+    `fallback` is the DRF view that handles any other method on the URL;
+    `validators` (see products.conditional) make GETs answer 304 when unchanged.
+    """
+
+    authentication = CachedJWTAuthentication()
+    fallback = None
+    validators = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Token-authenticated, like the DRF views (which are csrf-exempt too).
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") and self.fallback is not None:
+            return await sync_to_async(self.fallback)(request, *args, **kwargs)
+        try:
+            auth = await self.authentication.aauthenticate(request)
+        except AuthenticationFailed as exc:
+            return self.unauthorized(request, exc.detail)
+        if auth is None:
+            return self.unauthorized(request, "Authentication credentials were not provided.")
+        request.user, request.auth = auth
+        if self.validators is None:
+            return await super().dispatch(request, *args, **kwargs)
+        etag, last_modified = await sync_to_async(self.validators)(request, *args, **kwargs)
+        response = conditional.not_modified(request, etag, last_modified)
+        if response is None:
+            response = await super().dispatch(request, *args, **kwargs)
+        return conditional.set_validators(response, etag, last_modified)
+
+    def unauthorized(self, request, detail):
+        response = render(detail if isinstance(detail, dict) else {"detail": detail},
+                          status=status.HTTP_401_UNAUTHORIZED)
+        response["WWW-Authenticate"] = self.authentication.authenticate_header(request)
+        return response
+
+
+class ProductListView(AsyncReadView):
+    fallback = staticmethod(ProductViewSet.as_view({"get": "list", "post": "create"}))
+    validators = staticmethod(conditional.products)
+
+    async def get(self, request):
+        return await paginate(request, ProductViewSet.queryset.all(), ProductByIdSerializer)
+
+
+class ProductSearchView(AsyncReadView):
+    validators = staticmethod(conditional.products)
+
+    async def get(self, request):
+        # The ranked search combines several queries; it runs as one unit on a thread.
+        products = await sync_to_async(search.search_products)(
+            request.GET.get("q", ""), limit=parse_limit(request.GET.get("limit"), 20)
+        )
+        return render(ProductByIdSerializer(products, many=True).data)
+
+
+class ProductAutocompleteView(AsyncReadView):
+    validators = staticmethod(conditional.products)
+
+    async def get(self, request):
+        products = await sync_to_async(search.autocomplete)(
+            request.GET.get("q", ""), limit=parse_limit(request.GET.get("limit"), 10)
+        )
+        return render([{"id": p.id, "name": p.name, "sku": p.sku, "barcode": p.barcode} for p in products])
+
+
+class InventoryListView(AsyncReadView):
+    fallback = staticmethod(InventoryViewSet.as_view({"get": "list", "post": "create"}))
+    validators = staticmethod(conditional.inventory)
+
+    async def get(self, request):
+        return await paginate(request, InventoryViewSet.queryset.all(), InventorySerializer)
+
+
+class InventorySummaryView(AsyncReadView):
+    async def get(self, request):
+        return render(await InventorySummary.objects.atotals())
+
+
+class SaleProductListView(AsyncReadView):
+    async def get(self, request):
+        queryset = await sync_to_async(sales_views.ProductListView.filter_products)(
+            Product.objects.select_related("inventory"), request.GET.get("search"), request.GET.get("barcode")
+        )
+        return render(ProductSerializer([product async for product in queryset], many=True).data)
+
+
+class ProductScanView(AsyncReadView):
+    async def get(self, request, code):
+        product = await scan_cache.alookup(code)
+        if product is None:
+            return not_found("Product not found.")
+        return render(product)
+
+
+class ReceiptDetailView(AsyncReadView):
+    async def get(self, request, sale_id):
+        payload = await receipts.afor_sale(sale_id)
+        if payload is None:
+            return not_found()
+        return render(payload)
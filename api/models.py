@@ -1,3 +1,12 @@
 from django.db import models
 
-# Create your models here.
+
+class NumberSequence(models.Model):
+    """High-water mark of a document number sequence; workers reserve blocks from it (see api.numbering)."""
+
+    name = models.CharField(max_length=100, unique=True)
+    next_value = models.BigIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: next block starts at {self.next_value}"
@@ -0,0 +1,120 @@
+"""
+Collision-free document numbers (invoices, purchase orders).
+
+Each named sequence lives in one NumberSequence row. A worker reserves a block
+of NUMBER_BLOCK_SIZE values with a single atomic upsert and then hands them
+out from memory, so most allocations need no database round trip. Numbers are
+unique across workers and restarts and increase monotonically within a worker;
+values left in a block when a worker exits are skipped, never reused.
+
+Reservations run on a dedicated autocommit connection, so a block stays
+reserved even if the transaction that needed the number rolls back. SQLite
+allows only one writer, so there the request's own transaction reserves one
+number at a time: a rollback returns the number to the sequence, and no block
+is held that another process could reserve again.
+"""
+import os
+import re
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils import timezone
+
+from .models import NumberSequence
+
+CODE = re.compile(r"^[A-Za-z0-9]{1,8}$")
+
+
+class BlockAllocator:
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._blocks = {}
+        self._connection = None
+
+    def next(self, name):
+        with self._lock:
+            block = self._blocks.get(name)
+            if block is None or block[0] >= block[1]:
+                start, size = self._reserve(name)
+                block = self._blocks[name] = [start, start + size]
+            value = block[0]
+            block[0] += 1
+            return value
+
+    def reset(self):
+        """Forget reserved blocks; called in forked children so they never share a parent's block."""
+        self._lock = threading.Lock()
+        self._blocks = {}
+        self._connection = None
+
+    def _dedicated_connection(self):
+        if self._connection is None:
+            self._connection = connections.create_connection(DEFAULT_DB_ALIAS)
+            # Shared by every thread of the worker; access is serialized by self._lock.
+            self._connection.inc_thread_sharing()
+        return self._connection
+
+    def _reserve(self, name):
+        """Reserve the next block of sequence `name`; returns (first value, size)."""
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor == "sqlite":
+            return reserve(name, 1, connection), 1
+        for attempt in range(2):
+            connection = self._dedicated_connection()
+            try:
+                return reserve(name, self.block_size, connection), self.block_size
+            except DatabaseError:
+                # A dropped dedicated connection is replaced once.
+                if connection is not self._connection or attempt:
+                    raise
+                connection.close()
+                self._connection = None
+
+
+def reserve(name, count, connection):
+    """Advance sequence `name` by `count` with one upsert; returns the first value reserved.
+
+    The sequence row stays locked until `connection` commits.
+    """
+    table = NumberSequence._meta.db_table
+    sql = (
+        f"INSERT INTO {table} (name, next_value, updated_at) VALUES (%s, %s, %s) "
+        f"ON CONFLICT (name) DO UPDATE SET next_value = {table}.next_value + %s, "
+        f"updated_at = excluded.updated_at RETURNING next_value"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [name, 1 + count, timezone.now(), count])
+        return cursor.fetchone()[0] - count
+
+
+def last_value(name):
+    """The highest value reserved from sequence `name` so far (0 before the first reservation)."""
+    next_value = NumberSequence.objects.filter(name=name).values_list("next_value", flat=True).first()
+    return next_value - 1 if next_value else 0
+
+
+allocator = BlockAllocator(getattr(settings, "NUMBER_BLOCK_SIZE", 100))
+os.register_at_fork(after_in_child=allocator.reset)
+
+
+def _code(value, default):
+    value = (value or "").strip()
+    return value if CODE.match(value) else default
+
+
+def next_invoice_number(register=None):
+    """INV-<store>-<register>-<sequence>, numbered per store and configured register (REGISTER_CODES)."""
+    store = _code(getattr(settings, "STORE_CODE", ""), "01")
+    register = (register or "").strip()
+    if register not in getattr(settings, "REGISTER_CODES", ()):
+        register = "00"
+    register = _code(register, "00")
+    return f"INV-{store}-{register}-{allocator.next(f'invoice:{store}:{register}'):08d}"
+
+
+def next_po_number():
+    """PO-<store>-<sequence>, numbered per store."""
+    store = _code(getattr(settings, "STORE_CODE", ""), "01")
+    return f"PO-{store}-{allocator.next(f'po:{store}'):07d}"
@@ -1,3 +1,314 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import date
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import override_settings
+from django.urls import resolve, reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import numbering
+from api.models import NumberSequence
+from grocery_pos_backend.db_pool import pool as db_pool
+from grocery_pos_backend.metrics import registry
+from procurement.models import PurchaseOrder
+from products import scan_cache
+from products.models import Category, Inventory, Product
+from suppliers.models import ProductSupplier, Supplier
+from users.models import User
+
+
+class MetricsTestCase(APITestCase):
+    def setUp(self):
+        registry.reset()
+        self.user = User.objects.create_user(username='ops', password='testpass', role='admin', name='Ops', email='ops@example.com', is_staff=True)
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            category = Category.objects.create(name='Pantry')
+            Product.objects.create(name='Rice', sku='RICE1', category=category, price=5, cost=3)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", render;dur=[\d.]+$')
+        self.assertNotIn('desc="0 queries"', timing)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('product-list'))
+        self.client.get(reverse('product-list'))
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_count{route="product-list",method="GET",status="200"} 2', body)
+        self.assertIn('http_request_sql_queries_bucket{route="product-list",method="GET",status="200",le="+Inf"} 2', body)
+        self.assertIn('http_request_render_duration_seconds_sum{route="product-list"', body)
+
+    def test_metrics_are_summed_across_processes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        exited = subprocess.Popen([sys.executable, '-c', ''])
+        exited.wait()
+        for pid, count, waiting in ((os.getppid(), 3, 4), (exited.pid, 1, 5)):
+            with open(os.path.join(directory, f'{pid}.prom'), 'w') as handle:
+                handle.write(
+                    '# HELP http_request_duration_seconds Wall time per request.\n'
+                    '# TYPE http_request_duration_seconds histogram\n'
+                    f'http_request_duration_seconds_count{{route="product-list",method="GET",status="200"}} {count}\n'
+                    '# HELP db_pool_waiting Callers waiting for a pooled connection.\n'
+                    '# TYPE db_pool_waiting gauge\n'
+                    f'db_pool_waiting{{pool="other"}} {waiting}\n'
+                )
+        with self.settings(METRICS_MULTIPROC_DIR=directory):
+            self.client.get(reverse('product-list'))
+            self.client.get(reverse('product-list'))
+            body = self.client.get('/metrics').content.decode()
+        self.assertEqual(body.count('# TYPE http_request_duration_seconds histogram'), 1)
+        # Counters of every process, gauges of live ones only.
+        self.assertIn('http_request_duration_seconds_count{route="product-list",method="GET",status="200"} 6', body)
+        self.assertIn('db_pool_waiting{pool="other"} 4\n', body)
+        self.assertIn(f'{os.getpid()}.prom', os.listdir(directory))
+
+    @override_settings(ROOT_URLCONF='grocery_pos_backend.asgi_urls')
+    async def test_queries_are_counted_under_asgi(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        # Concurrent requests on one event loop count their own queries only.
+        responses = await asyncio.gather(*[
+            self.async_client.get(reverse('product-list'), headers=headers) for _ in range(3)
+        ])
+        counts = {re.search(r'desc="(\d+) queries"', response['Server-Timing']).group(1) for response in responses}
+        self.assertEqual(len(counts), 1)
+        self.assertGreater(int(counts.pop()), 0)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_metrics_are_staff_only_without_a_token(self):
+        cashier = User.objects.create_user(username='till', password='testpass', role='cashier', name='Till', email='till@example.com')
+        for user in (None, cashier):
+            self.client.force_authenticate(user=user)
+            self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=None)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class NumberAllocatorTestCase(APITestCase):
+    def setUp(self):
+        self.allocator = numbering.BlockAllocator(block_size=3)
+
+    @unittest.skipIf(connection.vendor == 'sqlite', 'SQLite reserves one number at a time')
+    def test_blocks_are_reserved_and_never_reused(self):
+        values = [self.allocator.next('test') for _ in range(4)]
+        self.assertEqual(values, [1, 2, 3, 4])
+        self.assertEqual(NumberSequence.objects.get(name='test').next_value, 7)
+
+        # A restarted worker skips the rest of the block it had reserved.
+        self.allocator.reset()
+        self.assertEqual(self.allocator.next('test'), 7)
+        other = numbering.BlockAllocator(block_size=3)
+        self.assertEqual(other.next('test'), 10)
+        self.assertEqual(self.allocator.next('other'), 1)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'Blocks are reserved outside the transaction')
+    def test_sqlite_numbers_roll_back_with_the_transaction(self):
+        with self.assertRaises(ValueError), transaction.atomic():
+            self.assertEqual(self.allocator.next('test'), 1)
+            raise ValueError('checkout failed')
+        self.assertFalse(NumberSequence.objects.filter(name='test').exists())
+        self.assertEqual([self.allocator.next('test') for _ in range(2)], [1, 2])
+        self.assertEqual(NumberSequence.objects.get(name='test').next_value, 3)
+
+    @override_settings(REGISTER_CODES=['R7'])
+    def test_document_numbers(self):
+        numbering.allocator.reset()
+        user = User.objects.create_user(username='buyer', password='testpass', role='manager', name='Buyer', email='buyer@example.com')
+        self.client.force_authenticate(user=user)
+        product = Product.objects.create(name='Rice', sku='RICE1', price=5, cost=3)
+        Inventory.objects.create(product=product, quantity=10)
+        data = {'items': [{'product_id': product.id, 'quantity': 1, 'unit_price': '5', 'total_price': '5'}],
+                'payment_method': 'cash'}
+        invoices = [
+            self.client.post(reverse('create-sale'), data, format='json', HTTP_X_REGISTER_ID='R7').data['invoice_number']
+            for _ in range(2)
+        ]
+        self.assertEqual(invoices, ['INV-01-R7-00000001', 'INV-01-R7-00000002'])
+        # Unconfigured registers share the default series rather than starting their own.
+        unknown = self.client.post(reverse('create-sale'), data, format='json', HTTP_X_REGISTER_ID='R8').data['invoice_number']
+        self.assertEqual(unknown, 'INV-01-00-00000001')
+        self.assertFalse(NumberSequence.objects.filter(name__endswith=':R8').exists())
+
+        supplier = Supplier.objects.create(name='Acme', contact_person='A', phone='1', email='a@example.com', address='x')
+        order = PurchaseOrder.objects.create(supplier=supplier, user=user, order_date=date.today(), expected_delivery_date=date.today())
+        self.assertEqual(order.po_number, 'PO-01-0000001')
+
+
+class AsyncReadViewTestCase(APITestCase):
+    ASGI_URLS = 'grocery_pos_backend.asgi_urls'
+
+    def setUp(self):
+        cache.clear()
+        scan_cache.local_cache.clear()
+        self.user = User.objects.create_user(username='lane1', password='testpass', role='cashier', name='Lane 1', email='lane1@example.com')
+        self.auth = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.client.credentials(HTTP_AUTHORIZATION=self.auth['Authorization'])
+        category = Category.objects.create(name='Dairy')
+        supplier = Supplier.objects.create(name='Farm', contact_person='F', phone='1', email='farm@example.com', address='x')
+        self.products = []
+        for i in range(12):
+            product = Product.objects.create(name=f'Milk {i}', sku=f'MILK{i}', barcode=f'400{i:04d}', category=category, price=2, cost=1)
+            Inventory.objects.create(product=product, quantity=i, reorder_level=5)
+            ProductSupplier.objects.create(product=product, supplier=supplier, supplier_sku=f'F-{i}')
+            self.products.append(product)
+        data = {'items': [{'product_id': self.products[3].id, 'quantity': 1, 'unit_price': '2', 'total_price': '2'}],
+                'payment_method': 'cash'}
+        self.sale_id = self.client.post(reverse('create-sale'), data, format='json').data['id']
+
+    async def async_get(self, path, **kwargs):
+        with self.settings(ROOT_URLCONF=self.ASGI_URLS):
+            return await self.async_client.get(path, **kwargs)
+
+    async def test_async_views_match_drf_views(self):
+        paths = [
+            reverse('product-list'),
+            reverse('product-list') + '?page=2&page_size=5',
+            reverse('product-search') + '?q=milk&limit=3',
+            reverse('product-autocomplete') + '?q=mil',
+            reverse('inventory-list') + '?page=2',
+            reverse('inventory-summary'),
+            reverse('products') + '?search=milk',
+            reverse('product-scan', kwargs={'code': '4000007'}),
+            reverse('sale-receipt', kwargs={'sale_id': self.sale_id}),
+            reverse('product-list') + '?page=9',
+            reverse('product-scan', kwargs={'code': 'nope'}),
+        ]
+        for path in paths:
+            with self.subTest(path=path):
+                self.assertTrue(asyncio.iscoroutinefunction(resolve(path.split('?')[0], urlconf=self.ASGI_URLS).func))
+                expected = await sync_to_async(self.client.get)(path)
+                response = await self.async_get(path, headers=self.auth)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(json.loads(response.content), json.loads(expected.content))
+                self.assertEqual(response.get('ETag'), expected.get('ETag'))
+                self.assertIn('Server-Timing', response)
+
+    async def test_unchanged_reads_answer_not_modified(self):
+        path = reverse('inventory-list') + '?page=2'
+        etag = (await self.async_get(path, headers=self.auth))['ETag']
+        response = await self.async_get(path, headers={**self.auth, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    async def test_authentication_is_required(self):
+        response = await self.async_get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        response = await self.async_get(reverse('inventory-summary'), headers={'Authorization': 'Bearer bogus'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(json.loads(response.content)['code'], 'token_not_valid')
+
+    async def test_writes_fall_through_to_drf(self):
+        with self.settings(ROOT_URLCONF=self.ASGI_URLS):
+            response = await self.async_client.post(
+                reverse('product-list'), {'name': 'Cream', 'sku': 'CREAM1', 'price': '3', 'cost': '1'},
+                content_type='application/json', headers=self.auth,
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(await Product.objects.filter(sku='CREAM1').aexists())
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.healthy = True
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTestCase(APITestCase):
+    def make_pool(self, **options):
+        self.connections = []
+        options = {'size': 2, 'timeout': 0.05, **options}
+        return db_pool.ConnectionPool(
+            'test', ping=lambda c: c.healthy, reset=lambda c: c.healthy and not c.closed,
+            close=FakeConnection.close, **options
+        )
+
+    def connect(self):
+        self.connections.append(FakeConnection())
+        return self.connections[-1]
+
+    def test_connections_are_reused(self):
+        pool = self.make_pool()
+        first = pool.checkout(self.connect)
+        pool.release(first)
+        self.assertIs(pool.checkout(self.connect), first)
+        self.assertEqual(pool.stats(), {'idle': 0, 'checked_out': 1, 'waiting': 0, 'opened': 1, 'discarded': 0})
+
+    def test_broken_connections_are_discarded(self):
+        pool = self.make_pool(health_check_interval=0)
+        first = pool.checkout(self.connect)
+        first.healthy = False
+        pool.release(first)
+        self.assertTrue(first.closed)
+
+        second = pool.checkout(self.connect)
+        pool.release(second)
+        second.healthy = False  # dropped by the server while idle
+        third = pool.checkout(self.connect)
+        self.assertIsNot(third, second)
+        self.assertTrue(second.closed)
+        self.assertEqual(pool.stats()['discarded'], 2)
+
+        pool.release(third)
+        pool = self.make_pool(max_lifetime=0)
+        connection = pool.checkout(self.connect)
+        pool.release(connection)
+        self.assertTrue(connection.closed)
+
+    def test_checkout_waits_for_a_free_connection(self):
+        pool = self.make_pool(size=1)
+        held = pool.checkout(self.connect)
+        with self.assertRaises(db_pool.PoolTimeout):
+            pool.checkout(self.connect)
+
+        pool.timeout = 5
+        received = []
+        waiter = threading.Thread(target=lambda: received.append(pool.checkout(self.connect)))
+        waiter.start()
+        while not pool.stats()['waiting']:
+            pass
+        pool.release(held)
+        waiter.join()
+        self.assertEqual(received, [held])
+        self.assertEqual(len(self.connections), 1)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_pool_metrics_are_exposed(self):
+        key = ('test', 'metrics')
+        pool = db_pool.get_pool(key, lambda: self.make_pool())
+        self.addCleanup(db_pool._pools.pop, key)
+        pool.checkout(self.connect)
+        body = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').content.decode()
+        self.assertIn('db_pool_connections_checked_out{pool="test"} 1', body)
+        self.assertIn('db_pool_waiting{pool="test"} 0', body)
+        self.assertIn('db_pool_wait_seconds_count{pool="test"} 1', body)
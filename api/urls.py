@@ -13,6 +13,8 @@ urlpatterns = [
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("products/", include("products.urls")),
     path("sales/", include("sales.urls")),
+    path("procurement/", include("procurement.urls")),
+    path("suppliers/", include("suppliers.urls")),
     path('schema/', SpectacularAPIView.as_view(), name='schema'),
     path('swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     path('redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
@@ -3,6 +3,17 @@ ASGI config for grocery_pos_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Under ASGI the read-heavy endpoints (product list/search, barcode scan,
+inventory list/summary, receipts) are served by async views; see
+grocery_pos_backend/asgi_urls.py. Run it with uvicorn workers under gunicorn:
+
+    gunicorn grocery_pos_backend.asgi:application -k uvicorn.workers.UvicornWorker --workers 2
+
+WSGI stays the deploy target (the Procfile and vercel.json); its command keeps
+working and serves the same API from sync views. Exports stream under both:
+under ASGI they are served from an async iterator, so they are not buffered.
+`manage.py bench_servers` compares the two deployments.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -12,5 +23,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'grocery_pos_backend.settings')
+os.environ.setdefault('DJANGO_ROOT_URLCONF', 'grocery_pos_backend.asgi_urls')
 
 application = get_asgi_application()
+
+from products import scan_cache  # noqa: E402
+
+scan_cache.warm_on_boot()
@@ -0,0 +1,26 @@
+"""
+URL configuration for the ASGI entry point.
+
+The read-heavy endpoints resolve to the async views in api.async_views, at the
+same paths and names as their DRF counterparts; everything else falls through
+to the regular URL configuration.
+"""
+
+from django.urls import path
+
+from api import async_views
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path("api/v1/products/products/", async_views.ProductListView.as_view(), name="product-list"),
+    path("api/v1/products/products/search/", async_views.ProductSearchView.as_view(), name="product-search"),
+    path("api/v1/products/products/autocomplete/", async_views.ProductAutocompleteView.as_view(),
+         name="product-autocomplete"),
+    path("api/v1/products/inventory/", async_views.InventoryListView.as_view(), name="inventory-list"),
+    path("api/v1/products/inventory/summary/", async_views.InventorySummaryView.as_view(), name="inventory-summary"),
+    path("api/v1/sales/products/", async_views.SaleProductListView.as_view(), name="products"),
+    path("api/v1/sales/products/scan/<str:code>/", async_views.ProductScanView.as_view(), name="product-scan"),
+    path("api/v1/sales/<int:sale_id>/receipt/", async_views.ReceiptDetailView.as_view(), name="sale-receipt"),
+    *sync_urlpatterns,
+]
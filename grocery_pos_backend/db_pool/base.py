@@ -0,0 +1,90 @@
+"""
+PostgreSQL backend whose connections come from a per-process pool.
+
+Use it as ENGINE "grocery_pos_backend.db_pool" with pool options under the
+database's "POOL" key (settings.py fills them from DATABASE_URL). Keep
+CONN_MAX_AGE at 0: each request then checks a connection out on first query
+and returns it when Django closes it at the end of the request.
+"""
+from functools import partial
+
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from .pool import ConnectionPool, PoolTimeout, close_pools, get_pool
+
+Database = base.Database
+
+# libpq PGTransactionStatusType values (the same in psycopg2 and psycopg 3).
+IDLE, INTRANS, INERROR = 0, 2, 3
+
+
+def ping(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except Database.Error:
+        return False
+    return True
+
+
+def reset(connection):
+    """Roll back any open transaction and restore autocommit; False if the connection is unusable."""
+    if connection.closed:
+        return False
+    try:
+        if connection.info.transaction_status in (INTRANS, INERROR):
+            connection.rollback()
+        if not connection.autocommit:
+            connection.autocommit = True
+    except Database.Error:
+        return False
+    return connection.info.transaction_status == IDLE
+
+
+def close(connection):
+    connection.close()
+
+
+def database_name(conn_params):
+    return conn_params.get("dbname", conn_params.get("database"))
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections would keep the test database open.
+        close_pools(lambda key: key[1] == test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        # Short-lived maintenance connections (test database creation) are not pooled.
+        if self.alias == NO_DB_ALIAS:
+            return super().get_new_connection(conn_params)
+        options = self.settings_dict.get("POOL", {})
+        key = (self.alias, database_name(conn_params), repr(sorted(conn_params.items())))
+        self.pool = get_pool(key, partial(ConnectionPool, self.alias, ping, reset, close, **options))
+        try:
+            connection = self.pool.checkout(partial(super().get_new_connection, conn_params))
+        except PoolTimeout as exc:
+            raise Database.OperationalError(str(exc)) from exc
+        # The parent sets this only when it opens a connection; a reused one
+        # keeps the level it was opened with.
+        level = self.settings_dict["OPTIONS"].get("isolation_level")
+        self.isolation_level = IsolationLevel.READ_COMMITTED if level is None else IsolationLevel(level)
+        return connection
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Django keeps using the handle until the atomic block exits; never hand it out meanwhile.
+                self.pool.discard(self.connection)
+            else:
+                self.pool.release(self.connection)
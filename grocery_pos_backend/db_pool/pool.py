@@ -0,0 +1,234 @@
+"""
+Process-wide database connection pool.
+
+One pool per database (and per worker process) is shared by every thread of
+a WSGI worker and every request context of an ASGI worker. Django still opens
+and closes its connections per request (CONN_MAX_AGE = 0); with the pooled
+backend "open" checks a connection out and "close" returns it, so the TCP,
+authentication and backend start-up cost is paid once per pooled connection.
+
+Idle connections are pinged before reuse once they have been idle longer than
+`health_check_interval`, recycled after `max_lifetime` and closed after
+`max_idle_time` unused. A connection that comes back broken or stuck in a
+transaction it cannot roll back is discarded. When all `size` connections
+are checked out, callers wait up to `timeout` seconds for one.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from ..metrics import DURATION_BUCKETS, Histogram, collectors
+
+WAIT_BUCKETS = (0.0001, 0.001, *DURATION_BUCKETS)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, name, ping, reset, close, size=10, timeout=10.0,
+                 health_check_interval=30.0, max_lifetime=1800.0, max_idle_time=600.0):
+        self.name = name
+        self.ping = ping
+        self.reset = reset
+        self.close_connection = close
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_lifetime = max_lifetime
+        self.max_idle_time = max_idle_time
+        self.closed = False
+
+        self._cond = threading.Condition()
+        # (connection, created, last used); reused from the right so rarely used ones age out.
+        self._idle = deque()
+        # id(connection) -> created
+        self._checked_out = {}
+        # Connections in existence or being opened, counted against `size`.
+        self._count = 0
+        self.waiting = 0
+        self.opened = 0
+        self.discarded = 0
+        self.wait_time = Histogram(
+            "db_pool_wait_seconds", "Time spent waiting to check out a pooled connection.", WAIT_BUCKETS)
+
+    def checkout(self, connect):
+        """Return an idle connection, or one from `connect()` if the pool has room; wait otherwise."""
+        started = time.monotonic()
+        while True:
+            connection, created, last_used = self._acquire(started + self.timeout)
+            if connection is None:
+                try:
+                    connection = connect()
+                except BaseException:
+                    self._release_slot()
+                    raise
+                created = time.monotonic()
+                with self._cond:
+                    self.opened += 1
+            elif time.monotonic() - last_used > self.health_check_interval and not self.ping(connection):
+                self._discard(connection)
+                continue
+            break
+
+        with self._cond:
+            self._checked_out[id(connection)] = created
+            self.wait_time.observe((self.name,), time.monotonic() - started)
+        return connection
+
+    def release(self, connection):
+        """Take a connection back; broken, expired or unresettable ones are closed instead."""
+        with self._cond:
+            created = self._checked_out.pop(id(connection), None)
+        if created is None:
+            # Not checked out from this pool (e.g. the pool was replaced after a fork).
+            self._close_quietly(connection)
+            return
+        now = time.monotonic()
+        if self.closed or now - created > self.max_lifetime or not self.reset(connection):
+            self._discard(connection)
+            return
+        with self._cond:
+            self._idle.append((connection, created, now))
+            self._cond.notify()
+
+    def discard(self, connection):
+        """Close a checked-out connection instead of returning it."""
+        with self._cond:
+            self._checked_out.pop(id(connection), None)
+        self._discard(connection)
+
+    def close(self):
+        """Close idle connections; checked-out ones are closed when they come back."""
+        with self._cond:
+            self.closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._count -= len(idle)
+            self._cond.notify_all()
+        for connection, _, _ in idle:
+            self._close_quietly(connection)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "idle": len(self._idle),
+                "checked_out": len(self._checked_out),
+                "waiting": self.waiting,
+                "opened": self.opened,
+                "discarded": self.discarded,
+            }
+
+    def _acquire(self, deadline):
+        with self._cond:
+            while True:
+                if self.closed:
+                    raise PoolTimeout(f"Connection pool {self.name} is closed")
+                now = time.monotonic()
+                while self._idle:
+                    connection, created, last_used = self._idle.pop()
+                    if now - created <= self.max_lifetime and now - last_used <= self.max_idle_time:
+                        return connection, created, last_used
+                    self._count -= 1
+                    self.discarded += 1
+                    self._close_quietly(connection)
+                if self._count < self.size:
+                    self._count += 1
+                    return None, None, None
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        f"No connection available in pool {self.name} "
+                        f"({self.size} checked out) after {self.timeout}s"
+                    )
+                self.waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+
+    def _release_slot(self):
+        with self._cond:
+            self._count -= 1
+            self._cond.notify()
+
+    def _discard(self, connection):
+        self._close_quietly(connection)
+        with self._cond:
+            self._count -= 1
+            self.discarded += 1
+            self._cond.notify()
+
+    def _close_quietly(self, connection):
+        try:
+            self.close_connection(connection)
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Connections inherited from a parent process. They are never closed here (closing
+# would end the parent's session on the shared socket) and are kept referenced so
+# garbage collection does not close them either.
+_inherited = []
+
+
+def get_pool(key, factory):
+    """The live pool for `key`, created with `factory()` on first use."""
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.closed:
+            pool = _pools[key] = factory()
+        return pool
+
+
+def close_pools(predicate):
+    """Close every pool for which `predicate(key)` is true."""
+    with _pools_lock:
+        pools = [pool for key, pool in _pools.items() if predicate(key)]
+    for pool in pools:
+        pool.close()
+
+
+def _after_fork():
+    global _pools_lock
+    _pools_lock = threading.Lock()
+    for pool in _pools.values():
+        _inherited.extend(connection for connection, _, _ in pool._idle)
+    _pools.clear()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def render_metrics():
+    with _pools_lock:
+        pools = list(_pools.values())
+    lines = [
+        "# HELP db_pool_size Maximum connections per pool.",
+        "# TYPE db_pool_size gauge",
+        *(f'db_pool_size{{pool="{pool.name}"}} {pool.size}' for pool in pools),
+    ]
+    stats = [(pool, pool.stats()) for pool in pools]
+    for name, kind, documentation, value in (
+        ("db_pool_connections_idle", "gauge", "Idle pooled connections.", "idle"),
+        ("db_pool_connections_checked_out", "gauge", "Pooled connections in use.", "checked_out"),
+        ("db_pool_waiting", "gauge", "Callers waiting for a pooled connection.", "waiting"),
+        ("db_pool_connections_opened_total", "counter", "Connections opened by the pool.", "opened"),
+        ("db_pool_connections_discarded_total", "counter",
+         "Connections closed as broken, expired or idle.", "discarded"),
+    ):
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f'{name}{{pool="{pool.name}"}} {values[value]}' for pool, values in stats)
+    for pool in pools:
+        with pool._cond:
+            histogram = pool.wait_time.render(("pool",))
+        # HELP/TYPE once, however many pools there are.
+        lines.extend(histogram if pool is pools[0] else histogram[2:])
+    return lines
+
+
+collectors.append(render_metrics)
@@ -0,0 +1,321 @@
+"""
+Per-request performance instrumentation.
+
+MetricsMiddleware times every request and records the SQL query count and
+time and the time spent rendering the response body (JSONRenderer below, the
+API's default renderer; serializer .data built in a view counts as view
+time). Queries are
+counted by an execute wrapper installed once on every database connection as
+it opens (so it works with DEBUG off). The wrapper reports to the request in
+the current context, so queries an async view runs in a thread through
+sync_to_async count towards that request and no other. Each response carries a
+Server-Timing header, and the observations are aggregated into in-process
+histograms that `metrics_view` serves in the Prometheus text format.
+
+Several worker processes behind one port share METRICS_MULTIPROC_DIR: each
+writes its own exposition there at most once a second, and a scrape served by
+any of them sums every process's samples. Gauges of processes that have exited
+are left out; their counters and histograms are kept, so totals never go
+backwards. Empty the directory when the server starts.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework import renderers
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+_current = ContextVar("request_metrics", default=None)
+# Seconds between writes of this process's exposition to METRICS_MULTIPROC_DIR.
+FLUSH_INTERVAL = 1.0
+HISTOGRAM_SUFFIXES = ("_bucket", "_sum", "_count")
+
+
+class RequestMetrics:
+    __slots__ = ("queries", "sql_time", "render_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self, label_names):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self.series.items()):
+            base = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(label_names, labels))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {total}")
+            lines.append(f"{self.name}_count{{{base}}} {cumulative}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    LABELS = ("route", "method", "status")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {
+            "duration": Histogram(
+                "http_request_duration_seconds", "Wall time per request.", DURATION_BUCKETS),
+            "queries": Histogram(
+                "http_request_sql_queries", "SQL queries per request.", QUERY_BUCKETS),
+            "sql_time": Histogram(
+                "http_request_sql_duration_seconds", "SQL time per request.", DURATION_BUCKETS),
+            "render_time": Histogram(
+                "http_request_render_duration_seconds", "Response rendering time per request.", DURATION_BUCKETS),
+        }
+
+    def record(self, labels, **observations):
+        with self._lock:
+            for name, value in observations.items():
+                self.histograms[name].observe(labels, value)
+
+    def render(self):
+        with self._lock:
+            lines = [line for histogram in self.histograms.values() for line in histogram.render(self.LABELS)]
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            for histogram in self.histograms.values():
+                histogram.series.clear()
+
+
+registry = MetricsRegistry()
+# Callables returning extra exposition lines (e.g. the database pool gauges) for metrics_view.
+collectors = []
+
+
+def exposition():
+    """This process's metrics in the Prometheus text format."""
+    return registry.render() + "".join(f"{line}\n" for collect in collectors for line in collect())
+
+
+_flush_lock = threading.Lock()
+_last_flush = 0.0
+
+
+def flush(force=False):
+    """Write this process's exposition to METRICS_MULTIPROC_DIR, at most every FLUSH_INTERVAL seconds."""
+    global _last_flush
+    directory = getattr(settings, "METRICS_MULTIPROC_DIR", None)
+    if not directory or not _flush_lock.acquire(blocking=force):
+        return
+    try:
+        if not force and time.monotonic() - _last_flush < FLUSH_INTERVAL:
+            return
+        _last_flush = time.monotonic()
+        path = os.path.join(directory, f"{os.getpid()}.prom")
+        with open(f"{path}.tmp", "w") as handle:
+            handle.write(exposition())
+        # Readers see the old or the new file, never half of one.
+        os.replace(f"{path}.tmp", path)
+    finally:
+        _flush_lock.release()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def merged_exposition(directory):
+    """Every process's exposition in `directory`, with the samples of each series summed."""
+    headers, types, samples = {}, {}, {}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".prom"):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as handle:
+                lines = handle.read().splitlines()
+        except FileNotFoundError:
+            continue
+        alive = _alive(int(name[:-len(".prom")]))
+        for line in lines:
+            if line.startswith("# "):
+                _, kind, family, rest = line.split(" ", 3)
+                headers.setdefault(family, {}).setdefault(kind, line)
+                if kind == "TYPE":
+                    types[family] = rest
+                continue
+            series, _, value = line.rpartition(" ")
+            family = series.split("{", 1)[0]
+            for suffix in HISTOGRAM_SUFFIXES:
+                if family.endswith(suffix) and types.get(family[:-len(suffix)]) == "histogram":
+                    family = family[:-len(suffix)]
+            if types.get(family) == "gauge" and not alive:
+                continue
+            family_samples = samples.setdefault(family, {})
+            family_samples[series] = family_samples.get(series, 0.0) + float(value)
+    lines = []
+    for family, family_headers in headers.items():
+        lines.extend(family_headers.values())
+        lines.extend(
+            f"{series} {int(total) if total.is_integer() else total}"
+            for series, total in samples.get(family, {}).items()
+        )
+    return "\n".join(lines) + "\n"
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver: wrap each connection once, on whichever thread opens it."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """DRF's JSONRenderer, timed towards the current request's render time."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        started = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            metrics.render_time += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Record wall, SQL and render time per request; add a Server-Timing header.
+
+    Works in both WSGI and ASGI stacks, so async views are not forced onto a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    def start(self):
+        metrics = RequestMetrics()
+        return metrics, _current.set(metrics), time.perf_counter()
+
+    def finish(self, request, response, metrics, started):
+        duration = time.perf_counter() - started
+        match = request.resolver_match
+        route = match.view_name if match else "unmatched"
+        registry.record(
+            (route, request.method, str(response.status_code)),
+            duration=duration,
+            queries=metrics.queries,
+            sql_time=metrics.sql_time,
+            render_time=metrics.render_time,
+        )
+        flush()
+        response["Server-Timing"] = (
+            f"total;dur={duration * 1000:.1f}, "
+            f'db;dur={metrics.sql_time * 1000:.1f};desc="{metrics.queries} queries", '
+            f"render;dur={metrics.render_time * 1000:.1f}"
+        )
+        return response
+
+
+def _is_staff(request):
+    """Whether the caller is a staff user, signed in or authenticated like an API request."""
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+        try:
+            user = Request(request, authenticators=authenticators).user
+        except APIException:
+            return False
+    return user.is_authenticated and user.is_staff
+
+
+def metrics_view(request):
+    """Prometheus text exposition of the request histograms.
+
+    Scrapers send METRICS_TOKEN as a bearer token; without a token only staff
+    users may read the metrics.
+    """
+    token = getattr(settings, "METRICS_TOKEN", None)
+    scraper = bool(token) and request.headers.get("Authorization") == f"Bearer {token}"
+    if not scraper and not _is_staff(request):
+        return HttpResponseForbidden()
+    directory = getattr(settings, "METRICS_MULTIPROC_DIR", None)
+    if directory:
+        flush(force=True)
+        body = merged_exposition(directory)
+    else:
+        body = exposition()
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
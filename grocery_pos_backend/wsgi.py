@@ -15,4 +15,8 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'grocery_pos_backend.settings')
 
 application = get_wsgi_application()
 
+from products import scan_cache  # noqa: E402
+
+scan_cache.warm_on_boot()
+
 app = application
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ProcurementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'procurement'
+
+    def ready(self):
+        # Registers the inventory ledger receiver.
+        from . import ledger  # noqa: F401
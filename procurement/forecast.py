@@ -0,0 +1,210 @@
+"""
+Nightly demand forecast and purchase-order drafting.
+
+Sales are summed to units per product per day in the database and loaded into
+flat NumPy arrays. Every statistic is then computed for the whole catalog at
+once with `bincount` over those arrays, so the work grows with the number of
+product-days sold rather than with a Python loop per product.
+
+For each product with inventory and a supplier:
+- velocity: mean units per day over the last `velocity_days`;
+- forecast: exponentially weighted mean daily demand (half-life `half_life` days);
+- reorder point: forecast demand over the supplier's lead time plus safety
+  stock of z * (daily standard deviation) * sqrt(lead time), where z follows
+  from the service level; never below Inventory.reorder_level;
+- order quantity: enough to reach the reorder point plus `cover_days` of
+  forecast demand, counting stock on hand and on open purchase orders.
+
+Demand is averaged over the days since a product's first sale in the window,
+so recently listed products are not diluted by days they were not sold.
+Products at or below their reorder point get a line on a draft PurchaseOrder
+for their preferred supplier (the available one with the shortest lead time),
+priced from that supplier's price list, one order per supplier.
+Open orders count as stock, so re-running does not draft the same need twice.
+"""
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import islice
+from statistics import NormalDist
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from api import numbering
+from products.models import Inventory
+from sales.models import SaleItem
+from suppliers.models import ProductSupplier
+from .models import PurchaseOrder, PurchaseOrderItem
+
+CHUNK_SIZE = 50000
+OPEN_STATUSES = ("draft", "sent")
+NOTE = "Drafted from the demand forecast"
+
+Demand = namedtuple("Demand", "velocity forecast std")
+# Arrays aligned on product_ids (sorted); order > 0 marks the products to reorder.
+Plan = namedtuple(
+    "Plan",
+    "product_ids supplier_ids lead_times unit_costs on_hand on_order velocity forecast reorder_point order",
+)
+
+
+def _arrays(rows, dtypes):
+    """Stream `rows` (tuples) into one NumPy array per column, CHUNK_SIZE rows at a time."""
+    columns = [[] for _ in dtypes]
+    while chunk := list(islice(rows, CHUNK_SIZE)):
+        for column, values, dtype in zip(columns, zip(*chunk), dtypes):
+            column.append(np.array(values, dtype=dtype))
+    return [np.concatenate(column) if column else np.empty(0, dtype=dtype) for column, dtype in zip(columns, dtypes)]
+
+
+def _positions(sorted_ids, ids):
+    """Indexes into `sorted_ids` of the `ids` it contains, and the mask of those `ids`."""
+    if not len(sorted_ids):
+        return np.empty(0, dtype=np.int64), np.zeros(len(ids), dtype=bool)
+    index = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    found = sorted_ids[index] == ids
+    return index[found], found
+
+
+def load_history(start, end):
+    """Units sold per product per day in [start, end) (dates): (product ids, day offsets from start, units)."""
+    tz = timezone.get_current_timezone()
+    rows = (
+        SaleItem.objects.filter(
+            sale__sale_date__gte=timezone.make_aware(datetime.combine(start, time.min), tz),
+            sale__sale_date__lt=timezone.make_aware(datetime.combine(end, time.min), tz),
+        )
+        .exclude(sale__payment_status="cancelled")
+        .annotate(day=TruncDate("sale__sale_date"))
+        .values("product_id", "day")
+        .annotate(units=Sum("quantity"))
+        .order_by()
+        .values_list("product_id", "day", "units")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    product_ids, days, units = _arrays(rows, (np.int64, "datetime64[D]", np.float64))
+    return product_ids, (days - np.datetime64(start, "D")).astype(np.int64), units
+
+
+def estimate_demand(index, offsets, units, size, days, half_life=14, velocity_days=28):
+    """Daily demand per product from sparse sales.
+
+    `index` is each sale day's product position (0..size-1), `offsets` its day
+    (0..days-1, oldest first) and `units` the units sold that day.
+    """
+    first_sale = np.full(size, days, dtype=np.int64)
+    np.minimum.at(first_sale, index, offsets)
+    active = np.maximum(days - first_sale, 1).astype(np.float64)
+
+    total = np.bincount(index, weights=units, minlength=size)
+    squares = np.bincount(index, weights=units * units, minlength=size)
+    mean = total / active
+    std = np.sqrt(np.maximum(squares / active - mean * mean, 0))
+
+    age = days - 1 - offsets
+    recent = age < velocity_days
+    velocity = np.bincount(index[recent], weights=units[recent], minlength=size) / np.minimum(active, velocity_days)
+
+    decay = 0.5 ** (1 / half_life)
+    weighted = np.bincount(index, weights=units * decay ** age, minlength=size)
+    # Divided by the weights of every active day, sold or not (a geometric series).
+    forecast = weighted * (1 - decay) / (1 - decay ** active)
+    return Demand(velocity, forecast, std)
+
+
+def plan(today=None, history_days=730, cover_days=14, service_level=0.95, half_life=14, velocity_days=28):
+    """Forecast demand for the catalog and work out what to reorder."""
+    today = today or timezone.localdate()
+
+    product_ids, on_hand, reorder_level, unit_costs = _arrays(
+        Inventory.objects.order_by("product_id")
+        .values_list("product_id", "quantity", "reorder_level", "product__cost").iterator(chunk_size=CHUNK_SIZE),
+        # Costs stay Decimal; they only price the order lines.
+        (np.int64, np.float64, np.float64, object),
+    )
+    # Preferred supplier: the first available link per product by lead time.
+    linked_ids, supplier_ids, lead_times, link_costs = _arrays(
+        ProductSupplier.objects.filter(is_available=True).order_by("product_id", "lead_time_days", "id")
+        .values_list("product_id", "supplier_id", "lead_time_days", "unit_cost").iterator(chunk_size=CHUNK_SIZE),
+        (np.int64, np.int64, np.float64, object),
+    )
+    linked_ids, first = np.unique(linked_ids, return_index=True)
+    index, found = _positions(linked_ids, product_ids)
+    product_ids, on_hand, reorder_level, unit_costs = (
+        product_ids[found], on_hand[found], reorder_level[found], unit_costs[found])
+    supplier_ids, lead_times = supplier_ids[first][index], np.maximum(lead_times[first][index], 0)
+    link_costs = link_costs[first][index]
+    unit_costs = np.where(np.equal(link_costs, None), unit_costs, link_costs)
+    size = len(product_ids)
+
+    ordered_ids, open_units = _arrays(
+        PurchaseOrderItem.objects.filter(po__status__in=OPEN_STATUSES)
+        .values("product_id").annotate(units=Sum(F("quantity_ordered") - F("quantity_received")))
+        .order_by().values_list("product_id", "units").iterator(chunk_size=CHUNK_SIZE),
+        (np.int64, np.float64),
+    )
+    index, found = _positions(product_ids, ordered_ids)
+    on_order = np.bincount(index, weights=np.maximum(open_units[found], 0), minlength=size)
+
+    sold_ids, offsets, units = load_history(today - timedelta(days=history_days), today)
+    index, found = _positions(product_ids, sold_ids)
+    demand = estimate_demand(index, offsets[found], units[found], size, history_days, half_life, velocity_days)
+
+    z = NormalDist().inv_cdf(service_level)
+    reorder_point = np.maximum(
+        np.ceil(demand.forecast * lead_times + z * demand.std * np.sqrt(lead_times)), reorder_level
+    )
+    position = on_hand + on_order
+    order = np.where(
+        position <= reorder_point,
+        np.maximum(reorder_point + np.ceil(demand.forecast * cover_days) - position, 0),
+        0,
+    ).astype(np.int64)
+    return Plan(product_ids, supplier_ids, lead_times, unit_costs, on_hand, on_order,
+                demand.velocity, demand.forecast, reorder_point, order)
+
+
+def draft_purchase_orders(result, user, today=None):
+    """Write one draft PurchaseOrder per supplier for the products `result` (a Plan) reorders."""
+    today = today or timezone.localdate()
+    lines = np.flatnonzero(result.order > 0)
+    if not len(lines):
+        return []
+    # Group the lines by supplier, in product order within each supplier.
+    lines = lines[np.lexsort((result.product_ids[lines], result.supplier_ids[lines]))]
+    suppliers, starts = np.unique(result.supplier_ids[lines], return_index=True)
+
+    orders, items = [], []
+    for supplier_id, group in zip(suppliers.tolist(), np.split(lines, starts[1:])):
+        order = PurchaseOrder(
+            po_number=numbering.next_po_number(),
+            supplier_id=supplier_id,
+            user=user,
+            status="draft",
+            order_date=today,
+            expected_delivery_date=today + timedelta(days=int(result.lead_times[group].max())),
+            total_amount=Decimal("0"),
+            notes=NOTE,
+        )
+        for product_id, quantity, unit_cost in zip(
+            result.product_ids[group].tolist(), result.order[group].tolist(), result.unit_costs[group]
+        ):
+            items.append(PurchaseOrderItem(
+                po=order,
+                product_id=product_id,
+                quantity_ordered=quantity,
+                unit_cost=unit_cost,
+                total_cost=unit_cost * quantity,
+            ))
+            order.total_amount += items[-1].total_cost
+        orders.append(order)
+
+    with transaction.atomic():
+        PurchaseOrder.objects.bulk_create(orders, batch_size=1000)
+        # Each item takes its order's new primary key as it is inserted.
+        PurchaseOrderItem.objects.bulk_create(items, batch_size=5000)
+    return orders
@@ -0,0 +1,111 @@
+"""
+The inventory ledger: every stock movement becomes an InventoryTransaction,
+written in bulk inside the transaction that moved the stock. Periodic
+InventorySnapshot rows let point-in-time questions start from the nearest
+snapshot and scan only the ledger entries after it. Deleting a stock row
+records a closing movement back to zero.
+"""
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from products.models import Inventory
+from products.signals import stock_changed
+from .models import InventorySnapshot, InventoryTransaction
+
+
+@receiver(stock_changed)
+def record_movements(sender, changes=(), transaction_type="adjustment",
+                     reference_id=None, user=None, notes="", breakdown=None, **kwargs):
+    if breakdown is not None:
+        InventoryTransaction.objects.bulk_create([
+            InventoryTransaction(
+                product_id=product_id,
+                quantity_change=quantity_change,
+                transaction_type=transaction_type,
+                reference_id=entry_reference_id,
+                user=user,
+                notes=entry_notes,
+            )
+            for product_id, quantity_change, entry_reference_id, entry_notes in breakdown
+            if quantity_change
+        ])
+        return
+    entries = [
+        InventoryTransaction(
+            product_id=change.product_id,
+            quantity_change=change.new_quantity - (change.old_quantity or 0),
+            transaction_type=transaction_type,
+            reference_id=reference_id,
+            user=user,
+            notes=notes,
+        )
+        for change in changes
+        if change.new_quantity is not None and change.new_quantity != (change.old_quantity or 0)
+    ]
+    InventoryTransaction.objects.bulk_create(entries)
+
+
+@receiver(post_delete, sender=Inventory)
+def record_closing_movement(sender, instance, **kwargs):
+    if not instance.quantity:
+        return
+    context = instance.stock_context or {}
+    InventoryTransaction.objects.create(
+        product_id=instance.product_id,
+        quantity_change=-instance.quantity,
+        transaction_type=context.get("transaction_type", "adjustment"),
+        reference_id=context.get("reference_id"),
+        user=context.get("user"),
+        notes=context.get("notes", ""),
+    )
+
+
+def take_snapshot():
+    """Record every product's current stock with one INSERT ... SELECT; return the row count.
+
+    On PostgreSQL the inventory table is first locked in SHARE mode. That waits
+    for transactions that have already moved stock to commit, and holds new
+    movements back until the snapshot commits. Each movement is therefore
+    either counted in the snapshot and dated before `taken_at`, or dated after
+    it and left out. It is never counted twice or lost.
+    """
+    quote = connection.ops.quote_name
+    inventory = quote(Inventory._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(f"LOCK TABLE {inventory} IN SHARE MODE")
+        taken_at = timezone.now()
+        cursor.execute(
+            f"INSERT INTO {quote(InventorySnapshot._meta.db_table)} (product_id, quantity, taken_at) "
+            f"SELECT product_id, quantity, %s FROM {inventory}",
+            [connection.ops.adapt_datetimefield_value(taken_at)],
+        )
+        return cursor.rowcount
+
+
+def stock_at(product_id, moment):
+    """Stock level of a product at `moment`: nearest earlier snapshot plus later movements."""
+    snapshot = (
+        InventorySnapshot.objects.filter(product_id=product_id, taken_at__lte=moment)
+        .order_by("-taken_at")
+        .first()
+    )
+    movements = InventoryTransaction.objects.filter(product_id=product_id, transaction_date__lte=moment)
+    base = 0
+    if snapshot is not None:
+        base = snapshot.quantity
+        movements = movements.filter(transaction_date__gt=snapshot.taken_at)
+    return base + (movements.aggregate(total=Sum("quantity_change"))["total"] or 0)
+
+
+def movements(product_id, start=None, end=None):
+    """Ledger entries for a product in [start, end], oldest first."""
+    queryset = InventoryTransaction.objects.filter(product_id=product_id)
+    if start is not None:
+        queryset = queryset.filter(transaction_date__gte=start)
+    if end is not None:
+        queryset = queryset.filter(transaction_date__lte=end)
+    return queryset.order_by("transaction_date", "pk")
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from procurement import forecast
+from users.models import User
+
+class Command(BaseCommand):
+    help = (
+        'Forecast demand for the whole catalog from sales history and draft purchase orders, '
+        'one per supplier, for products at or below their reorder point (schedule nightly)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='Username the draft orders are created for')
+        parser.add_argument('--history-days', type=int, default=730, help='Days of sales history to forecast from')
+        parser.add_argument('--cover-days', type=int, default=14, help='Days of forecast demand each order should cover')
+        parser.add_argument('--service-level', type=float, default=0.95,
+                            help='Probability of not running out during the lead time, sets the safety stock')
+        parser.add_argument('--half-life', type=float, default=14, help='Days for a sale to lose half its weight')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be ordered without drafting')
+
+    def handle(self, *args, **options):
+        if not 0.5 <= options['service_level'] < 1:
+            raise CommandError('--service-level must be at least 0.5 and below 1.')
+        if options['history_days'] < 1 or options['half_life'] <= 0:
+            raise CommandError('--history-days and --half-life must be positive.')
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['user']!r}.")
+
+        started = time.perf_counter()
+        today = timezone.localdate()
+        result = forecast.plan(
+            today=today,
+            history_days=options['history_days'],
+            cover_days=options['cover_days'],
+            service_level=options['service_level'],
+            half_life=options['half_life'],
+        )
+        planned = time.perf_counter()
+        lines = int((result.order > 0).sum())
+        self.stdout.write(
+            f'Forecast {len(result.product_ids)} products in {planned - started:.1f}s: '
+            f'{lines} to reorder, {int(result.order.sum())} units.'
+        )
+        if options['dry_run'] or not lines:
+            return
+        orders = forecast.draft_purchase_orders(result, user, today=today)
+        self.stdout.write(self.style.SUCCESS(
+            f'Drafted {len(orders)} purchase order(s) with {lines} line(s) in {time.perf_counter() - planned:.1f}s.'
+        ))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from procurement import ledger
+
+class Command(BaseCommand):
+    help = 'Record a stock snapshot for every product (schedule periodically, e.g. nightly)'
+
+    def handle(self, *args, **options):
+        count = ledger.take_snapshot()
+        self.stdout.write(self.style.SUCCESS(f'Snapshotted stock for {count} products.'))
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.20 on 2026-10-18 09:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_inventorysummary'),
+        ('procurement', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('taken_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='inventorytransaction',
+            index=models.Index(fields=['product', 'transaction_date'], name='procurement_product_073935_idx'),
+        ),
+        migrations.AddField(
+            model_name='inventorysnapshot',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='products.product'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorysnapshot',
+            index=models.Index(fields=['product', 'taken_at'], name='procurement_product_922e44_idx'),
+        ),
+    ]
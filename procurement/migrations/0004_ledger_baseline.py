@@ -0,0 +1,37 @@
+# Generated by Django 4.2.20 on 2026-10-18 10:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def snapshot_current_stock(apps, schema_editor):
+    # Stock from before the ledger has no movements behind it; without a
+    # baseline, point-in-time queries would only add up later movements.
+    Inventory = apps.get_model('products', 'Inventory')
+    InventorySnapshot = apps.get_model('procurement', 'InventorySnapshot')
+    taken_at = timezone.now()
+    batch = []
+    for product_id, quantity in Inventory.objects.values_list('product_id', 'quantity').iterator(chunk_size=5000):
+        batch.append(InventorySnapshot(product_id=product_id, quantity=quantity, taken_at=taken_at))
+        if len(batch) == 5000:
+            InventorySnapshot.objects.bulk_create(batch)
+            batch = []
+    InventorySnapshot.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_low_stock_outbox'),
+        ('procurement', '0003_inventory_ledger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inventorytransaction',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='transactions', to='products.product'),
+        ),
+        migrations.RunPython(snapshot_current_stock, migrations.RunPython.noop),
+    ]
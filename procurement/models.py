@@ -36,6 +36,13 @@ class PurchaseOrder(models.Model):
     def __str__(self):
         return f"PO #{self.po_number} - {self.supplier.name}"
 
+    def save(self, *args, **kwargs):
+        if not self.po_number:
+            from api import numbering
+
+            self.po_number = numbering.next_po_number()
+        super().save(*args, **kwargs)
+
 
 class PurchaseOrderItem(models.Model):
     po = models.ForeignKey(
@@ -64,8 +71,10 @@ class InventoryTransaction(models.Model):
         ("waste", "Waste"),
     ]
 
+    # The ledger outlives the product: deleting a product keeps its entries
+    # (and their product_id) instead of being blocked by them.
     product = models.ForeignKey(
-        Product, on_delete=models.PROTECT, related_name="transactions"
+        Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name="transactions"
     )
     quantity_change = models.IntegerField()
     transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPES)
@@ -80,5 +89,28 @@ class InventoryTransaction(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["product", "transaction_date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_type} - {self.quantity_change} units of product {self.product_id}"
+
+
+class InventorySnapshot(models.Model):
+    """Periodic per-product stock level used as a base for point-in-time queries."""
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="stock_snapshots"
+    )
+    quantity = models.IntegerField()
+    taken_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["product", "taken_at"]),
+        ]
+
     def __str__(self):
-        return f"{self.transaction_type} - {self.quantity_change} units of {self.product.name}"
+        return f"{self.product_id}: {self.quantity} at {self.taken_at}"
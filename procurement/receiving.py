@@ -0,0 +1,112 @@
+"""
+Receiving purchase-order deliveries.
+
+A delivery is applied in one transaction with set-based work: the order row
+is locked (so two receipts of one order queue up), every line is checked
+before anything is written, `quantity_received` advances with one UPDATE and
+stock rises through `Inventory.objects.increment_stock`: one locked UPDATE
+that also sets `last_restock_date`, whose `stock_changed` writes the ledger
+entries in bulk. The order then moves to "sent" while lines are outstanding
+and to "received" once every line is in.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from products.models import Inventory, Product
+from products.signals import StockChange, stock_changed
+from .models import PurchaseOrder, PurchaseOrderItem
+
+RECEIVABLE = ("draft", "sent")
+
+
+class OrderClosed(Exception):
+    """The order is received or cancelled and takes no more deliveries."""
+
+
+def _resolve(order, lines):
+    """Map each line to its order item; raise ValidationError listing the bad lines."""
+    items = {item.pk: item for item in order.items.all()}
+    by_product = defaultdict(list)
+    for item in items.values():
+        by_product[item.product_id].append(item)
+
+    received = defaultdict(int)
+    errors = []
+    for line in lines:
+        if "item_id" in line:
+            item = items.get(line["item_id"])
+            error = None if item else f"Item {line['item_id']} is not on order {order.po_number}."
+        else:
+            candidates = by_product.get(line["product_id"], [])
+            item = candidates[0] if len(candidates) == 1 else None
+            error = None if item else (
+                f"Product {line['product_id']} is not on order {order.po_number}." if not candidates
+                else f"Product {line['product_id']} is on several lines; give item_id."
+            )
+        if item is not None:
+            received[item.pk] += line["quantity"]
+            outstanding = item.quantity_ordered - item.quantity_received
+            if received[item.pk] > outstanding:
+                error = f"Only {outstanding} of item {item.pk} outstanding."
+        errors.append({"non_field_errors": [error]} if error else {})
+    if any(errors):
+        raise ValidationError({"lines": errors})
+    return items, received
+
+
+def _ensure_inventory(product_ids):
+    """Create empty stock rows for received products that have none, announcing them like a save would."""
+    missing = set(product_ids) - set(
+        Inventory.objects.filter(product_id__in=product_ids).values_list("product_id", flat=True)
+    )
+    if not missing:
+        return
+    prices = dict(Product.objects.filter(pk__in=missing).values_list("pk", "price"))
+    rows = Inventory.objects.bulk_create([Inventory(product_id=product_id) for product_id in sorted(missing)])
+    stock_changed.send(sender=Inventory, product_ids=sorted(missing), changes=[
+        StockChange(row.product_id, None, row.quantity, None, row.reorder_level, prices[row.product_id]) for row in rows
+    ])
+
+
+@transaction.atomic
+def receive(order_id, lines, user, notes=""):
+    """Apply a delivery (`lines` of {"item_id" or "product_id", "quantity"}) to order `order_id`.
+
+    Returns the updated order, its prefetched items brought up to date. Raises PurchaseOrder.DoesNotExist, OrderClosed,
+    or ValidationError when a line does not match what is outstanding.
+    """
+    order = PurchaseOrder.objects.select_for_update().prefetch_related("items").get(pk=order_id)
+    if order.status not in RECEIVABLE:
+        raise OrderClosed(f"Order {order.po_number} is {order.status}.")
+    items, received = _resolve(order, lines)
+
+    now = timezone.now()
+    PurchaseOrderItem.objects.filter(pk__in=received).update(
+        quantity_received=F("quantity_received") + Case(
+            *[When(pk=item_id, then=Value(units)) for item_id, units in received.items()],
+            output_field=IntegerField(),
+        ),
+        updated_at=now,
+    )
+    quantities = defaultdict(int)
+    for item_id, units in received.items():
+        quantities[items[item_id].product_id] += units
+        items[item_id].quantity_received += units
+    _ensure_inventory(list(quantities))
+    Inventory.objects.increment_stock(
+        dict(quantities),
+        last_restock_date=timezone.localdate(),
+        transaction_type="purchase",
+        reference_id=order.pk,
+        user=user,
+        notes=notes or f"Received on {order.po_number}",
+    )
+
+    complete = all(item.quantity_received >= item.quantity_ordered for item in items.values())
+    order.status = "received" if complete else "sent"
+    order.save(update_fields=["status", "updated_at"])
+    return order
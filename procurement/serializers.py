@@ -0,0 +1,37 @@
+from django.conf import settings
+from rest_framework import serializers
+
+from .models import PurchaseOrder, PurchaseOrderItem
+
+
+class ReceiveLineSerializer(serializers.Serializer):
+    """One delivered line, naming either the order item or its product."""
+    item_id = serializers.IntegerField(required=False)
+    product_id = serializers.IntegerField(required=False)
+    quantity = serializers.IntegerField(min_value=1)
+
+    def validate(self, data):
+        if ('item_id' in data) == ('product_id' in data):
+            raise serializers.ValidationError("Give exactly one of item_id or product_id.")
+        return data
+
+
+class ReceiveSerializer(serializers.Serializer):
+    lines = ReceiveLineSerializer(many=True, allow_empty=False,
+                                  max_length=getattr(settings, 'PO_RECEIVE_MAX_LINES', 2000))
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class PurchaseOrderItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PurchaseOrderItem
+        fields = ['id', 'product', 'quantity_ordered', 'quantity_received', 'unit_cost', 'total_cost']
+
+
+class PurchaseOrderSerializer(serializers.ModelSerializer):
+    items = PurchaseOrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = PurchaseOrder
+        fields = ['id', 'po_number', 'supplier', 'status', 'order_date', 'expected_delivery_date',
+                  'total_amount', 'notes', 'items']
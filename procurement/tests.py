@@ -1,3 +1,245 @@
-from django.test import TestCase
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+import numpy as np
+from django.core.management import call_command
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from procurement import forecast, ledger
+from procurement.models import InventorySnapshot, InventoryTransaction, PurchaseOrder, PurchaseOrderItem
+from products.models import Category, Inventory, Product
+from sales.models import Sale, SaleItem
+from suppliers.models import ProductSupplier, Supplier
+from users.models import User
+
+
+class InventoryLedgerTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='clerk', password='testpass', role='manager', name='Clerk', email='clerk@example.com')
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name='Pantry')
+        self.product = Product.objects.create(name='Rice', sku='RICE1', category=self.category, price=5, cost=3)
+        self.inventory = Inventory.objects.create(product=self.product, quantity=10)
+
+    def test_every_movement_is_recorded(self):
+        self.client.post(reverse('inventory-restock', kwargs={'pk': self.inventory.id}), {'quantity': 4})
+        with transaction.atomic():
+            Inventory.objects.decrement_stock({self.product.id: 3}, transaction_type='sale', reference_id=42)
+        entries = list(
+            InventoryTransaction.objects.filter(product=self.product)
+            .order_by('pk').values_list('transaction_type', 'quantity_change', 'reference_id')
+        )
+        self.assertEqual(entries, [('adjustment', 10, None), ('purchase', 4, None), ('sale', -3, 42)])
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 11)
+        self.assertIsNotNone(self.inventory.last_restock_date)
+
+    def test_adjustments_and_deletes_are_credited_to_the_caller(self):
+        url = reverse('inventory-detail', kwargs={'pk': self.inventory.id})
+        response = self.client.patch(url, {'quantity': 7}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        entries = list(
+            InventoryTransaction.objects.filter(product=self.product)
+            .order_by('pk').values_list('transaction_type', 'quantity_change', 'user', 'notes')
+        )
+        self.assertEqual(entries, [
+            ('adjustment', 10, None, ''),
+            ('adjustment', -3, self.user.id, ''),
+            ('adjustment', -7, self.user.id, 'Stock record deleted'),
+        ])
+        self.assertEqual(ledger.stock_at(self.product.id, timezone.now()), 0)
+
+    def test_stock_at_uses_snapshot_and_later_movements(self):
+        now = timezone.now()
+        InventoryTransaction.objects.filter(product=self.product).update(transaction_date=now - timedelta(days=3))
+        InventorySnapshot.objects.create(product=self.product, quantity=10, taken_at=now - timedelta(days=2))
+        with transaction.atomic():
+            Inventory.objects.decrement_stock({self.product.id: 4}, transaction_type='sale')
+        InventoryTransaction.objects.filter(transaction_type='sale').update(transaction_date=now - timedelta(days=1))
+
+        self.assertEqual(ledger.stock_at(self.product.id, now - timedelta(days=4)), 0)
+        self.assertEqual(ledger.stock_at(self.product.id, now - timedelta(days=2)), 10)
+        self.assertEqual(ledger.stock_at(self.product.id, now), 6)
+
+        url = reverse('inventory-stock-at', kwargs={'pk': self.inventory.id})
+        response = self.client.get(url, {'at': (now - timedelta(hours=36)).isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['quantity'], 10)
+
+    def test_movements_for_date_range(self):
+        url = reverse('inventory-movements', kwargs={'pk': self.inventory.id})
+        response = self.client.get(url, {'start': timezone.localdate().isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['quantity_change'], 10)
+
+    def test_bare_dates_cover_the_whole_day(self):
+        today = timezone.localdate()
+        afternoon = timezone.make_aware(datetime.combine(today, time(15)))
+        InventoryTransaction.objects.filter(product=self.product).update(transaction_date=afternoon)
+        response = self.client.get(
+            reverse('inventory-movements', kwargs={'pk': self.inventory.id}),
+            {'start': today.isoformat(), 'end': today.isoformat()},
+        )
+        self.assertEqual(response.data['count'], 1)
+        response = self.client.get(
+            reverse('inventory-stock-at', kwargs={'pk': self.inventory.id}), {'at': today.isoformat()})
+        self.assertEqual(response.data['quantity'], 10)
+        response = self.client.get(
+            reverse('inventory-stock-at', kwargs={'pk': self.inventory.id}), {'at': '2026-02-30'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_deleting_a_product_keeps_its_ledger(self):
+        product_id = self.product.id
+        response = self.client.delete(reverse('product-detail', kwargs={'pk': product_id}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        # The opening entry, and the closing one written as the stock row went with the product.
+        self.assertEqual(InventoryTransaction.objects.filter(product_id=product_id).count(), 2)
+        self.assertEqual(ledger.stock_at(product_id, timezone.now()), 0)
+
+    def test_take_snapshot(self):
+        self.assertEqual(ledger.take_snapshot(), 1)
+        self.assertEqual(InventorySnapshot.objects.get(product=self.product).quantity, 10)
+
+
+class DemandForecastTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='testpass', role='manager', name='Buyer', email='buyer@example.com')
+        self.today = timezone.localdate()
+        self.near = Supplier.objects.create(name='Near', contact_person='N', phone='1', email='near@example.com', address='x')
+        self.far = Supplier.objects.create(name='Far', contact_person='F', phone='2', email='far@example.com', address='y')
+        self.milk = self.product('Milk', quantity=20, cost='1.50')
+        self.flour = self.product('Flour', quantity=5, cost='2.00')
+        self.salt = self.product('Salt', quantity=500, cost='0.50')
+        self.product('Spice', quantity=0, cost='3.00')  # no supplier: never ordered
+        ProductSupplier.objects.create(product=self.milk, supplier=self.near, lead_time_days=3)
+        ProductSupplier.objects.create(product=self.milk, supplier=self.far, lead_time_days=7)
+        ProductSupplier.objects.create(product=self.flour, supplier=self.far, lead_time_days=7)
+        ProductSupplier.objects.create(product=self.salt, supplier=self.near, lead_time_days=3)
+        for days_ago in range(1, 29):
+            self.sell(self.milk, 10, days_ago)
+            self.sell(self.salt, 10, days_ago)
+        self.sell(self.milk, 100, 2, payment_status='cancelled')
+        self.sell(self.milk, 50, 0)
+
+    def product(self, name, quantity, cost):
+        product = Product.objects.create(name=name, sku=name.upper(), price=5, cost=Decimal(cost))
+        Inventory.objects.create(product=product, quantity=quantity, reorder_level=10)
+        return product
+
+    def sell(self, product, units, days_ago, payment_status='paid'):
+        sale = Sale.objects.create(invoice_number=f'T-{Sale.objects.count()}', user=self.user,
+                                   payment_method='cash', payment_status=payment_status)
+        SaleItem.objects.create(sale=sale, product=product, quantity=units, unit_price=5, unit_cost=1, total_price=5 * units)
+        moment = timezone.make_aware(datetime.combine(self.today - timedelta(days=days_ago), time(12)))
+        Sale.objects.filter(pk=sale.pk).update(sale_date=moment)
+
+    def test_estimate_demand(self):
+        demand = forecast.estimate_demand(
+            np.array([0, 0]), np.array([8, 9]), np.array([4.0, 8.0]), size=2, days=10, velocity_days=28
+        )
+        # Averaged over the two days since the first sale; the second product never sold.
+        np.testing.assert_allclose(demand.velocity, [6, 0])
+        np.testing.assert_allclose(demand.std, [2, 0])
+        self.assertTrue(4 < demand.forecast[0] < 8)
+        self.assertEqual(demand.forecast[1], 0)
+
+    def test_drafts_orders_per_supplier(self):
+        out = StringIO()
+        call_command('draft_purchase_orders', '--user', 'buyer', stdout=out)
+        self.assertIn('Forecast 3 products', out.getvalue())
+        orders = {order.supplier_id: order for order in PurchaseOrder.objects.prefetch_related('items')}
+        self.assertEqual(set(orders), {self.near.id, self.far.id})
+
+        # Milk: 10 a day over a 3 day lead time -> reorder at 30, order up to 30 + 14 days of demand.
+        near = orders[self.near.id]
+        self.assertEqual([(i.product_id, i.quantity_ordered) for i in near.items.all()], [(self.milk.id, 150)])
+        self.assertEqual(near.status, 'draft')
+        self.assertEqual(near.expected_delivery_date, self.today + timedelta(days=3))
+        self.assertEqual(near.total_amount, Decimal('225.00'))
+        self.assertTrue(near.po_number.startswith('PO-'))
+        # Flour has no sales: topped up to its reorder level.
+        far = orders[self.far.id]
+        self.assertEqual([(i.product_id, i.quantity_ordered) for i in far.items.all()], [(self.flour.id, 5)])
+
+        # Open orders count as stock, so a second run drafts nothing new.
+        call_command('draft_purchase_orders', '--user', 'buyer', stdout=StringIO())
+        self.assertEqual(PurchaseOrder.objects.count(), 2)
+
+
+class ReceivePurchaseOrderTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='receiver', password='testpass', role='manager', name='Receiver', email='receiver@example.com')
+        self.client.force_authenticate(user=self.user)
+        supplier = Supplier.objects.create(name='Wholesale', contact_person='W', phone='1', email='w@example.com', address='x')
+        self.order = PurchaseOrder.objects.create(
+            supplier=supplier, user=self.user, order_date=timezone.localdate(),
+            expected_delivery_date=timezone.localdate() + timedelta(days=2),
+        )
+        self.products, self.items = [], []
+        for i in range(50):
+            product = Product.objects.create(name=f'Case {i}', sku=f'CASE{i}', price=4, cost=2)
+            if i:  # the first product has no stock row yet
+                Inventory.objects.create(product=product, quantity=1)
+            self.products.append(product)
+            self.items.append(PurchaseOrderItem.objects.create(
+                po=self.order, product=product, quantity_ordered=10, unit_cost=2, total_cost=20))
+        self.url = reverse('purchase-order-receive', kwargs={'po_id': self.order.pk})
+
+    def test_partial_then_complete_delivery(self):
+        lines = [{'item_id': item.pk, 'quantity': 4} for item in self.items]
+        with self.assertNumQueries(18):
+            response = self.client.post(self.url, {'lines': lines}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'sent')
+        self.assertEqual({item['quantity_received'] for item in response.data['items']}, {4})
+        stock = dict(Inventory.objects.values_list('product_id', 'quantity'))
+        self.assertEqual(stock[self.products[0].id], 4)
+        self.assertEqual(stock[self.products[1].id], 5)
+        self.assertEqual(Inventory.objects.get(product=self.products[1]).last_restock_date, timezone.localdate())
+        self.assertEqual(
+            InventoryTransaction.objects.filter(transaction_type='purchase', reference_id=self.order.pk).count(), 50)
+
+        lines = [{'product_id': product.pk, 'quantity': 6} for product in self.products]
+        response = self.client.post(self.url, {'lines': lines, 'notes': 'Second truck'}, format='json')
+        self.assertEqual(response.data['status'], 'received')
+        self.assertEqual(Inventory.objects.get(product=self.products[1]).quantity, 11)
+        self.assertTrue(InventoryTransaction.objects.filter(notes='Second truck').exists())
+        response = self.client.post(self.url, {'lines': lines[:1]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_cashiers_cannot_receive(self):
+        cashier = User.objects.create_user(username='till', password='testpass', role='cashier', name='Till', email='till@example.com')
+        self.client.force_authenticate(user=cashier)
+        response = self.client.post(self.url, {'lines': [{'item_id': self.items[1].pk, 'quantity': 4}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Inventory.objects.get(product=self.products[1]).quantity, 1)
+
+    def test_rejects_whole_delivery_on_bad_line(self):
+        other = Product.objects.create(name='Stray', sku='STRAY', price=1, cost=1)
+        lines = [
+            {'item_id': self.items[0].pk, 'quantity': 4},
+            {'item_id': self.items[1].pk, 'quantity': 11},
+            {'product_id': other.pk, 'quantity': 1},
+            {'item_id': self.items[2].pk, 'product_id': self.products[2].pk, 'quantity': 1},
+        ]
+        response = self.client.post(self.url, {'lines': lines}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('item_id or product_id', str(response.data['lines'][3]))
+        lines.pop()
+        response = self.client.post(self.url, {'lines': lines}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.data['lines']
+        self.assertEqual(errors[0], {})
+        self.assertIn('Only 10', str(errors[1]))
+        self.assertIn('not on order', str(errors[2]))
+        self.assertFalse(PurchaseOrderItem.objects.filter(quantity_received__gt=0).exists())
+        self.assertEqual(self.client.post(reverse('purchase-order-receive', kwargs={'po_id': 0}),
+                                          {'lines': lines[:1]}, format='json').status_code, status.HTTP_404_NOT_FOUND)
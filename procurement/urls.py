@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .views import ReceivePurchaseOrderView
+
+urlpatterns = [
+    path('purchase-orders/<int:po_id>/receive/', ReceivePurchaseOrderView.as_view(), name='purchase-order-receive'),
+]
@@ -1,3 +1,34 @@
-from django.shortcuts import render
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from users.permissions import IsManager
+from . import receiving
+from .models import PurchaseOrder
+from .serializers import PurchaseOrderSerializer, ReceiveSerializer
+
+
+class ReceivePurchaseOrderView(APIView):
+    """Receive a delivery against a purchase order in one transaction.
+    
+    Body: {"lines": [{"item_id" or "product_id", "quantity"}, ...], "notes"?}.
+    Quantities may be partial; a line may not exceed what is outstanding.
+    Answers with the updated order, or 409 once it is received or cancelled.
+    Managers only.
+    """
+    permission_classes = [IsAuthenticated, IsManager]
+    
+    def post(self, request, po_id):
+        serializer = ReceiveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            order = receiving.receive(
+                po_id, serializer.validated_data['lines'], request.user, serializer.validated_data['notes']
+            )
+        except PurchaseOrder.DoesNotExist:
+            raise NotFound("Purchase order not found.")
+        except receiving.OrderClosed as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
+        return Response(PurchaseOrderSerializer(order).data)
@@ -0,0 +1,92 @@
+"""
+Incremental low-stock state and the low-stock alert outbox.
+
+Every stock movement announces old and new quantity and reorder level with
+`stock_changed`. From those this module keeps `Inventory.is_low_stock` in
+step (an UPDATE only for rows that cross the threshold) and writes a
+LowStockEvent for each crossing, in the same transaction as the movement.
+
+Once that transaction commits, the pending events get positions from the
+"low_stock_events" NumberSequence in a short transaction that holds the
+sequence row lock, the same scheme the catalog feed uses for its versions.
+Positions therefore become visible in order, and a consumer that reads
+`position > cursor` never skips an event. Events whose publication failed are
+picked up by the next publication or read.
+"""
+import logging
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Case, Value, When
+from django.dispatch import receiver
+
+from api import numbering
+from .models import Inventory, LowStockEvent, Product
+from .signals import stock_changed
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE = "low_stock_events"
+PUBLISH_BATCH = 500
+
+
+@receiver(stock_changed)
+def record_crossings(sender, changes=(), **kwargs):
+    events = []
+    for change in changes:
+        if change.new_quantity is None:
+            continue
+        was_low = change.old_quantity is not None and change.old_quantity <= change.old_reorder_level
+        is_low = change.new_quantity <= change.new_reorder_level
+        if is_low != was_low:
+            events.append(LowStockEvent(
+                product_id=change.product_id,
+                kind=LowStockEvent.LOW if is_low else LowStockEvent.RESTOCKED,
+                quantity=change.new_quantity,
+                reorder_level=change.new_reorder_level,
+            ))
+    if not events:
+        return
+    for flag in (True, False):
+        product_ids = [event.product_id for event in events if (event.kind == LowStockEvent.LOW) == flag]
+        if product_ids:
+            Inventory.objects.filter(product_id__in=product_ids).update(is_low_stock=flag)
+    LowStockEvent.objects.bulk_create(events)
+    transaction.on_commit(publish_pending)
+
+
+def publish_pending():
+    """Give committed events without a position the next positions, in the order they were written."""
+    if not LowStockEvent.objects.filter(position__isnull=True).exists():
+        return
+    try:
+        with transaction.atomic():
+            # Taking the sequence row lock first serializes publishers; it is held until commit.
+            numbering.reserve(SEQUENCE, 0, connection)
+            while True:
+                pending = list(
+                    LowStockEvent.objects.filter(position__isnull=True)
+                    .order_by("id").values_list("id", flat=True)[:PUBLISH_BATCH]
+                )
+                if not pending:
+                    break
+                first = numbering.reserve(SEQUENCE, len(pending), connection)
+                LowStockEvent.objects.filter(id__in=pending).update(position=Case(
+                    *[When(id=event_id, then=Value(first + offset)) for offset, event_id in enumerate(pending)]
+                ))
+    except DatabaseError:
+        logger.exception("Could not publish low-stock events")
+
+
+def events_after(cursor, limit):
+    """Published events with a position after `cursor`, oldest first, with the product's name and SKU."""
+    events = list(
+        LowStockEvent.objects.filter(position__gt=cursor).order_by("position")
+        .values("position", "product_id", "kind", "quantity", "reorder_level", "created_at")[:limit]
+    )
+    products = Product.objects.only("name", "sku").in_bulk({event["product_id"] for event in events})
+    for event in events:
+        product = products.get(event["product_id"])
+        # The product may have been deleted since; its events stay in the outbox.
+        event["product_name"] = product.name if product else None
+        event["sku"] = product.sku if product else None
+    return events
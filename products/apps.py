@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        # Registers the summary counter, low-stock, scan cache, search index and catalog feed receivers.
+        from . import alerts, catalog, receivers, scan_cache, search  # noqa: F401
@@ -0,0 +1,166 @@
+"""
+Versioned catalog feed for POS terminals.
+
+Every change to a product, its inventory or its category bumps the catalog
+version and records it against the product in CatalogVersion (one row per
+product, so the table never outgrows the catalog). Terminals load a gzipped
+full snapshot once, then ask for the changes since the version they hold:
+upserts for products changed since then and tombstones for deleted ones.
+
+The changing transaction marks its products pending (a CatalogVersion row
+with no version). Once it commits, every pending row gets the next version in
+a short transaction that holds the "catalog" NumberSequence row lock, the same
+outbox scheme the low-stock events use. Versions therefore become visible in
+order: a reader that sees version N also sees every change numbered below it.
+Changes are read up to the version read first, so none can slip between two
+syncs. A publication that failed or never ran is picked up by the next
+publication or read.
+"""
+import gzip
+import io
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from api import numbering
+from .models import CatalogVersion, Category, Inventory, Product
+from .signals import catalog_changed, stock_changed
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE = "catalog"
+# Rebuild the full snapshot at most this often; terminals catch up with the delta.
+SNAPSHOT_MAX_AGE = getattr(settings, "CATALOG_SNAPSHOT_MAX_AGE", 300)
+# Beyond this many changed products a terminal is told to reload the snapshot.
+DELTA_LIMIT = getattr(settings, "CATALOG_DELTA_LIMIT", 5000)
+SNAPSHOT_KEY = "catalog:snapshot"
+COLUMNS = ("id", "name", "sku", "barcode", "price", "tax_rate", "category_id", "category__name", "inventory__quantity")
+
+
+class ChangesUnavailable(Exception):
+    """The requested delta cannot be served; the terminal should reload the snapshot."""
+
+
+def current_version():
+    return numbering.last_value(SEQUENCE)
+
+
+def entries(queryset):
+    """Price book entries for `queryset`, streamed from one query."""
+    for (product_id, name, sku, barcode, price, tax_rate,
+         category_id, category_name, quantity) in queryset.values_list(*COLUMNS).iterator(chunk_size=2000):
+        yield {
+            "id": product_id,
+            "name": name,
+            "sku": sku,
+            "barcode": barcode,
+            "price": str(price),
+            "tax_rate": str(tax_rate),
+            "category": category_id,
+            "category_name": category_name,
+            "stock_quantity": quantity or 0,
+        }
+
+
+def build_snapshot():
+    """Return (version, gzipped JSON snapshot). Rows may be newer than `version`; the delta re-sends them."""
+    version = current_version()
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb", mtime=0) as stream:
+        stream.write(f'{{"version": {version}, "products": ['.encode())
+        for index, entry in enumerate(entries(Product.objects.order_by("pk"))):
+            stream.write(((", " if index else "") + json.dumps(entry)).encode())
+        stream.write(b"]}")
+    return version, buffer.getvalue()
+
+
+def snapshot():
+    """The cached (version, gzipped snapshot), rebuilt when older than SNAPSHOT_MAX_AGE and out of date."""
+    cached = cache.get(SNAPSHOT_KEY)
+    if cached is not None:
+        version, built_at, body = cached
+        if time.time() - built_at < SNAPSHOT_MAX_AGE or version == current_version():
+            return version, body
+    version, body = build_snapshot()
+    cache.set(SNAPSHOT_KEY, (version, time.time(), body), None)
+    return version, body
+
+
+def changes_since(since):
+    """Return {"version", "upserts", "deletes"} for everything changed after version `since`."""
+    version = current_version()
+    if since > version:
+        raise ChangesUnavailable(f"Version {since} is ahead of the catalog (version {version}).")
+    product_ids = list(
+        CatalogVersion.objects.filter(version__gt=since, version__lte=version)
+        .values_list("product_id", flat=True)[:DELTA_LIMIT + 1]
+    )
+    if len(product_ids) > DELTA_LIMIT:
+        raise ChangesUnavailable(f"More than {DELTA_LIMIT} products changed since version {since}.")
+    upserts = list(entries(Product.objects.filter(pk__in=product_ids).order_by("pk")))
+    existing = {entry["id"] for entry in upserts}
+    return {
+        "version": version,
+        "upserts": upserts,
+        "deletes": sorted(product_id for product_id in product_ids if product_id not in existing),
+    }
+
+
+def mark_changed(product_ids):
+    """Mark `product_ids` pending in the current transaction and publish once it commits."""
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return
+    # Rows are locked in product order, like checkout, so two writers cannot deadlock.
+    CatalogVersion.objects.bulk_create(
+        [CatalogVersion(product_id=product_id, version=None) for product_id in product_ids],
+        update_conflicts=True, unique_fields=["product_id"], update_fields=["version"],
+    )
+    transaction.on_commit(publish_pending)
+
+
+def publish_pending():
+    """Give every committed pending change the next catalog version."""
+    if not CatalogVersion.objects.filter(version__isnull=True).exists():
+        return
+    try:
+        with transaction.atomic():
+            # The sequence row stays locked until commit, so versions commit in order.
+            version = numbering.reserve(SEQUENCE, 1, connection)
+            CatalogVersion.objects.filter(version__isnull=True).update(version=version)
+    except DatabaseError:
+        # The changes stay pending for the next publication or read.
+        logger.exception("Could not publish catalog changes")
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    mark_changed([instance.pk])
+
+
+@receiver(post_delete, sender=Inventory)
+def inventory_deleted(sender, instance, **kwargs):
+    mark_changed([instance.product_id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    # Entries carry the category name; deleting a category clears it on its products.
+    mark_changed(instance.products.values_list("pk", flat=True))
+
+
+@receiver(stock_changed)
+def stock_updated(sender, product_ids, **kwargs):
+    mark_changed(product_ids)
+
+
+@receiver(catalog_changed)
+def catalog_updated(sender, product_ids, **kwargs):
+    mark_changed(product_ids)
@@ -0,0 +1,124 @@
+"""
+Conditional GET support for the products app endpoints.
+
+A validators function takes the request and URL arguments and returns
+(etag, last_modified) from one or two cheap queries. Views run it before any
+serializer, so a matching If-None-Match / If-Modified-Since is answered with
+304 Not Modified for the price of those queries.
+
+Product and inventory reads are keyed on the catalog version, which is bumped
+after every product, inventory or category change (see catalog.py). Pending
+changes are published first, so a change whose publication was lost cannot
+hide behind a 304.
+Categories can change without touching a product, so theirs come from the
+row count and latest `updated_at`, as do the supplier rows in inventory
+responses (read in the same query as the catalog version).
+"""
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from django.db import connection
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from api.models import NumberSequence
+from suppliers.models import ProductSupplier, Supplier
+from . import catalog
+from .models import CatalogVersion, Category
+
+
+def table_state(queryset):
+    """(row count, latest updated_at) of `queryset`."""
+    state = queryset.aggregate(count=Count("pk"), latest=Max("updated_at"))
+    return state["count"], state["latest"]
+
+
+def state_tag(count, latest):
+    return f"{count}.{int(latest.timestamp() * 1e6) if latest else 0}"
+
+
+def category_list(request, *args, **kwargs):
+    count, latest = table_state(Category.objects.all())
+    return f"categories-{state_tag(count, latest)}", latest
+
+
+def category_detail(request, *args, pk=None, **kwargs):
+    try:
+        latest = Category.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+    except (TypeError, ValueError):
+        latest = None
+    if latest is None:
+        # Let the view answer 404.
+        return None, None
+    return f"category-{pk}-{state_tag(1, latest)}", latest
+
+
+def catalog_state(columns):
+    """Read `columns` (after the catalog sequence's next value) once pending catalog changes are published.
+
+    Whether any are pending is read in the same query, so this costs one
+    query unless there is something to publish.
+    """
+    quote = connection.ops.quote_name
+    sql = (
+        f"SELECT (SELECT next_value FROM {quote(NumberSequence._meta.db_table)} WHERE name = %s), "
+        f"{''.join(column + ', ' for column in columns)}"
+        f"EXISTS(SELECT 1 FROM {quote(CatalogVersion._meta.db_table)} WHERE version IS NULL)"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [catalog.SEQUENCE])
+        *state, pending = cursor.fetchone()
+        if pending:
+            catalog.publish_pending()
+            cursor.execute(sql, [catalog.SEQUENCE])
+            *state, _ = cursor.fetchone()
+    return tuple(state)
+
+
+def products(request, *args, **kwargs):
+    next_value, = catalog_state([])
+    return f"products-{next_value - 1 if next_value else 0}", None
+
+
+def inventory(request, *args, **kwargs):
+    quote = connection.ops.quote_name
+    columns = []
+    for model in (ProductSupplier, Supplier):
+        table = quote(model._meta.db_table)
+        columns += [f"(SELECT COUNT(*) FROM {table})", f"(SELECT MAX(updated_at) FROM {table})"]
+    state = catalog_state(columns)
+    return f"inventory-{hashlib.md5(repr(state).encode()).hexdigest()}", None
+
+
+def not_modified(request, etag, last_modified):
+    """The 304 (or 412) response the request's preconditions call for, else None."""
+    return get_conditional_response(
+        request,
+        etag=etag and quote_etag(etag),
+        last_modified=last_modified and timegm(last_modified.utctimetuple()),
+    )
+
+
+def set_validators(response, etag, last_modified):
+    if response.status_code in (200, 304):
+        if etag and not response.has_header("ETag"):
+            response["ETag"] = quote_etag(etag)
+        if last_modified and not response.has_header("Last-Modified"):
+            response["Last-Modified"] = http_date(timegm(last_modified.utctimetuple()))
+    return response
+
+
+def conditional_get(validators):
+    """Decorate a read-only viewset action to answer 304 when `validators` match the request."""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            etag, last_modified = validators(request, *args, **kwargs)
+            response = not_modified(request, etag, last_modified)
+            if response is None:
+                response = method(view, request, *args, **kwargs)
+            return set_validators(response, etag, last_modified)
+        return wrapper
+    return decorator
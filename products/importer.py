@@ -0,0 +1,318 @@
+"""
+Streaming catalog import.
+
+Rows are read lazily from CSV or JSON Lines and applied in chunks: each chunk
+resolves its categories, products and inventory with a handful of bulk queries
+inside one transaction. Products are matched on SKU, unchanged rows are left
+alone, and only the columns present in a row are written, so an import can be
+re-run safely. Bulk writes bypass Product.save and Inventory.save, so the
+inventory summary, ledger, scan cache and search index are told through
+`InventorySummary.adjust`, `stock_changed` and `catalog_changed` instead.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .models import Category, Inventory, InventorySummary, Product
+from .signals import StockChange, catalog_changed, stock_changed
+
+PRODUCT_FIELDS = ("name", "barcode", "description", "price", "cost", "tax_rate", "image_url")
+STOCK_FIELDS = ("quantity", "reorder_level")
+REQUIRED_FOR_NEW = ("name", "price", "cost")
+MAX_LENGTHS = {"sku": 50, "name": 200, "barcode": 50, "category": 100}
+# Largest absolute value that fits each decimal column.
+DECIMAL_LIMITS = {"price": Decimal("1e8"), "cost": Decimal("1e8"), "tax_rate": Decimal("1e3")}
+CENT = Decimal("0.01")
+
+
+def file_format(name, fmt=None):
+    return fmt or ("jsonl" if name.endswith((".jsonl", ".ndjson")) else "csv")
+
+
+def read_rows(path, fmt=None):
+    """Yield (line_number, row, error) from a CSV or JSON Lines file without loading it whole."""
+    with open(path, newline="", encoding="utf-8-sig") as handle:
+        yield from read_stream(handle, file_format(path, fmt))
+
+
+def read_stream(handle, fmt):
+    """Yield (line_number, row, error) from an open text stream in "csv" or "jsonl" format."""
+    if fmt == "csv":
+        reader = csv.DictReader(handle)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line_number, line in enumerate(handle, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_number, None, f"invalid JSON: {exc}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "expected a JSON object"
+            continue
+        yield line_number, row, None
+
+
+def _decimal(name, value):
+    try:
+        number = Decimal(str(value).strip()).quantize(CENT)
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"{name} must be a number")
+    if number < 0 or number >= DECIMAL_LIMITS[name]:
+        raise ValueError(f"{name} is out of range")
+    return number
+
+
+def _count(name, value):
+    try:
+        number = int(str(value).strip())
+    except ValueError:
+        raise ValueError(f"{name} must be a whole number")
+    if number < 0:
+        raise ValueError(f"{name} cannot be negative")
+    return number
+
+
+def clean_row(row):
+    """Validate one input row; returns only the fields it provides. Raises ValueError."""
+    row = {key.strip().lower(): value for key, value in row.items() if key}
+    sku = str(row.get("sku") or "").strip()
+    if not sku:
+        raise ValueError("sku is required")
+    cleaned = {"sku": sku}
+    for name in (*PRODUCT_FIELDS, "category", *STOCK_FIELDS):
+        if name not in row:
+            continue
+        value = "" if row[name] is None else str(row[name]).strip()
+        if name in DECIMAL_LIMITS:
+            if value:
+                cleaned[name] = _decimal(name, value)
+        elif name in STOCK_FIELDS:
+            if value:
+                cleaned[name] = _count(name, value)
+        elif name == "barcode":
+            cleaned[name] = value or None
+        elif name == "image_url" and value:
+            try:
+                URLValidator()(value)
+            except ValidationError:
+                raise ValueError("image_url is not a valid URL")
+            cleaned[name] = value
+        else:
+            cleaned[name] = value
+    for name, limit in MAX_LENGTHS.items():
+        if len(cleaned.get(name) or "") > limit:
+            raise ValueError(f"{name} is longer than {limit} characters")
+    if "name" in cleaned and not cleaned["name"]:
+        raise ValueError("name cannot be blank")
+    return cleaned
+
+
+class CatalogImporter:
+    """Apply cleaned rows in chunks. Counts accumulate across chunks."""
+
+    def __init__(self, chunk_size=2000):
+        self.chunk_size = chunk_size
+        self.categories = {}
+        self.counts = {"rows": 0, "created": 0, "updated": 0, "unchanged": 0, "rejected": 0}
+        self.rejects = []
+
+    def reject(self, line_number, sku, reason):
+        self.counts["rejected"] += 1
+        self.rejects.append((line_number, sku, reason))
+
+    def run(self, rows, progress=None):
+        """Import (line_number, row, error) tuples from `read_rows`; `progress(counts)` runs per chunk."""
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                return self.counts
+            self.counts["rows"] += len(chunk)
+            cleaned = []
+            for line_number, row, error in chunk:
+                if error is None:
+                    try:
+                        cleaned.append((line_number, clean_row(row)))
+                        continue
+                    except ValueError as exc:
+                        error = str(exc)
+                self.reject(line_number, (row or {}).get("sku", ""), error)
+            categories = dict(self.categories)
+            rejected = len(self.rejects)
+            try:
+                with transaction.atomic():
+                    self.apply(cleaned)
+            except DatabaseError as exc:
+                self.categories = categories
+                self.counts["rejected"] -= len(self.rejects) - rejected
+                del self.rejects[rejected:]
+                for line_number, row in cleaned:
+                    self.reject(line_number, row["sku"], f"chunk failed: {exc}")
+            if progress:
+                progress(self.counts)
+
+    def apply(self, rows):
+        # A later row for the same SKU wins; the earlier ones are reported so the counts add up.
+        latest = {}
+        for line_number, row in rows:
+            superseded = latest.get(row["sku"])
+            if superseded is not None:
+                self.reject(superseded[0], row["sku"], f"duplicate sku, superseded by line {line_number}")
+            latest[row["sku"]] = (line_number, row)
+        rows = list(latest.values())
+        existing = Product.objects.in_bulk([row["sku"] for _, row in rows], field_name="sku")
+        rows = self._check_barcodes(rows)
+        self._resolve_categories({row["category"] for _, row in rows if row.get("category")})
+
+        now = timezone.now()
+        new_products, changed_products, changed_fields = [], [], set()
+        codes, price_changes = set(), {}
+        for line_number, row in rows:
+            product = existing.get(row["sku"])
+            values = {name: row[name] for name in PRODUCT_FIELDS if name in row}
+            if "category" in row:
+                values["category_id"] = self.categories[row["category"]] if row["category"] else None
+            if product is None:
+                missing = [name for name in REQUIRED_FOR_NEW if name not in values]
+                if missing:
+                    self.reject(line_number, row["sku"], f"new product needs {', '.join(missing)}")
+                    continue
+                new_products.append(Product(sku=row["sku"], **values))
+                codes.update((row["sku"], values.get("barcode")))
+                continue
+            changed = {name for name, value in values.items() if getattr(product, name) != value}
+            if not changed:
+                continue
+            if "price" in changed:
+                price_changes[product.pk] = values["price"] - product.price
+            if "barcode" in changed:
+                codes.update((product.barcode, values["barcode"]))
+            for name in changed:
+                setattr(product, name, values[name])
+            product.updated_at = now
+            changed_products.append(product)
+            changed_fields.update(changed)
+            codes.add(product.sku)
+
+        Product.objects.bulk_create(new_products, batch_size=self.chunk_size)
+        if changed_products:
+            fields = [name.removesuffix("_id") for name in changed_fields]
+            Product.objects.bulk_update(changed_products, [*fields, "updated_at"], batch_size=self.chunk_size)
+        new_ids = dict(
+            Product.objects.filter(sku__in=[p.sku for p in new_products]).values_list("sku", "id")
+        )
+        product_ids = {sku: product.pk for sku, product in existing.items()}
+        product_ids.update(new_ids)
+        prices = {product.pk: product.price for product in existing.values()}
+        prices.update((new_ids[p.sku], p.price) for p in new_products)
+
+        stock_rows = {
+            product_ids[row["sku"]]: row for _, row in rows
+            if row["sku"] in product_ids
+            and (row["sku"] in new_ids or any(name in row for name in STOCK_FIELDS))
+        }
+        price_delta, restocked = self._apply_stock(stock_rows, price_changes, prices, now)
+
+        InventorySummary.objects.adjust(total_products=len(new_products), inventory_value=price_delta)
+        touched = [*new_ids.values(), *(product.pk for product in changed_products)]
+        if touched:
+            catalog_changed.send(sender=Product, product_ids=touched, codes=[code for code in codes if code])
+
+        updated = {product.pk for product in changed_products} | (restocked - set(new_ids.values()))
+        self.counts["created"] += len(new_products)
+        self.counts["updated"] += len(updated)
+        self.counts["unchanged"] += sum(1 for _, row in rows if row["sku"] in existing) - len(updated)
+
+    def _check_barcodes(self, rows):
+        barcodes = [row["barcode"] for _, row in rows if row.get("barcode")]
+        owners = dict(Product.objects.filter(barcode__in=barcodes).values_list("barcode", "sku"))
+        accepted = []
+        for line_number, row in rows:
+            barcode = row.get("barcode")
+            owner = owners.get(barcode) if barcode else None
+            if owner is not None and owner != row["sku"]:
+                self.reject(line_number, row["sku"], f"barcode {barcode} already belongs to SKU {owner}")
+                continue
+            if barcode:
+                owners[barcode] = row["sku"]
+            accepted.append((line_number, row))
+        return accepted
+
+    def _resolve_categories(self, names):
+        missing = names - self.categories.keys()
+        if not missing:
+            return
+        # Category names are not unique; the oldest one wins.
+        for pk, name in Category.objects.filter(name__in=missing).order_by("-pk").values_list("pk", "name"):
+            self.categories[name] = pk
+        to_create = missing - self.categories.keys()
+        if to_create:
+            Category.objects.bulk_create([Category(name=name) for name in sorted(to_create)])
+            self.categories.update(
+                Category.objects.filter(name__in=to_create).order_by("-pk").values_list("name", "pk")
+            )
+
+    def _apply_stock(self, stock_rows, price_changes, prices, now):
+        """Create or update inventory rows.
+
+        Returns the inventory value change caused by price edits and the ids of
+        products whose stock row changed.
+        """
+        locked_ids = sorted(stock_rows.keys() | price_changes.keys())
+        # Locked in product order, like checkout, so the two cannot deadlock.
+        inventories = {
+            inventory.product_id: inventory
+            for inventory in Inventory.objects.select_for_update(of=("self",))
+            .filter(product_id__in=locked_ids)
+            .order_by("product_id")
+        }
+        price_delta = sum(
+            (inventories[pk].quantity * change for pk, change in price_changes.items() if pk in inventories),
+            Decimal("0"),
+        )
+
+        new_inventories, changed_inventories, changes = [], [], []
+        for product_id, row in stock_rows.items():
+            inventory = inventories.get(product_id)
+            if inventory is None:
+                inventory = Inventory(
+                    product_id=product_id,
+                    quantity=row.get("quantity", 0),
+                    reorder_level=row.get("reorder_level", 10),
+                )
+                new_inventories.append(inventory)
+                old_quantity = old_reorder_level = None
+            else:
+                old_quantity, old_reorder_level = inventory.quantity, inventory.reorder_level
+                inventory.quantity = row.get("quantity", old_quantity)
+                inventory.reorder_level = row.get("reorder_level", old_reorder_level)
+                if (inventory.quantity, inventory.reorder_level) == (old_quantity, old_reorder_level):
+                    continue
+                inventory.updated_at = now
+                changed_inventories.append(inventory)
+            changes.append(StockChange(
+                product_id, old_quantity, inventory.quantity,
+                old_reorder_level, inventory.reorder_level, prices[product_id],
+            ))
+
+        Inventory.objects.bulk_create(new_inventories, batch_size=self.chunk_size)
+        if changed_inventories:
+            Inventory.objects.bulk_update(
+                changed_inventories, ["quantity", "reorder_level", "updated_at"], batch_size=self.chunk_size
+            )
+        if changes:
+            stock_changed.send(
+                sender=Inventory, product_ids=[change.product_id for change in changes], changes=changes,
+                transaction_type="adjustment", notes="Catalog import",
+            )
+        return price_delta, {change.product_id for change in changes}
@@ -0,0 +1,64 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from products.importer import CatalogImporter, read_rows
+
+# Rejected rows echoed to stderr when no --rejects file is given.
+MAX_REJECTS_PRINTED = 20
+
+class Command(BaseCommand):
+    help = (
+        'Stream a CSV or JSON Lines catalog into categories, products and inventory, '
+        'upserting by SKU in chunks. Safe to re-run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Catalog file. Columns: sku, name, barcode, description, category, '
+                                         'price, cost, tax_rate, image_url, quantity, reorder_level')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows per transaction')
+        parser.add_argument('--rejects', help='Write rejected rows (line, sku, reason) to this CSV file')
+
+    def handle(self, *args, **options):
+        try:
+            open(options['path']).close()
+        except OSError as exc:
+            raise CommandError(f"Cannot read {options['path']}: {exc}")
+
+        importer = CatalogImporter(chunk_size=options['chunk_size'])
+        rejects_file = open(options['rejects'], 'w', newline='') if options['rejects'] else None
+        rejects_writer = csv.writer(rejects_file) if rejects_file else None
+        if rejects_writer:
+            rejects_writer.writerow(['line', 'sku', 'reason'])
+        started = time.perf_counter()
+        printed = 0
+
+        def progress(counts):
+            nonlocal printed
+            # Drain rejects every chunk so memory stays bounded on large files.
+            for line_number, sku, reason in importer.rejects:
+                if rejects_writer:
+                    rejects_writer.writerow([line_number, sku, reason])
+                elif printed < MAX_REJECTS_PRINTED:
+                    self.stderr.write(f'line {line_number} ({sku or "no sku"}): {reason}')
+                    printed += 1
+            importer.rejects.clear()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{counts['rows']} rows in {elapsed:.1f}s ({counts['rows'] / max(elapsed, 1e-9):.0f} rows/s): "
+                f"{counts['created']} created, {counts['updated']} updated, "
+                f"{counts['unchanged']} unchanged, {counts['rejected']} rejected"
+            )
+
+        try:
+            counts = importer.run(read_rows(options['path'], options['format']), progress=progress)
+        finally:
+            if rejects_file:
+                rejects_file.close()
+
+        style = self.style.WARNING if counts['rejected'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f"Imported {counts['rows']} rows: {counts['created']} created, {counts['updated']} updated, "
+            f"{counts['unchanged']} unchanged, {counts['rejected']} rejected."
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from products.models import Inventory, InventorySummary
+
+class Command(BaseCommand):
+    help = 'Compare the maintained inventory summary counters and low-stock flags with a full recomputation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Replace the counters and flags with the recomputed values')
+
+    def handle(self, *args, **options):
+        self.verify_low_stock_flags(options['fix'])
+        maintained = InventorySummary.objects.totals()
+        exact = InventorySummary.objects.compute()
+        drift = {
+            key: (maintained[key], exact[key])
+            for key in exact
+            if maintained[key] != exact[key]
+        }
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Inventory summary counters are consistent.'))
+            return
+
+        for key, (have, want) in drift.items():
+            self.stdout.write(self.style.WARNING(f'{key}: maintained {have}, actual {want}'))
+        if options['fix']:
+            InventorySummary.objects.recompute()
+            self.stdout.write(self.style.SUCCESS('Inventory summary counters recomputed.'))
+
+    def verify_low_stock_flags(self, fix):
+        low = Q(quantity__lte=F('reorder_level'))
+        stale = Inventory.objects.filter((low & Q(is_low_stock=False)) | (~low & Q(is_low_stock=True)))
+        count = stale.count()
+        if not count:
+            self.stdout.write(self.style.SUCCESS('Low-stock flags are consistent.'))
+            return
+        self.stdout.write(self.style.WARNING(f'{count} inventory row(s) with a stale low-stock flag'))
+        if fix:
+            Inventory.objects.filter(low, is_low_stock=False).update(is_low_stock=True)
+            Inventory.objects.filter(~low, is_low_stock=True).update(is_low_stock=False)
+            self.stdout.write(self.style.SUCCESS('Low-stock flags recomputed.'))
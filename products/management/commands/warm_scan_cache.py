@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from products import scan_cache
+
+class Command(BaseCommand):
+    help = 'Load every product into the shared tier of the barcode/SKU scan cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        count = scan_cache.warm(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Warmed scan cache with {count} products.'))
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Trigram GIN indexes back ranked search; the UPPER(name) pattern index backs
+# short typeahead prefixes, matching the SQL Django emits for `istartswith`.
+CREATE_INDEXES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS products_product_name_trgm ON products_product USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS products_product_sku_trgm ON products_product USING gin (sku gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS products_category_name_trgm ON products_category USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS products_product_name_upper_prefix ON products_product (UPPER(name::text) text_pattern_ops)",
+]
+
+DROP_INDEXES = [
+    "DROP INDEX IF EXISTS products_product_name_trgm",
+    "DROP INDEX IF EXISTS products_product_sku_trgm",
+    "DROP INDEX IF EXISTS products_category_name_trgm",
+    "DROP INDEX IF EXISTS products_product_name_upper_prefix",
+]
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgres(CREATE_INDEXES), run_on_postgres(DROP_INDEXES)),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.20 on 2026-10-18 09:45
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+SHARDS = 16
+
+
+def populate_summary(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Inventory = apps.get_model('products', 'Inventory')
+    InventorySummary = apps.get_model('products', 'InventorySummary')
+    value = Inventory.objects.aggregate(total=Sum(F('quantity') * F('product__price')))['total'] or 0
+    InventorySummary.objects.bulk_create(
+        [InventorySummary(
+            shard=0,
+            total_products=Product.objects.count(),
+            low_stock_count=Inventory.objects.filter(quantity__lte=F('reorder_level')).count(),
+            inventory_value=value,
+        )]
+        + [InventorySummary(shard=shard) for shard in range(1, SHARDS)]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_product_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField(unique=True)),
+                ('total_products', models.IntegerField(default=0)),
+                ('low_stock_count', models.IntegerField(default=0)),
+                ('inventory_value', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Inventory summary',
+            },
+        ),
+        migrations.RunPython(populate_summary, migrations.RunPython.noop),
+    ]
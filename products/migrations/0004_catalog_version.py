@@ -0,0 +1,21 @@
+# Generated by Django 4.2.20 on 2026-10-18 10:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_inventorysummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.BigIntegerField(unique=True)),
+                ('version', models.BigIntegerField(db_index=True)),
+            ],
+        ),
+    ]
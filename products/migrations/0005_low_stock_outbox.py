@@ -0,0 +1,45 @@
+# Generated by Django 4.2.20 on 2026-10-18 10:22
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def flag_low_stock(apps, schema_editor):
+    Inventory = apps.get_model('products', 'Inventory')
+    Inventory.objects.filter(quantity__lte=F('reorder_level')).update(is_low_stock=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_catalog_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LowStockEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.BigIntegerField(null=True, unique=True)),
+                ('product_id', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('low', 'Fell to or below reorder level'), ('restocked', 'Back above reorder level')], max_length=10)),
+                ('quantity', models.IntegerField()),
+                ('reorder_level', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='is_low_stock',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(flag_low_stock, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(condition=models.Q(('is_low_stock', True)), fields=['id'], name='inventory_low_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lowstockevent',
+            index=models.Index(condition=models.Q(('position__isnull', True)), fields=['id'], name='lowstockevent_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_low_stock_outbox'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='catalogversion',
+            name='version',
+            field=models.BigIntegerField(db_index=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='catalogversion',
+            index=models.Index(condition=models.Q(('version__isnull', True)), fields=['id'], name='catalogversion_pending_idx'),
+        ),
+    ]
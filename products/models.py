@@ -1,4 +1,13 @@
-from django.db import models
+import os
+import threading
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .signals import StockChange, stock_changed
 
 
 class Category(models.Model):
@@ -14,6 +23,14 @@ class Category(models.Model):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    def with_stock(self):
+        """Join the category and annotate `stocks_available` in one query."""
+        return self.select_related("category").annotate(
+            stocks_available=Coalesce(F("inventory__quantity"), Value(0))
+        )
+
+
 class Product(models.Model):
     name = models.CharField(max_length=200)
     sku = models.CharField(max_length=50, unique=True)
@@ -29,9 +46,102 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.name} (SKU: {self.sku})"
 
+    def save(self, *args, **kwargs):
+        # Keep InventorySummary in step with new products and price changes.
+        with transaction.atomic():
+            previous_price = None
+            if not self._state.adding:
+                previous_price = Product.objects.filter(pk=self.pk).values_list("price", flat=True).first()
+            super().save(*args, **kwargs)
+            InventorySummary.objects.product_saved(self, previous_price)
+
+
+class InsufficientStock(Exception):
+    """Raised when a conditional stock decrement finds too little stock."""
+
+    def __init__(self, shortages):
+        # {product_id: units actually available}
+        self.shortages = shortages
+        super().__init__(f"Insufficient stock for product(s) {sorted(shortages)}")
+
+
+class InventoryQuerySet(models.QuerySet):
+    def _lock_rows(self, product_ids):
+        """Lock inventory rows in product order so overlapping carts cannot deadlock."""
+        return {
+            row[0]: row
+            for row in self.select_for_update(of=("self",))
+            .filter(product_id__in=product_ids)
+            .order_by("product_id")
+            .values_list("product_id", "quantity", "reorder_level", "product__price")
+        }
+
+    @staticmethod
+    def _units(quantities):
+        return Case(
+            *[When(product_id=product_id, then=Value(units)) for product_id, units in quantities.items()],
+            output_field=models.IntegerField(),
+        )
+
+    def decrement_stock(self, quantities, **context):
+        """Atomically subtract `quantities` ({product_id: units}) from stock.
+
+        Must run inside a transaction. Rows are locked in product order, then a
+        single conditional UPDATE decrements every row that still has enough
+        stock. If any row falls short `InsufficientStock` is raised and the
+        caller's transaction must roll back. `context` (transaction_type,
+        reference_id, user, notes) is passed on with `stock_changed`.
+        """
+        if not quantities:
+            return 0
+        product_ids = sorted(quantities)
+        locked = self._lock_rows(product_ids)
+        units = self._units(quantities)
+        updated = self.filter(product_id__in=product_ids, quantity__gte=units).update(
+            quantity=F("quantity") - units,
+            updated_at=timezone.now(),
+        )
+        if updated != len(product_ids):
+            available = {product_id: locked[product_id][1] if product_id in locked else 0 for product_id in product_ids}
+            raise InsufficientStock({
+                product_id: available[product_id]
+                for product_id in product_ids
+                if available[product_id] < quantities[product_id]
+            })
+        stock_changed.send(sender=Inventory, product_ids=product_ids, changes=[
+            StockChange(product_id, quantity, quantity - quantities[product_id], reorder_level, reorder_level, price)
+            for product_id, quantity, reorder_level, price in locked.values()
+        ], **context)
+        return updated
+
+    def increment_stock(self, quantities, last_restock_date=None, **context):
+        """Add `quantities` ({product_id: units}) to stock with one locked UPDATE.
+
+        Must run inside a transaction. Products without an inventory row are
+        skipped; the number of rows updated is returned.
+        """
+        if not quantities:
+            return 0
+        product_ids = sorted(quantities)
+        locked = self._lock_rows(product_ids)
+        changes = {
+            "quantity": F("quantity") + self._units(quantities),
+            "updated_at": timezone.now(),
+        }
+        if last_restock_date is not None:
+            changes["last_restock_date"] = last_restock_date
+        updated = self.filter(product_id__in=locked).update(**changes)
+        stock_changed.send(sender=Inventory, product_ids=list(locked), changes=[
+            StockChange(product_id, quantity, quantity + quantities[product_id], reorder_level, reorder_level, price)
+            for product_id, quantity, reorder_level, price in locked.values()
+        ], **context)
+        return updated
+
 
 class Inventory(models.Model):
     product = models.OneToOneField(
@@ -40,11 +150,199 @@ class Inventory(models.Model):
     quantity = models.IntegerField(default=0)
     reorder_level = models.IntegerField(default=10)
     last_restock_date = models.DateField(blank=True, null=True)
+    # quantity <= reorder_level, kept in step by products.alerts so low_stock is an index lookup.
+    is_low_stock = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = InventoryQuerySet.as_manager()
+
+    # Ledger context (transaction_type, reference_id, user, notes) for this
+    # instance's next save or delete; views set it to credit the caller.
+    stock_context = None
+
     class Meta:
         verbose_name_plural = "Inventory"
+        indexes = [
+            # Covers only the (few) low rows, in the order the low_stock endpoint lists them.
+            models.Index(fields=["id"], condition=Q(is_low_stock=True), name="inventory_low_stock_idx"),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.quantity} in stock"
+
+    def save(self, *args, **kwargs):
+        # Announce the movement so maintained counters and caches follow it.
+        with transaction.atomic():
+            previous = (None, None)
+            if not self._state.adding:
+                previous = (
+                    Inventory.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list("quantity", "reorder_level")
+                    .first()
+                ) or previous
+            self.is_low_stock = self.quantity <= self.reorder_level
+            super().save(*args, **kwargs)
+            change = StockChange(
+                self.product_id, previous[0], self.quantity,
+                previous[1], self.reorder_level, self.product.price,
+            )
+            stock_changed.send(sender=Inventory, product_ids=[self.product_id], changes=[change],
+                               **(self.stock_context or {}))
+
+
+class InventorySummaryQuerySet(models.QuerySet):
+    SHARDS = 16
+    TOTALS = dict(
+        products=Coalesce(Sum("total_products"), 0),
+        low_stock=Coalesce(Sum("low_stock_count"), 0),
+        value=Coalesce(Sum("inventory_value"), Decimal("0")),
+    )
+
+    def adjust(self, total_products=0, low_stock_count=0, inventory_value=0):
+        """Add deltas to this worker's shard row inside the caller's transaction."""
+        if not (total_products or low_stock_count or inventory_value):
+            return
+        # A stable shard per worker thread spreads row locks without risking
+        # deadlocks between shards inside one transaction.
+        shard = (os.getpid() ^ threading.get_ident()) % self.SHARDS
+        deltas = dict(
+            total_products=F("total_products") + total_products,
+            low_stock_count=F("low_stock_count") + low_stock_count,
+            inventory_value=F("inventory_value") + Decimal(inventory_value),
+            updated_at=timezone.now(),
+        )
+        if not self.filter(shard=shard).update(**deltas):
+            self.bulk_create([InventorySummary(shard=shard)], ignore_conflicts=True)
+            self.filter(shard=shard).update(**deltas)
+
+    def product_saved(self, product, previous_price):
+        if previous_price is None:
+            self.adjust(total_products=1)
+            return
+        price_change = Decimal(product.price) - previous_price
+        if price_change:
+            quantity = Inventory.objects.filter(product=product).values_list("quantity", flat=True).first() or 0
+            self.adjust(inventory_value=quantity * price_change)
+
+    def apply_stock_changes(self, changes):
+        low_stock_count = 0
+        inventory_value = Decimal("0")
+        for change in changes:
+            if change.old_quantity is not None:
+                low_stock_count -= change.old_quantity <= change.old_reorder_level
+                inventory_value -= change.old_quantity * Decimal(change.price)
+            if change.new_quantity is not None:
+                low_stock_count += change.new_quantity <= change.new_reorder_level
+                inventory_value += change.new_quantity * Decimal(change.price)
+        self.adjust(low_stock_count=low_stock_count, inventory_value=inventory_value)
+
+    def totals(self):
+        """Current summary: one query over at most SHARDS rows."""
+        return self._summary(self.aggregate(**self.TOTALS))
+
+    async def atotals(self):
+        return self._summary(await self.aaggregate(**self.TOTALS))
+
+    @staticmethod
+    def _summary(totals):
+        return {
+            "total_products": totals["products"],
+            "low_stock_count": totals["low_stock"],
+            "overall_inventory_value": totals["value"],
+        }
+
+    def compute(self):
+        """Recompute the summary from the catalog with full-table queries."""
+        return {
+            "total_products": Product.objects.count(),
+            "low_stock_count": Inventory.objects.filter(quantity__lte=F("reorder_level")).count(),
+            "overall_inventory_value": Inventory.objects.aggregate(
+                total_value=Sum(F("quantity") * F("product__price"))
+            )["total_value"] or 0,
+        }
+
+    def recompute(self):
+        """Replace the maintained counters with freshly computed values."""
+        with transaction.atomic():
+            # Locking every shard first makes concurrent adjustments wait and
+            # then apply on top of the recomputed values.
+            list(self.select_for_update().order_by("shard").values_list("shard", flat=True))
+            exact = self.compute()
+            self.all().delete()
+            self.bulk_create(
+                [InventorySummary(
+                    shard=0,
+                    total_products=exact["total_products"],
+                    low_stock_count=exact["low_stock_count"],
+                    inventory_value=exact["overall_inventory_value"],
+                )]
+                + [InventorySummary(shard=shard) for shard in range(1, self.SHARDS)]
+            )
+        return exact
+
+
+class InventorySummary(models.Model):
+    """Sharded counters behind the inventory summary endpoint; sum the shards to read."""
+
+    shard = models.PositiveSmallIntegerField(unique=True)
+    total_products = models.IntegerField(default=0)
+    low_stock_count = models.IntegerField(default=0)
+    inventory_value = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InventorySummaryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = "Inventory summary"
+
+    def __str__(self):
+        return f"Inventory summary shard {self.shard}"
+
+
+class CatalogVersion(models.Model):
+    """Catalog version at which each product last changed; a product that no longer exists is a tombstone.
+
+    The changing transaction sets `version` to null; the change is pending
+    until a publication gives it the next version (see products.catalog).
+    """
+
+    product_id = models.BigIntegerField(unique=True)
+    version = models.BigIntegerField(null=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["id"], condition=Q(version__isnull=True), name="catalogversion_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"Product {self.product_id} @ {self.version or 'pending'}"
+
+
+class LowStockEvent(models.Model):
+    """Outbox of low-stock threshold crossings, read by consumers in `position` order.
+
+    Rows are written in the transaction that moved the stock and get their
+    position once it commits (see products.alerts), so positions become
+    visible in order and a consumer's cursor never skips an event.
+    """
+
+    LOW = "low"
+    RESTOCKED = "restocked"
+    KIND_CHOICES = [(LOW, "Fell to or below reorder level"), (RESTOCKED, "Back above reorder level")]
+
+    position = models.BigIntegerField(null=True, unique=True)
+    product_id = models.BigIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    quantity = models.IntegerField()
+    reorder_level = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["id"], condition=Q(position__isnull=True), name="lowstockevent_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"Product {self.product_id} {self.kind} ({self.quantity}/{self.reorder_level})"
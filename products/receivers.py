@@ -0,0 +1,24 @@
+"""Keeps the maintained InventorySummary counters in step with the catalog."""
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Inventory, InventorySummary, Product
+from .signals import StockChange, stock_changed
+
+
+@receiver(stock_changed)
+def summarize_stock_changes(sender, changes=(), **kwargs):
+    InventorySummary.objects.apply_stock_changes(changes)
+
+
+@receiver(post_delete, sender=Inventory)
+def summarize_inventory_deleted(sender, instance, **kwargs):
+    price = Product.objects.filter(pk=instance.product_id).values_list("price", flat=True).first() or 0
+    InventorySummary.objects.apply_stock_changes([
+        StockChange(instance.product_id, instance.quantity, None, instance.reorder_level, None, price)
+    ])
+
+
+@receiver(post_delete, sender=Product)
+def summarize_product_deleted(sender, instance, **kwargs):
+    InventorySummary.objects.adjust(total_products=-1)
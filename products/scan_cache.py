@@ -0,0 +1,289 @@
+"""
+Two-tier barcode/SKU -> product lookup used by the cashier scan path.
+
+Tier one is a small per-process LRU with a short TTL, so repeated scans of the
+same item never leave the worker. Tier two is the Django cache framework
+(shared between workers when CACHES points at Redis). Entries are dropped from
+both tiers when the product or its inventory changes; other workers' local
+tiers catch up within SCAN_CACHE_LOCAL_TTL seconds.
+
+A miss reads the database and then stores what it read, so an invalidation
+can commit in between. Every invalidation therefore takes the next value of a
+shared epoch counter and records it against its products. A miss reads the
+epoch before the database, and after storing it drops any product that has
+been invalidated since. Either that check sees the invalidation, or the
+invalidation runs after the store and deletes the entry itself.
+
+With SCAN_CACHE_WARM_ON_BOOT the WSGI/ASGI entry points warm the shared tier
+from a background thread as workers boot; the first worker to boot within
+SCAN_CACHE_TIMEOUT does it and the others skip.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Inventory, Product
+from .signals import catalog_changed, stock_changed
+
+CACHE_TIMEOUT = getattr(settings, "SCAN_CACHE_TIMEOUT", 300)
+LOCAL_TTL = getattr(settings, "SCAN_CACHE_LOCAL_TTL", 5)
+LOCAL_SIZE = getattr(settings, "SCAN_CACHE_LOCAL_SIZE", 10000)
+EPOCH_KEY = "scan:epoch"
+WARM_KEY = "scan:warming"
+
+logger = logging.getLogger(__name__)
+
+
+class LocalLRU:
+    """Thread-safe LRU with a per-entry TTL."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LocalLRU(LOCAL_SIZE, LOCAL_TTL)
+
+
+def code_key(code):
+    return f"scan:code:{code}"
+
+
+def product_key(product_id):
+    return f"scan:product:{product_id}"
+
+
+def invalidated_key(product_id):
+    return f"scan:invalidated:{product_id}"
+
+
+def to_payload(product):
+    """Flatten a product (with its inventory joined) into the cached scan payload."""
+    try:
+        stock_quantity = product.inventory.quantity
+    except Inventory.DoesNotExist:
+        stock_quantity = 0
+    return {
+        "id": product.id,
+        "name": product.name,
+        "sku": product.sku,
+        "barcode": product.barcode,
+        "price": str(product.price),
+        "tax_rate": str(product.tax_rate),
+        "category": product.category_id,
+        "stock_quantity": stock_quantity,
+    }
+
+
+def _entries(payloads, local=True):
+    """Return the shared-tier entries for `payloads`, filling the local tier too when `local`."""
+    entries = {}
+    for payload in payloads:
+        codes = [code for code in (payload["sku"], payload["barcode"]) if code]
+        for code in codes:
+            entries[code_key(code)] = payload
+            if local:
+                local_cache.set(code_key(code), payload)
+        entries[product_key(payload["id"])] = codes
+    return entries
+
+
+def _invalidated_since(epoch, payloads, invalidated):
+    """Ids of `payloads` invalidated after `epoch`, given the get_many of their invalidated keys."""
+    return [
+        payload["id"] for payload in payloads
+        if invalidated.get(invalidated_key(payload["id"]), 0) > epoch
+    ]
+
+
+def _store(payloads, epoch, local=True):
+    """Cache `payloads`, read from the database after the epoch was `epoch`."""
+    cache.set_many(_entries(payloads, local), CACHE_TIMEOUT)
+    invalidated = cache.get_many([invalidated_key(payload["id"]) for payload in payloads])
+    _drop(_invalidated_since(epoch, payloads, invalidated))
+
+
+def _matching(code):
+    return Product.objects.select_related("inventory").filter(Q(barcode=code) | Q(sku=code))[:2]
+
+
+def _best_match(code, matches):
+    # A barcode match wins over a SKU that happens to share the same value.
+    return next((p for p in matches if p.barcode == code), matches[0])
+
+
+def lookup(code):
+    """Return the scan payload for a barcode or SKU, or None if no product matches."""
+    key = code_key(code)
+    payload = local_cache.get(key)
+    if payload is not None:
+        return payload
+    payload = cache.get(key)
+    if payload is not None:
+        local_cache.set(key, payload)
+        return payload
+
+    epoch = cache.get(EPOCH_KEY, 0)
+    matches = list(_matching(code))
+    if not matches:
+        return None
+    payload = to_payload(_best_match(code, matches))
+    _store([payload], epoch)
+    return payload
+
+
+async def alookup(code):
+    """lookup() for async views; a local-tier hit never leaves the event loop."""
+    key = code_key(code)
+    payload = local_cache.get(key)
+    if payload is not None:
+        return payload
+    payload = await cache.aget(key)
+    if payload is not None:
+        local_cache.set(key, payload)
+        return payload
+
+    epoch = await cache.aget(EPOCH_KEY, 0)
+    matches = [product async for product in _matching(code)]
+    if not matches:
+        return None
+    payload = to_payload(_best_match(code, matches))
+    await cache.aset_many(_entries([payload]), CACHE_TIMEOUT)
+    stale = _invalidated_since(epoch, [payload], await cache.aget_many([invalidated_key(payload["id"])]))
+    if stale:
+        await sync_to_async(_drop)(stale)
+    return payload
+
+
+def _next_epoch():
+    try:
+        return cache.incr(EPOCH_KEY)
+    except ValueError:
+        cache.add(EPOCH_KEY, 0, None)
+        return cache.incr(EPOCH_KEY)
+
+
+def invalidate(product_ids, codes=()):
+    """Drop the given products (and any extra codes) from both cache tiers."""
+    product_ids = list(product_ids)
+    if product_ids:
+        epoch = _next_epoch()
+        cache.set_many({invalidated_key(product_id): epoch for product_id in product_ids}, CACHE_TIMEOUT)
+    _drop(product_ids, codes)
+
+
+def _drop(product_ids, codes=()):
+    if not product_ids and not codes:
+        return
+    index = cache.get_many([product_key(product_id) for product_id in product_ids])
+    keys = {code_key(code) for code in codes if code}
+    for indexed_codes in index.values():
+        keys.update(code_key(code) for code in indexed_codes)
+    for key in keys:
+        local_cache.delete(key)
+    cache.delete_many([*keys, *(product_key(product_id) for product_id in product_ids)])
+
+
+def warm(chunk_size=2000):
+    """Load every product into the shared tier (see the warm_scan_cache command)."""
+    queryset = Product.objects.select_related("inventory").order_by("pk")
+    epoch = cache.get(EPOCH_KEY, 0)
+    batch = []
+    count = 0
+    for product in queryset.iterator(chunk_size=chunk_size):
+        batch.append(to_payload(product))
+        if len(batch) >= chunk_size:
+            _store(batch, epoch, local=False)
+            count += len(batch)
+            batch = []
+    if batch:
+        _store(batch, epoch, local=False)
+    return count + len(batch)
+
+
+def warm_on_boot():
+    """Warm the shared tier in a background thread if SCAN_CACHE_WARM_ON_BOOT is set; returns the thread.
+
+    Entries live for SCAN_CACHE_TIMEOUT, so one warm per that window is enough:
+    workers booting after the first skip it.
+    """
+    if not getattr(settings, "SCAN_CACHE_WARM_ON_BOOT", False):
+        return None
+    if not cache.add(WARM_KEY, 1, CACHE_TIMEOUT):
+        return None
+    thread = threading.Thread(target=_warm_in_background, name="scan-cache-warm", daemon=True)
+    thread.start()
+    return thread
+
+
+def _warm_in_background():
+    try:
+        logger.info("Warmed the scan cache with %d products", warm())
+    except Exception:
+        logger.exception("Could not warm the scan cache")
+    finally:
+        connection.close()
+
+
+def _invalidate_on_commit(product_ids, codes=()):
+    product_ids = list(product_ids)
+    codes = list(codes)
+    transaction.on_commit(lambda: invalidate(product_ids, codes))
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    _invalidate_on_commit([instance.pk], [instance.barcode, instance.sku])
+
+
+@receiver(post_delete, sender=Inventory)
+def inventory_deleted(sender, instance, **kwargs):
+    _invalidate_on_commit([instance.product_id])
+
+
+@receiver(stock_changed)
+def stock_updated(sender, product_ids, **kwargs):
+    _invalidate_on_commit(product_ids)
+
+
+@receiver(catalog_changed)
+def catalog_updated(sender, product_ids, codes=(), **kwargs):
+    _invalidate_on_commit(product_ids, codes)
@@ -0,0 +1,270 @@
+"""
+Ranked product search and prefix autocomplete over name, SKU, barcode and
+category name.
+
+On PostgreSQL this uses the pg_trgm GIN indexes and the UPPER(name) prefix
+index created by migration 0002. Other backends fall back to an in-process
+trigram index that is built lazily, kept current by model signals, and
+rebuilt whenever another process bumps the shared version in the cache.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from django.contrib.postgres.search import TrigramSimilarity, TrigramWordSimilarity
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Category, Product
+from .signals import catalog_changed
+
+VERSION_KEY = "product_search:version"
+# Fraction of the query's trigrams a document must share to be returned.
+MIN_SCORE = 0.5
+CATEGORY_WEIGHT = 0.5
+EXACT_CODE_SCORE = 2.0
+
+
+def normalize(text):
+    return " ".join((text or "").lower().split())
+
+
+def trigrams(text):
+    """pg_trgm-style trigrams: each word padded with two leading and one trailing space."""
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NgramIndex:
+    """In-process trigram and token-prefix index used when PostgreSQL is not available."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = None
+        self.docs = {}
+        self.name_grams = defaultdict(set)
+        self.category_grams = defaultdict(set)
+        self.codes = {}
+        self.tokens = []
+
+    def build(self, version):
+        with self._lock:
+            self.__init__()
+            rows = Product.objects.values_list("id", "name", "sku", "barcode", "category__name")
+            for row in rows.iterator(chunk_size=5000):
+                self._add(*row)
+            self.tokens.sort()
+            self.version = version
+
+    def _add(self, product_id, name, sku, barcode, category_name, keep_sorted=False):
+        doc = {"name": name, "sku": sku, "barcode": barcode, "category": category_name}
+        self.docs[product_id] = doc
+        for gram in trigrams(name):
+            self.name_grams[gram].add(product_id)
+        for gram in trigrams(category_name):
+            self.category_grams[gram].add(product_id)
+        for code in (sku, barcode):
+            if code:
+                self.codes[code.lower()] = product_id
+        for token in set(normalize(name).split()):
+            if keep_sorted:
+                insort(self.tokens, (token, product_id))
+            else:
+                self.tokens.append((token, product_id))
+
+    def _remove(self, product_id):
+        doc = self.docs.pop(product_id, None)
+        if doc is None:
+            return
+        for gram in trigrams(doc["name"]):
+            self.name_grams[gram].discard(product_id)
+        for gram in trigrams(doc["category"]):
+            self.category_grams[gram].discard(product_id)
+        for code in (doc["sku"], doc["barcode"]):
+            if code and self.codes.get(code.lower()) == product_id:
+                del self.codes[code.lower()]
+        for token in set(normalize(doc["name"]).split()):
+            i = bisect_left(self.tokens, (token, product_id))
+            if i < len(self.tokens) and self.tokens[i] == (token, product_id):
+                del self.tokens[i]
+
+    def update(self, product_ids):
+        with self._lock:
+            if self.version is None:
+                return
+            for product_id in product_ids:
+                self._remove(product_id)
+            rows = Product.objects.filter(pk__in=product_ids).values_list(
+                "id", "name", "sku", "barcode", "category__name"
+            )
+            for row in rows:
+                self._add(*row, keep_sorted=True)
+
+    def search(self, query, limit):
+        with self._lock:
+            scores = Counter()
+            exact = self.codes.get(normalize(query))
+            if exact is not None:
+                scores[exact] = EXACT_CODE_SCORE
+            query_grams = trigrams(query)
+            if query_grams:
+                name_hits = Counter()
+                category_hits = Counter()
+                for gram in query_grams:
+                    name_hits.update(self.name_grams.get(gram, ()))
+                    category_hits.update(self.category_grams.get(gram, ()))
+                for product_id in name_hits.keys() | category_hits.keys():
+                    name_score = name_hits[product_id] / len(query_grams)
+                    category_score = category_hits[product_id] / len(query_grams)
+                    if name_score >= MIN_SCORE or category_score >= MIN_SCORE:
+                        score = max(name_score, CATEGORY_WEIGHT * category_score)
+                        scores[product_id] = max(scores[product_id], score)
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], self.docs[item[0]]["name"]))
+            return [product_id for product_id, _ in ranked[:limit]]
+
+    def autocomplete(self, prefix, limit):
+        prefix = normalize(prefix)
+        with self._lock:
+            matches = []
+            seen = set()
+            i = bisect_left(self.tokens, (prefix,))
+            # Scan a bounded window of matching tokens, then rank what was found.
+            while i < len(self.tokens) and len(matches) < limit * 5:
+                token, product_id = self.tokens[i]
+                if not token.startswith(prefix):
+                    break
+                if product_id not in seen:
+                    seen.add(product_id)
+                    matches.append(product_id)
+                i += 1
+            matches.sort(key=lambda product_id: (
+                not normalize(self.docs[product_id]["name"]).startswith(prefix),
+                self.docs[product_id]["name"],
+            ))
+            return matches[:limit]
+
+
+local_index = NgramIndex()
+
+
+def use_postgres():
+    return connection.vendor == "postgresql"
+
+
+def _current_index():
+    # A fresh epoch if the key was evicted, so every process rebuilds.
+    version = cache.get_or_set(VERSION_KEY, time.time_ns(), None)
+    if local_index.version != version:
+        local_index.build(version)
+    return local_index
+
+
+def _in_rank_order(queryset, ids):
+    products = queryset.in_bulk(ids)
+    return [products[product_id] for product_id in ids if product_id in products]
+
+
+def search_products(query, limit=20):
+    """Return up to `limit` products matching `query`, best match first."""
+    query = query.strip()
+    if not query:
+        return []
+    if not use_postgres():
+        return _in_rank_order(Product.objects.with_stock(), _current_index().search(query, limit))
+
+    matching_categories = Category.objects.filter(name__trigram_word_similar=query).values("id")
+    text_rank = Greatest(
+        TrigramWordSimilarity(query, "name"),
+        TrigramSimilarity("sku", query),
+        Case(
+            When(category_id__in=matching_categories, then=Value(CATEGORY_WEIGHT)),
+            default=Value(0.0),
+        ),
+        output_field=FloatField(),
+    )
+    filters = (
+        Q(sku=query) | Q(barcode=query)
+        | Q(name__trigram_word_similar=query)
+        | Q(sku__trigram_similar=query)
+        | Q(category_id__in=matching_categories)
+    )
+    if len(query) < 3:
+        filters |= Q(name__istartswith=query)
+    return list(
+        Product.objects.with_stock()
+        .filter(filters)
+        .annotate(
+            rank=text_rank + Case(
+                When(Q(sku=query) | Q(barcode=query), then=Value(EXACT_CODE_SCORE)),
+                default=Value(0.0),
+            )
+        )
+        .order_by("-rank", "name")[:limit]
+    )
+
+
+def autocomplete(prefix, limit=10):
+    """Return lightweight suggestions for the cashier typeahead."""
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+    fields = ("id", "name", "sku", "barcode")
+    if not use_postgres():
+        ids = _current_index().autocomplete(prefix, limit)
+        return _in_rank_order(Product.objects.only(*fields), ids)
+
+    filters = Q(name__istartswith=prefix)
+    if len(prefix) >= 3:
+        filters |= Q(name__trigram_word_similar=prefix)
+    return list(
+        Product.objects.only(*fields)
+        .filter(filters)
+        .annotate(
+            is_prefix=Case(When(name__istartswith=prefix, then=Value(1)), default=Value(0)),
+            similarity=TrigramWordSimilarity(prefix, "name"),
+        )
+        .order_by("-is_prefix", F("similarity").desc(), "name")[:limit]
+    )
+
+
+def _index_changed(product_ids):
+    local_index.update(product_ids)
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        local_index.version = None
+        return
+    # Stay current only if no other process changed the catalog meanwhile.
+    if local_index.version is not None and version == local_index.version + 1:
+        local_index.version = version
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    if not use_postgres():
+        product_ids = [instance.pk]
+        transaction.on_commit(lambda: _index_changed(product_ids))
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def category_changed(sender, instance, created=False, **kwargs):
+    # Entries carry the category name; deleting a category clears it on its products.
+    if not use_postgres() and not created:
+        product_ids = list(instance.products.values_list("id", flat=True))
+        transaction.on_commit(lambda: _index_changed(product_ids))
+
+
+@receiver(catalog_changed)
+def catalog_updated(sender, product_ids, **kwargs):
+    if not use_postgres():
+        product_ids = list(product_ids)
+        transaction.on_commit(lambda: _index_changed(product_ids))
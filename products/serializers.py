@@ -4,6 +4,16 @@ from suppliers.serializers import SupplierSerializer
 from .models import Category, Product, Inventory
 from django.db.models import Sum
 
+def get_stocks_available(product):
+    """Read the stock annotated by `Product.objects.with_stock()` or an already
+    joined inventory row, querying only as a fallback."""
+    if hasattr(product, 'stocks_available'):
+        return product.stocks_available
+    if Product.inventory.is_cached(product):
+        return product.inventory.quantity
+    return Inventory.objects.filter(product=product).aggregate(total_stock=Sum('quantity'))['total_stock'] or 0
+
+
 class CreateCategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -29,7 +39,7 @@ class ProductByIdSerializer(serializers.ModelSerializer):
 
     def get_stocks_available(self, obj):
         """Retrieve the total stock available for the product."""
-        return Inventory.objects.filter(product=obj).aggregate(total_stock=Sum('quantity'))['total_stock'] or 0
+        return get_stocks_available(obj)
     
     def get_category(self, obj):
         """Retrieve the category of the product."""
@@ -47,7 +57,7 @@ class ProductSerializer(serializers.ModelSerializer):
 
     def get_stocks_available(self, obj):
         """Retrieve the total stock available for the product."""
-        return Inventory.objects.filter(product=obj).aggregate(total_stock=Sum('quantity'))['total_stock'] or 0
+        return get_stocks_available(obj)
     
     def get_category(self, obj):
         """Retrieve the category of the product."""
@@ -82,7 +92,8 @@ class InventorySerializer(serializers.ModelSerializer):
         return obj.quantity <= obj.reorder_level
     
     def get_supplier(self, obj):
-        product_suppliers = obj.product.suppliers.select_related('supplier').all()
+        # Relies on the `product__suppliers__supplier` prefetch done by the viewset.
+        product_suppliers = obj.product.suppliers.all()
         return SupplierSerializer([ps.supplier for ps in product_suppliers], many=True).data
 
     def get_category(self, obj):
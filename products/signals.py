@@ -0,0 +1,22 @@
+from collections import namedtuple
+
+from django.dispatch import Signal
+
+# One inventory row's movement. old_* are None when the row was just created.
+StockChange = namedtuple(
+    "StockChange",
+    "product_id old_quantity new_quantity old_reorder_level new_reorder_level price",
+)
+
+# Sent inside the updating transaction whenever inventory quantity or reorder
+# level changes, with `product_ids` and a list of StockChange as `changes`.
+# Optional ledger context: transaction_type (default "adjustment"),
+# reference_id, user and notes, or a `breakdown` list of
+# (product_id, quantity_change, reference_id, notes) when one change covers
+# several documents, e.g. a batch of sales.
+stock_changed = Signal()
+
+# Sent inside the transaction after bulk catalog writes that bypass
+# Product.save, with the touched `product_ids` and every affected SKU or
+# barcode (old and new) as `codes`.
+catalog_changed = Signal()
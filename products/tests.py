@@ -2,18 +2,31 @@ from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from users.models import User
-from products.models import Category, Product, Inventory
+from products import catalog
+from products.models import Category, Product, Inventory, InventorySummary, LowStockEvent
+from suppliers.models import Supplier, ProductSupplier
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.core.management import call_command
+from io import StringIO
+from unittest import mock
+import gzip
+import json
+import os
+import tempfile
 
 class ProductAPITestCase(APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(username='testuser', password='testpass', role='admin', name='Test User', email='test@example.com')
         self.client.force_authenticate(user=self.user)
-        self.category = Category.objects.create(name='Beverages', description='Drinks')
-        self.product = Product.objects.create(
-            name='Coke', sku='SKU1', barcode='123456', description='Soda',
-            category=self.category, price=10, cost=5, tax_rate=5, image_url=''
-        )
-        self.inventory = Inventory.objects.create(product=self.product, quantity=100, reorder_level=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(name='Beverages', description='Drinks')
+            self.product = Product.objects.create(
+                name='Coke', sku='SKU1', barcode='123456', description='Soda',
+                category=self.category, price=10, cost=5, tax_rate=5, image_url=''
+            )
+            self.inventory = Inventory.objects.create(product=self.product, quantity=100, reorder_level=10)
 
     def test_list_categories(self):
         url = reverse('category-list')
@@ -43,4 +56,413 @@ class ProductAPITestCase(APITestCase):
     def test_list_inventory(self):
         url = reverse('inventory-list')
         response = self.client.get(url)
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_products_query_count_is_constant(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(20):
+                product = Product.objects.create(
+                    name=f'Item {i}', sku=f'BULK{i}', barcode=f'9000{i}',
+                    category=self.category, price=1, cost=1
+                )
+                Inventory.objects.create(product=product, quantity=i)
+        url = reverse('product-list')
+        with self.assertNumQueries(3):  # plus the ETag validators query
+            response = self.client.get(url, {'page_size': 100})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first = response.data['results'][0]
+        self.assertEqual(first['stocks_available'], 100)
+        self.assertEqual(first['category']['name'], 'Beverages')
+
+    def test_retrieve_product_single_query(self):
+        url = reverse('product-detail', kwargs={'pk': self.product.id})
+        with self.assertNumQueries(2):  # plus the ETag validators query
+            response = self.client.get(url)
+        self.assertEqual(response.data['stocks_available'], 100)
+
+    def _create_bulk_inventory(self, count):
+        supplier = Supplier.objects.create(
+            name='Acme', contact_person='Ann', phone='555', email='acme@example.com', address='Main St'
+        )
+        ProductSupplier.objects.create(product=self.product, supplier=supplier)
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(count):
+                product = Product.objects.create(
+                    name=f'Stock {i}', sku=f'STK{i}', barcode=f'8000{i}',
+                    category=self.category, price=2, cost=1
+                )
+                Inventory.objects.create(product=product, quantity=i, reorder_level=5)
+            ProductSupplier.objects.create(product=product, supplier=supplier)
+
+    def test_list_inventory_query_count_is_constant(self):
+        self._create_bulk_inventory(15)
+        url = reverse('inventory-list')
+        with self.assertNumQueries(4):  # plus the ETag validators query
+            response = self.client.get(url, {'page_size': 100})
+        self.assertEqual(response.data['count'], 16)
+        first = response.data['results'][0]
+        self.assertEqual(first['product']['stocks_available'], 100)
+        self.assertEqual(first['supplier'][0]['name'], 'Acme')
+        self.assertEqual(first['category']['name'], 'Beverages')
+
+    def test_low_stock_query_count_is_constant(self):
+        self._create_bulk_inventory(15)
+        url = reverse('inventory-low-stock')
+        with self.assertNumQueries(4):  # plus the ETag validators query
+            response = self.client.get(url, {'page_size': 100})
+        self.assertEqual(response.data['count'], 6)
+
+    def test_restock_inventory(self):
+        url = reverse('inventory-restock', kwargs={'pk': self.inventory.id})
+        response = self.client.post(url, {'quantity': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['quantity'], 105)
+
+
+    def test_inventory_summary_counters_follow_changes(self):
+        from django.db import transaction
+        other = Product.objects.create(name='Water', sku='SKU9', category=self.category, price=2, cost=1)
+        Inventory.objects.create(product=other, quantity=5, reorder_level=10)
+        self.client.post(reverse('inventory-restock', kwargs={'pk': self.inventory.id}), {'quantity': 5})
+        self.product.price = 12
+        self.product.save()
+        with transaction.atomic():
+            Inventory.objects.decrement_stock({self.product.id: 100})
+        Product.objects.create(name='No Stock', sku='SKU10', price=1, cost=1)
+        other.delete()
+
+        self.assertEqual(InventorySummary.objects.totals(), InventorySummary.objects.compute())
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('inventory-summary'))
+        self.assertEqual(response.data['total_products'], 2)
+        self.assertEqual(response.data['low_stock_count'], 1)
+        self.assertEqual(response.data['overall_inventory_value'], 60)
+
+    def test_inventory_summary_recompute(self):
+        InventorySummary.objects.adjust(total_products=7, inventory_value=99)
+        self.assertNotEqual(InventorySummary.objects.totals(), InventorySummary.objects.compute())
+        InventorySummary.objects.recompute()
+        self.assertEqual(InventorySummary.objects.totals(), InventorySummary.objects.compute())
+
+
+class ProductSearchTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='searcher', password='testpass', role='cashier', name='Searcher', email='search@example.com')
+        self.client.force_authenticate(user=self.user)
+        dairy = Category.objects.create(name='Dairy')
+        drinks = Category.objects.create(name='Beverages')
+        self.milk = Product.objects.create(name='Whole Milk 1L', sku='MLK-1', barcode='111', category=dairy, price=2, cost=1)
+        self.choc = Product.objects.create(name='Chocolate Milk', sku='MLK-2', barcode='222', category=dairy, price=3, cost=1)
+        self.cola = Product.objects.create(name='Coca-Cola 500ml', sku='COLA-1', barcode='333', category=drinks, price=1, cost=1)
+
+    def test_search_ranks_name_matches(self):
+        response = self.client.get(reverse('product-search'), {'q': 'milk'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = [p['name'] for p in response.data]
+        self.assertEqual(set(names), {'Whole Milk 1L', 'Chocolate Milk'})
+
+    def test_search_exact_code_ranks_first(self):
+        response = self.client.get(reverse('product-search'), {'q': '333'})
+        self.assertEqual(response.data[0]['id'], self.cola.id)
+
+    def test_search_by_category_name(self):
+        response = self.client.get(reverse('product-search'), {'q': 'beverages'})
+        self.assertEqual([p['id'] for p in response.data], [self.cola.id])
+
+    def test_autocomplete_prefix(self):
+        response = self.client.get(reverse('product-autocomplete'), {'q': 'ch'})
+        self.assertEqual([p['id'] for p in response.data], [self.choc.id])
+        response = self.client.get(reverse('product-autocomplete'), {'q': 'mi'})
+        self.assertEqual({p['id'] for p in response.data}, {self.milk.id, self.choc.id})
+
+    def test_index_follows_product_changes(self):
+        self.client.get(reverse('product-search'), {'q': 'milk'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cola.name = 'Oat Milk'
+            self.cola.save()
+            self.milk.delete()
+        response = self.client.get(reverse('product-search'), {'q': 'milk'})
+        self.assertEqual({p['id'] for p in response.data}, {self.choc.id, self.cola.id})
+
+    def test_index_follows_category_delete(self):
+        self.client.get(reverse('product-search'), {'q': 'beverages'})
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.get(name='Beverages').delete()
+        response = self.client.get(reverse('product-search'), {'q': 'beverages'})
+        self.assertEqual(response.data, [])
+
+
+class CatalogImportTestCase(APITestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Dairy')
+        self.product = Product.objects.create(name='Milk', sku='MILK', barcode='900', category=self.category, price=2, cost=1)
+        Inventory.objects.create(product=self.product, quantity=5, reorder_level=2)
+
+    def write(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def run_import(self, path, **options):
+        out, err = StringIO(), StringIO()
+        options.setdefault('chunk_size', 2)
+        call_command('import_catalog', path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import_upserts_and_is_rerunnable(self):
+        path = self.write('.csv', (
+            'sku,name,barcode,category,price,cost,quantity\n'
+            'MILK,Milk 1L,900,Dairy,2.50,1,8\n'
+            'BREAD,Bread,901,Bakery,1.20,0.60,20\n'
+            'EGGS,Eggs,902,Dairy,3,2,\n'
+            'BAD,,903,Dairy,x,1,1\n'
+            'DUP,Dup,900,Dairy,1,1,1\n'
+        ))
+        out, err = self.run_import(path)
+        self.assertIn('2 created, 1 updated, 0 unchanged, 2 rejected', out)
+        self.assertIn('price must be a number', err)
+        self.assertIn('barcode 900 already belongs to SKU MILK', err)
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, str(self.product.price)), ('Milk 1L', '2.50'))
+        self.assertEqual(self.product.inventory.quantity, 8)
+        bread = Product.objects.select_related('inventory', 'category').get(sku='BREAD')
+        self.assertEqual((bread.category.name, bread.inventory.quantity), ('Bakery', 20))
+        self.assertEqual(Product.objects.get(sku='EGGS').inventory.quantity, 0)
+        self.assertEqual(Category.objects.filter(name='Dairy').count(), 1)
+        self.assertEqual(InventorySummary.objects.totals(), InventorySummary.objects.compute())
+
+        out, _ = self.run_import(path)
+        self.assertIn('0 created, 0 updated, 3 unchanged, 2 rejected', out)
+
+    def test_jsonl_import_with_rejects_file(self):
+        path = self.write('.jsonl', '\n'.join([
+            json.dumps({'sku': 'MILK', 'quantity': 3}),
+            '{not json',
+            json.dumps({'sku': 'NEW'}),
+        ]))
+        rejects = self.write('.csv', '')
+        out, _ = self.run_import(path, rejects=rejects)
+        self.assertIn('0 created, 1 updated, 0 unchanged, 2 rejected', out)
+        self.assertEqual(Inventory.objects.get(product=self.product).quantity, 3)
+        with open(rejects) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn('new product needs name, price, cost', lines[2])
+
+    def test_repeated_sku_in_a_chunk_is_reported(self):
+        path = self.write('.csv', (
+            'sku,name,price,cost,quantity\n'
+            'MILK,Milk 1L,2.50,1,8\n'
+            'MILK,Milk 2L,4,2,6\n'
+            'BREAD,Bread,1.20,0.60,20\n'
+        ))
+        out, err = self.run_import(path)
+        self.assertIn('3 rows: 1 created, 1 updated, 0 unchanged, 1 rejected', out)
+        self.assertIn('duplicate sku, superseded by line 3', err)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.inventory.quantity), ('Milk 2L', 6))
+
+    def test_first_rejects_are_printed(self):
+        path = self.write('.csv', 'sku,name,price,cost\n' + ''.join(f'BAD{i},Bad,x,1\n' for i in range(25)))
+        out, err = self.run_import(path, chunk_size=100)
+        self.assertIn('25 rejected', out)
+        lines = err.splitlines()
+        self.assertEqual(len(lines), 20)
+        self.assertTrue(lines[0].startswith('line 2 (BAD0): price must be a number'))
+
+
+class CatalogFeedTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='terminal', password='testpass', role='cashier', name='Terminal', email='terminal@example.com')
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(name='Bakery')
+            self.bread = Product.objects.create(name='Bread', sku='BR1', barcode='111', category=self.category, price=2, cost=1)
+            self.bun = Product.objects.create(name='Bun', sku='BU1', category=self.category, price=1, cost=0.5)
+            Inventory.objects.create(product=self.bread, quantity=7)
+
+    def test_snapshot(self):
+        response = self.client.get(reverse('catalog-snapshot'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(data['version'], catalog.current_version())
+        self.assertEqual(data['products'][0], {
+            'id': self.bread.id, 'name': 'Bread', 'sku': 'BR1', 'barcode': '111', 'price': '2.00', 'tax_rate': '0.00',
+            'category': self.category.id, 'category_name': 'Bakery', 'stock_quantity': 7,
+        })
+        self.assertEqual(data['products'][1]['stock_quantity'], 0)
+
+        plain = self.client.get(reverse('catalog-snapshot'))
+        self.assertEqual(json.loads(plain.content), data)
+        response = self.client.get(reverse('catalog-snapshot'), HTTP_IF_NONE_MATCH=plain['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_changes_since_version(self):
+        version = catalog.current_version()
+        response = self.client.get(reverse('catalog-changes'), {'since': version})
+        self.assertEqual(response.data, {'version': version, 'upserts': [], 'deletes': []})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bread.price = 3
+            self.bread.save()
+            Inventory.objects.decrement_stock({self.bread.id: 2}, transaction_type='sale')
+        with self.captureOnCommitCallbacks(execute=True):
+            bun_id = self.bun.id
+            self.bun.delete()
+        response = self.client.get(reverse('catalog-changes'), {'since': version})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(response.data['version'], version)
+        self.assertEqual([(p['id'], p['price'], p['stock_quantity']) for p in response.data['upserts']],
+                         [(self.bread.id, '3.00', 5)])
+        self.assertEqual(response.data['deletes'], [bun_id])
+
+        latest = response.data['version']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Fresh Bakery'
+            self.category.save()
+        response = self.client.get(reverse('catalog-changes'), {'since': latest})
+        self.assertEqual([p['category_name'] for p in response.data['upserts']], ['Fresh Bakery'])
+
+    def test_failed_publication_is_picked_up(self):
+        version = catalog.current_version()
+        etag = self.client.get(reverse('product-list'))['ETag']
+        with mock.patch.object(catalog.numbering, 'reserve', side_effect=DatabaseError), \
+                self.assertLogs('products.catalog', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.bread.price = 4
+                self.bread.save()
+        self.assertEqual(catalog.current_version(), version)
+
+        response = self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('catalog-changes'), {'since': version})
+        self.assertEqual([(p['id'], p['price']) for p in response.data['upserts']], [(self.bread.id, '4.00')])
+
+    def test_snapshot_required(self):
+        version = catalog.current_version()
+        response = self.client.get(reverse('catalog-changes'), {'since': version + 1})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        with mock.patch.object(catalog, 'DELTA_LIMIT', 1):
+            response = self.client.get(reverse('catalog-changes'), {'since': 0})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(self.client.get(reverse('catalog-changes')).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='backoffice', password='testpass', role='manager', name='Back Office', email='backoffice@example.com')
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(name='Produce')
+            self.product = Product.objects.create(name='Apple', sku='AP1', category=self.category, price=1, cost=0.5)
+            self.inventory = Inventory.objects.create(product=self.product, quantity=20, reorder_level=5)
+        self.supplier = Supplier.objects.create(name='Orchard', contact_person='O', phone='1', email='orchard@example.com', address='x')
+
+    def revalidate(self, url, **headers):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(1):
+            second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'], **headers)
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        return first['ETag']
+
+    def test_categories(self):
+        url = reverse('category-list')
+        etag = self.revalidate(url)
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Category.objects.create(name='Frozen')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 2)
+        self.revalidate(reverse('category-detail', kwargs={'pk': self.category.pk}))
+
+    def test_products_follow_the_catalog_version(self):
+        url = reverse('product-list')
+        etag = self.revalidate(url)
+        self.revalidate(reverse('product-detail', kwargs={'pk': self.product.pk}))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.inventory.quantity = 15
+            self.inventory.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['stocks_available'], 15)
+
+    def test_inventory_follows_suppliers(self):
+        url = reverse('inventory-list')
+        etag = self.revalidate(url)
+        ProductSupplier.objects.create(product=self.product, supplier=self.supplier)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['supplier'][0]['name'], 'Orchard')
+
+
+class LowStockAlertTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='testpass', role='manager', name='Buyer', email='buyer@example.com')
+        self.client.force_authenticate(user=self.user)
+        self.milk = Product.objects.create(name='Milk', sku='MLK1', price=2, cost=1)
+        self.eggs = Product.objects.create(name='Eggs', sku='EGG1', price=3, cost=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Inventory.objects.create(product=self.milk, quantity=12, reorder_level=10)
+            self.eggs_inventory = Inventory.objects.create(product=self.eggs, quantity=4, reorder_level=5)
+
+    def events(self, after=0):
+        response = self.client.get(reverse('inventory-low-stock-events'), {'after': after})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def low_stock_ids(self):
+        response = self.client.get(reverse('inventory-low-stock'))
+        return [item['product']['id'] for item in response.data['results']]
+
+    def test_crossings_update_flag_and_outbox(self):
+        data = self.events()
+        self.assertEqual([(e['sku'], e['kind'], e['quantity']) for e in data['events']], [('EGG1', 'low', 4)])
+        self.assertEqual(self.low_stock_ids(), [self.eggs.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                # 12 -> 11 stays above the level; 11 -> 9 crosses it.
+                Inventory.objects.decrement_stock({self.milk.id: 1}, transaction_type='sale')
+                Inventory.objects.decrement_stock({self.milk.id: 2}, transaction_type='sale')
+                Inventory.objects.increment_stock({self.eggs.id: 10}, transaction_type='purchase')
+        self.assertEqual(self.low_stock_ids(), [self.milk.id])
+        later = self.events(after=data['cursor'])
+        self.assertEqual([(e['sku'], e['kind'], e['quantity']) for e in later['events']],
+                         [('MLK1', 'low', 9), ('EGG1', 'restocked', 14)])
+        self.assertEqual(self.events(after=later['cursor'])['events'], [])
+
+        response = self.client.patch(reverse('inventory-detail', kwargs={'pk': self.eggs_inventory.pk}),
+                                     {'reorder_level': 20}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(self.low_stock_ids()), sorted([self.milk.id, self.eggs.id]))
+        self.assertEqual([e['kind'] for e in self.events(after=later['cursor'])['events']], ['low'])
+        self.assertEqual(
+            list(Inventory.objects.filter(is_low_stock=True).order_by('id').values_list('product_id', flat=True)),
+            list(Inventory.objects.filter(quantity__lte=F('reorder_level')).order_by('id').values_list('product_id', flat=True)),
+        )
+
+    def test_events_stay_unpublished_until_commit(self):
+        with transaction.atomic():
+            Inventory.objects.decrement_stock({self.milk.id: 5}, transaction_type='sale')
+        self.assertTrue(LowStockEvent.objects.filter(product_id=self.milk.id, position__isnull=True).exists())
+        # A read publishes committed stragglers before serving the outbox.
+        self.assertEqual([e['sku'] for e in self.events()['events']], ['EGG1', 'MLK1'])
+        response = self.client.get(reverse('inventory-low-stock-events'), {'after': -1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_verify_command_repairs_flags(self):
+        Inventory.objects.filter(product=self.eggs).update(is_low_stock=False)
+        out = StringIO()
+        call_command('verify_inventory_summary', '--fix', stdout=out)
+        self.assertIn('1 inventory row(s) with a stale low-stock flag', out.getvalue())
+        self.assertEqual(self.low_stock_ids(), [self.eggs.id])
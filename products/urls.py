@@ -2,7 +2,7 @@ from django.urls import path, include
 
 from rest_framework.routers import DefaultRouter
 
-from .views import CategoryViewSet, ProductViewSet, InventoryViewSet
+from .views import CategoryViewSet, ProductViewSet, InventoryViewSet, CatalogSnapshotView, CatalogChangesView
 
 router = DefaultRouter()
 router.register(r'categories', CategoryViewSet, basename='category')
@@ -10,5 +10,7 @@ router.register(r'products', ProductViewSet, basename='product')
 router.register(r'inventory', InventoryViewSet, basename='inventory')
 
 urlpatterns = [
+    path('catalog/', CatalogSnapshotView.as_view(), name='catalog-snapshot'),
+    path('catalog/changes/', CatalogChangesView.as_view(), name='catalog-changes'),
     path('', include(router.urls)),
 ]
@@ -2,13 +2,27 @@ from django.shortcuts import render
 
 # Create your views here.
 from .models import *
-from rest_framework import viewsets
+from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated
 from .serializers import *
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.views import APIView
 from rest_framework.pagination import PageNumberPagination
-from django.db.models import F, Sum
+from django.db.models import Prefetch
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.db import transaction
+from django.db.models.deletion import ProtectedError
+from rest_framework.exceptions import ValidationError
+from datetime import datetime, time
+import gzip
+from procurement import ledger
+from suppliers.models import ProductSupplier
+from . import alerts, catalog, conditional
+from . import search as product_search
 
 
 
@@ -18,6 +32,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
     serializer_class = CreateCategorySerializer
     permission_classes = [IsAuthenticated]
 
+    @conditional.conditional_get(conditional.category_list)
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
         serializer = CategoryByIdSerializer(queryset, many=True)
@@ -29,6 +44,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
         self.perform_create(serializer)
         return Response(serializer.data, status=201)
     
+    @conditional.conditional_get(conditional.category_detail)
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = CategoryByIdSerializer(instance)
@@ -54,11 +70,12 @@ class ProductPagination(PageNumberPagination):
     max_page_size = 100
 
 class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+    queryset = Product.objects.with_stock().order_by('id')
     serializer_class = CreateProductSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = ProductPagination
 
+    @conditional.conditional_get(conditional.products)
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
         page = self.paginate_queryset(queryset)
@@ -74,6 +91,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         self.perform_create(serializer)
         return Response(serializer.data, status=201)
     
+    @conditional.conditional_get(conditional.products)
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = ProductByIdSerializer(instance)
@@ -89,13 +107,72 @@ class ProductViewSet(viewsets.ModelViewSet):
     
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
-        self.perform_destroy(instance)
+        try:
+            self.perform_destroy(instance)
+        except ProtectedError:
+            return Response(
+                {"error": "Product has sales or purchase history and cannot be deleted."},
+                status=status.HTTP_409_CONFLICT
+            )
         return Response(status=204)
-    
+
+    @action(detail=False, methods=['get'])
+    @conditional.conditional_get(conditional.products)
+    def search(self, request):
+        """Ranked search over product name, SKU, barcode and category name."""
+        limit = self.get_limit(request, default=20)
+        products = product_search.search_products(request.query_params.get('q', ''), limit=limit)
+        serializer = ProductByIdSerializer(products, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    @conditional.conditional_get(conditional.products)
+    def autocomplete(self, request):
+        """Prefix suggestions for the search box typeahead."""
+        limit = self.get_limit(request, default=10)
+        products = product_search.autocomplete(request.query_params.get('q', ''), limit=limit)
+        return Response([
+            {'id': p.id, 'name': p.name, 'sku': p.sku, 'barcode': p.barcode}
+            for p in products
+        ])
+
+    def get_limit(self, request, default):
+        return parse_limit(request.query_params.get('limit'), default)
+
+
+def parse_limit(value, default):
+    """Clamp a `limit` query parameter to 1..ProductPagination.max_page_size."""
+    try:
+        limit = int(value if value is not None else default)
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, ProductPagination.max_page_size))
+
+
 class InventoryViewSet(viewsets.ModelViewSet):
-    queryset = Inventory.objects.all()
+    queryset = Inventory.objects.select_related('product__category').prefetch_related(
+        Prefetch('product__suppliers', queryset=ProductSupplier.objects.select_related('supplier'))
+    ).order_by('id')
     serializer_class = InventorySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ProductPagination
+
+    @conditional.conditional_get(conditional.inventory)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional.conditional_get(conditional.inventory)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        # Credit the ledger entry for the adjustment to the caller.
+        serializer.instance.stock_context = {"user": self.request.user}
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        instance.stock_context = {"user": self.request.user, "notes": "Stock record deleted"}
+        instance.delete()
     
     @action(detail=True, methods=['post'])
     def restock(self, request, pk=None):
@@ -113,23 +190,96 @@ class InventoryViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        inventory.quantity += quantity
-        inventory.last_restock_date = timezone.now().date()
-        inventory.save()
+        with transaction.atomic():
+            Inventory.objects.increment_stock(
+                {inventory.product_id: quantity},
+                last_restock_date=timezone.now().date(),
+                transaction_type='purchase',
+                user=request.user,
+                notes='Restock',
+            )
+        inventory.refresh_from_db()
         
         serializer = self.get_serializer(inventory)
         return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def stock_at(self, request, pk=None):
+        """Stock level of this item at `?at=<ISO datetime>`, from the nearest snapshot plus the ledger."""
+        inventory = self.get_object()
+        moment = self.parse_datetime_param(request, 'at', required=True, end_of_day=True)
+        return Response({
+            "product": inventory.product_id,
+            "at": moment,
+            "quantity": ledger.stock_at(inventory.product_id, moment),
+        })
+
+    @action(detail=True, methods=['get'])
+    def movements(self, request, pk=None):
+        """Ledger entries for this item between `?start=` and `?end=` (ISO datetimes)."""
+        inventory = self.get_object()
+        entries = ledger.movements(
+            inventory.product_id,
+            start=self.parse_datetime_param(request, 'start'),
+            end=self.parse_datetime_param(request, 'end', end_of_day=True),
+        ).values('id', 'transaction_type', 'quantity_change', 'reference_id', 'user_id', 'notes', 'transaction_date')
+        page = self.paginate_queryset(entries)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(list(entries))
+
+    def parse_datetime_param(self, request, name, required=False, end_of_day=False):
+        """An ISO datetime query parameter; a bare date means its start, or its end with `end_of_day`."""
+        value = request.query_params.get(name)
+        if not value:
+            if required:
+                raise ValidationError({name: "This query parameter is required."})
+            return None
+        try:
+            # parse_datetime also accepts a bare date (as midnight), so dates are checked first.
+            day = parse_date(value) if len(value) == 10 else None
+            moment = datetime.combine(day, time.max if end_of_day else time.min) if day else parse_datetime(value)
+        except ValueError:
+            moment = None
+        if moment is None:
+            raise ValidationError({name: "Must be an ISO 8601 date or datetime."})
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
     
     @action(detail=False, methods=['get'])
+    @conditional.conditional_get(conditional.inventory)
     def low_stock(self, request):
         """List inventory items that need restocking."""
-        low_stock_items = self.get_queryset().filter(
-            quantity__lte=models.F('reorder_level')
-        )
+        # Reads the maintained flag through its partial index instead of comparing every row.
+        low_stock_items = self.get_queryset().filter(is_low_stock=True)
+        page = self.paginate_queryset(low_stock_items)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
         serializer = self.get_serializer(low_stock_items, many=True)
         return Response(serializer.data)
 
 
+    @action(detail=False, methods=['get'])
+    def low_stock_events(self, request):
+        """Low-stock threshold crossings after `?after=<cursor>`, oldest first.
+
+        Pass the returned cursor back as `after` to read only new events.
+        """
+        try:
+            after = int(request.query_params.get('after', 0))
+            if after < 0:
+                raise ValueError
+        except ValueError:
+            raise ValidationError({"after": "Must be a non-negative integer cursor."})
+        alerts.publish_pending()
+        events = alerts.events_after(after, parse_limit(request.query_params.get('limit'), ProductPagination.max_page_size))
+        return Response({
+            "cursor": events[-1]['position'] if events else after,
+            "events": events,
+        })
+
     @action(detail=False, methods=['get'])
     def summary(self, request):
         """
@@ -138,17 +288,52 @@ class InventoryViewSet(viewsets.ModelViewSet):
         - low_stock_count: Number of low stock inventory items
         - overall_inventory_value: Sum of (quantity * product.price) for all inventory
         """
-        total_products = Product.objects.count()
-        low_stock_count = self.get_queryset().filter(
-            quantity__lte=models.F('reorder_level')
-        ).count()
+        # Read from the maintained counters instead of scanning the catalog.
+        return Response(InventorySummary.objects.totals())
 
-        inventory_value = self.get_queryset().aggregate(
-            total_value=Sum(F('quantity') * F('product__price'))
-        )['total_value'] or 0
 
-        return Response({
-            "total_products": total_products,
-            "low_stock_count": low_stock_count,
-            "overall_inventory_value": inventory_value
-        })
+class CatalogSnapshotView(APIView):
+    """The whole price book as one gzipped JSON document: {"version", "products": [...]}.
+    
+    Terminals load it once, then keep up with CatalogChangesView. The ETag is
+    the version, so an unchanged snapshot costs a 304.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        catalog.publish_pending()
+        version, body = catalog.snapshot()
+        etag = f'"catalog-{version}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = HttpResponse(body, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(body), content_type='application/json')
+        response['ETag'] = etag
+        response['X-Catalog-Version'] = str(version)
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+
+class CatalogChangesView(APIView):
+    """Changes since `?since=<version>`: {"version", "upserts": [...], "deletes": [product ids]}.
+    
+    Answers 410 when the terminal should reload the snapshot instead (too many
+    changes, or a version the catalog has not reached).
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        try:
+            since = int(request.query_params['since'])
+            if since < 0:
+                raise ValueError
+        except (KeyError, ValueError):
+            raise ValidationError({"since": "A catalog version (non-negative integer) is required."})
+        catalog.publish_pending()
+        try:
+            return Response(catalog.changes_since(since))
+        except catalog.ChangesUnavailable as exc:
+            return Response({"detail": str(exc), "version": catalog.current_version()}, status=status.HTTP_410_GONE)
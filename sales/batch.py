@@ -0,0 +1,201 @@
+"""
+Batch ingestion of sales queued by offline terminals.
+
+A batch is validated and committed in one transaction with set-based work:
+one lookup for already-ingested idempotency keys, one product fetch, one
+locked inventory read, bulk inserts for sales, line items and receipts, one
+stock UPDATE and one rollup upsert. Sales are accepted in the order given; one
+that fails validation or would overdraw stock is rejected on its own without
+affecting the rest. Every sale gets a result entry.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+
+from products.models import Inventory, Product
+from . import receipts, rollups
+from .models import Customer, Receipt, Sale, SaleItem
+from .serializers import BatchSaleSerializer
+
+CREATED = "created"
+DUPLICATE = "duplicate"
+REJECTED = "rejected"
+
+
+def ingest(entries, user, invoice_numbers):
+    """Ingest raw sale dicts for `user`; `invoice_numbers` yields a fresh number per created sale.
+
+    Returns one result dict per entry, in order. A concurrent batch carrying
+    the same keys makes the first attempt fail on the unique index; the retry
+    then reports those sales as duplicates.
+    """
+    try:
+        return _ingest(entries, user, invoice_numbers)
+    except IntegrityError:
+        return _ingest(entries, user, invoice_numbers)
+
+
+@transaction.atomic
+def _ingest(entries, user, invoice_numbers):
+    results = [None] * len(entries)
+    valid = []
+    for index, entry in enumerate(entries):
+        serializer = BatchSaleSerializer(data=entry)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            key = entry.get("idempotency_key") if isinstance(entry, dict) else None
+            results[index] = {"idempotency_key": key, "status": REJECTED, "errors": serializer.errors}
+
+    existing = {
+        key: (sale_id, invoice_number)
+        for key, sale_id, invoice_number in Sale.objects.filter(
+            idempotency_key__in=[data["idempotency_key"] for _, data in valid]
+        ).values_list("idempotency_key", "id", "invoice_number")
+    }
+    pending, repeats, first = [], [], {}
+    for index, data in valid:
+        key = data["idempotency_key"]
+        if key in existing:
+            sale_id, invoice_number = existing[key]
+            results[index] = {"idempotency_key": key, "status": DUPLICATE,
+                              "sale_id": sale_id, "invoice_number": invoice_number}
+        elif key in first:
+            repeats.append((index, first[key]))
+        else:
+            first[key] = index
+            pending.append((index, data))
+
+    accepted, products = _allocate_stock(pending, results)
+    if accepted:
+        _create_sales(accepted, products, user, invoice_numbers, results)
+    # A key repeated within the batch gets whatever happened to its first occurrence:
+    # a duplicate of the sale it created, or the same rejection.
+    for index, original in repeats:
+        result = results[original]
+        if result["status"] == REJECTED:
+            results[index] = dict(result)
+        else:
+            results[index] = {"idempotency_key": result["idempotency_key"], "status": DUPLICATE,
+                              "sale_id": result["sale_id"], "invoice_number": result["invoice_number"]}
+    return results
+
+
+def _create_sales(accepted, products, user, invoice_numbers, results):
+    customers = _resolve_customers([data.get("customer") for _, data in accepted])
+    sales, lines = [], []
+    for (index, data), customer in zip(accepted, customers):
+        items = [
+            SaleItem(
+                product=products[item["product_id"]],
+                quantity=item["quantity"],
+                unit_price=products[item["product_id"]].price,
+                unit_cost=products[item["product_id"]].cost,
+                tax_rate=item["tax_rate"],
+                discount_percent=item["discount_percent"],
+                total_price=products[item["product_id"]].price * item["quantity"],
+            )
+            for item in data["items"]
+        ]
+        sale = Sale(
+            invoice_number=next(invoice_numbers),
+            idempotency_key=data["idempotency_key"],
+            user=user,
+            customer=customer,
+            payment_method=data["payment_method"],
+            payment_status="paid",
+        )
+        sale.calculate_totals(items, save=False)
+        sales.append(sale)
+        lines.append(items)
+
+    Sale.objects.bulk_create(sales)
+    # bulk_create stamps auto_now_add fields; keep the time the terminal recorded.
+    dated = []
+    for sale, (_, data) in zip(sales, accepted):
+        if data.get("sale_date"):
+            sale.sale_date = data["sale_date"]
+            dated.append(sale)
+    if dated:
+        Sale.objects.bulk_update(dated, ["sale_date"])
+
+    for sale, items in zip(sales, lines):
+        for item in items:
+            item.sale = sale
+    SaleItem.objects.bulk_create([item for items in lines for item in items])
+    Receipt.objects.bulk_create([
+        Receipt(sale=sale, receipt_number=receipts.receipt_number(sale), receipt_data=receipts.build(sale, items))
+        for sale, items in zip(sales, lines)
+    ])
+    rollups.record_sales(zip(sales, lines))
+
+    quantities = defaultdict(int)
+    breakdown = []
+    for sale, items in zip(sales, lines):
+        for item in items:
+            quantities[item.product_id] += item.quantity
+            breakdown.append((item.product_id, -item.quantity, sale.id, f"Sale {sale.invoice_number}"))
+    Inventory.objects.decrement_stock(quantities, transaction_type="sale", user=user, breakdown=breakdown)
+
+    for sale, (index, data) in zip(sales, accepted):
+        results[index] = {"idempotency_key": data["idempotency_key"], "status": CREATED,
+                          "sale_id": sale.id, "invoice_number": sale.invoice_number}
+
+
+def _allocate_stock(pending, results):
+    """Accept pending sales in order while stock lasts; returns the accepted (index, data) and the products."""
+    product_ids = {item["product_id"] for _, data in pending for item in data["items"]}
+    products = Product.objects.in_bulk(product_ids)
+    # Locked in product order, like checkout, so the stock read here stays valid until commit.
+    available = dict(
+        Inventory.objects.select_for_update(of=("self",))
+        .filter(product_id__in=products)
+        .order_by("product_id")
+        .values_list("product_id", "quantity")
+    )
+
+    accepted = []
+    for index, data in pending:
+        requested = defaultdict(int)
+        for item in data["items"]:
+            requested[item["product_id"]] += item["quantity"]
+        errors = []
+        for product_id, quantity in requested.items():
+            if product_id not in products:
+                errors.append(f"Invalid product id: {product_id}")
+            elif product_id not in available:
+                errors.append(f"No inventory record found for {products[product_id].name}")
+            elif available[product_id] < quantity:
+                errors.append(
+                    f"Insufficient stock for {products[product_id].name}. Only {available[product_id]} available."
+                )
+        if errors:
+            results[index] = {"idempotency_key": data["idempotency_key"], "status": REJECTED,
+                              "errors": {"items": errors}}
+            continue
+        for product_id, quantity in requested.items():
+            available[product_id] -= quantity
+        accepted.append((index, data))
+    return accepted, products
+
+
+def _resolve_customers(customer_data):
+    """Match customers by email (creating missing ones in bulk); entries without email get a new record."""
+    emails = {data["email"] for data in customer_data if data and data.get("email")}
+    by_email = {}
+    for customer in Customer.objects.filter(email__in=emails).order_by("-pk"):
+        by_email[customer.email] = customer
+    new = []
+    for data in customer_data:
+        if data and data.get("email") and data["email"] not in by_email:
+            by_email[data["email"]] = Customer(**data)
+            new.append(by_email[data["email"]])
+        elif data and not data.get("email"):
+            new.append(Customer(**data))
+    Customer.objects.bulk_create(new)
+
+    anonymous = iter(customer for customer in new if not customer.email)
+    return [
+        None if not data else by_email[data["email"]] if data.get("email") else next(anonymous)
+        for data in customer_data
+    ]
@@ -0,0 +1,144 @@
+"""
+Streaming exports of sales, sale items and inventory as CSV or NDJSON.
+
+Rows come from `values_list(...).iterator()`, which uses a server-side cursor
+on PostgreSQL, and are encoded in small batches as they are read. Neither the
+HTTP endpoint nor the management command ever holds more than one fetch batch
+in memory, whatever the date range. Under ASGI the endpoint streams `aexport`:
+Django's ASGI handler would read a sync iterator into a list before sending it.
+"""
+import csv
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from products.models import Inventory
+from .models import Sale, SaleItem
+from .rollups import day_start
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+ROWS_PER_WRITE = 500
+
+# Dataset name -> (model, date field for range filters, [(column, lookup)]).
+DATASETS = {
+    "sales": (
+        Sale,
+        "sale_date",
+        [
+            ("id", "id"),
+            ("invoice_number", "invoice_number"),
+            ("sale_date", "sale_date"),
+            ("cashier", "user__username"),
+            ("customer", "customer__name"),
+            ("payment_method", "payment_method"),
+            ("payment_status", "payment_status"),
+            ("subtotal", "subtotal"),
+            ("tax_amount", "tax_amount"),
+            ("discount_amount", "discount_amount"),
+            ("total_amount", "total_amount"),
+        ],
+    ),
+    "sale-items": (
+        SaleItem,
+        "sale__sale_date",
+        [
+            ("id", "id"),
+            ("sale_id", "sale_id"),
+            ("invoice_number", "sale__invoice_number"),
+            ("sale_date", "sale__sale_date"),
+            ("product_id", "product_id"),
+            ("sku", "product__sku"),
+            ("product", "product__name"),
+            ("quantity", "quantity"),
+            ("unit_price", "unit_price"),
+            ("unit_cost", "unit_cost"),
+            ("tax_rate", "tax_rate"),
+            ("discount_percent", "discount_percent"),
+            ("total_price", "total_price"),
+        ],
+    ),
+    "inventory": (
+        Inventory,
+        "updated_at",
+        [
+            ("product_id", "product_id"),
+            ("sku", "product__sku"),
+            ("product", "product__name"),
+            ("category", "product__category__name"),
+            ("quantity", "quantity"),
+            ("reorder_level", "reorder_level"),
+            ("last_restock_date", "last_restock_date"),
+            ("updated_at", "updated_at"),
+        ],
+    ),
+}
+
+
+def columns(dataset):
+    return [column for column, _ in DATASETS[dataset][2]]
+
+
+def rows(dataset, start=None, end=None, chunk_size=2000):
+    """Yield value tuples for `dataset`, optionally limited to days in [start, end]."""
+    model, date_field, fields = DATASETS[dataset]
+    queryset = model.objects.all()
+    if start:
+        queryset = queryset.filter(**{f"{date_field}__gte": day_start(start)})
+    if end:
+        queryset = queryset.filter(**{f"{date_field}__lt": day_start(end + timedelta(days=1))})
+    queryset = queryset.order_by("pk").values_list(*(lookup for _, lookup in fields))
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class _Echo:
+    """File-like object whose write() hands back the line for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def encode(dataset, values, fmt):
+    """Encode value tuples as CSV (with a header) or NDJSON, yielding text in batches."""
+    names = columns(dataset)
+    writer = csv.writer(_Echo())
+
+    def line(row):
+        if fmt == "csv":
+            return writer.writerow([_plain(value) for value in row])
+        return json.dumps(dict(zip(names, map(_plain, row)))) + "\n"
+
+    if fmt == "csv":
+        yield line(names)
+    batch = []
+    for row in values:
+        batch.append(line(row))
+        if len(batch) >= ROWS_PER_WRITE:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def export(dataset, fmt="csv", start=None, end=None, chunk_size=2000):
+    """Stream `dataset` as encoded text chunks."""
+    return encode(dataset, rows(dataset, start, end, chunk_size), fmt)
+
+async def aexport(dataset, fmt="csv", start=None, end=None, chunk_size=2000):
+    """`export` as an async iterator, reading one chunk at a time on the request's sync thread."""
+    chunks = export(dataset, fmt, start, end, chunk_size)
+    read = sync_to_async(next)
+    try:
+        while (chunk := await read(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # Releases the server-side cursor on the thread that opened it.
+        await sync_to_async(chunks.close)()
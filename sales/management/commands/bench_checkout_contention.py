@@ -0,0 +1,117 @@
+import statistics
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from procurement.models import InventoryTransaction
+from products.models import Category, Inventory, Product
+from sales.models import Sale, SaleItem
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire concurrent checkouts at one shared product and report throughput, '
+        'latency percentiles and whether the final stock is consistent'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent cashiers')
+        parser.add_argument('--checkouts', type=int, default=50, help='Checkouts per thread')
+        parser.add_argument('--quantity', type=int, default=1, help='Units bought per checkout')
+        parser.add_argument('--stock', type=int, default=300, help='Starting stock of the shared product')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark data afterwards')
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        user = User.objects.create_user(
+            username=f'bench-{tag}', password=uuid.uuid4().hex, role='cashier',
+            name='Benchmark Cashier', email=f'bench-{tag}@example.com'
+        )
+        category, _ = Category.objects.get_or_create(name='Benchmark')
+        product = Product.objects.create(
+            name=f'Benchmark Item {tag}', sku=f'BENCH-{tag}', barcode=f'BENCH-{tag}',
+            category=category, price=1, cost=1
+        )
+        Inventory.objects.create(product=product, quantity=options['stock'])
+
+        payload = {
+            'items': [{
+                'product_id': product.id,
+                'quantity': options['quantity'],
+                'unit_price': str(product.price),
+                'total_price': str(product.price * options['quantity']),
+            }],
+            'payment_method': 'cash',
+        }
+        latencies = []
+        outcomes = {'sold': 0, 'rejected': 0, 'errors': 0}
+        lock = threading.Lock()
+        start_barrier = threading.Barrier(options['threads'])
+
+        def cashier():
+            client = APIClient()
+            client.force_authenticate(user=user)
+            url = reverse('create-sale')
+            start_barrier.wait()
+            try:
+                for _ in range(options['checkouts']):
+                    started = time.perf_counter()
+                    try:
+                        status_code = client.post(url, payload, format='json').status_code
+                    except Exception:
+                        status_code = None
+                    elapsed = time.perf_counter() - started
+                    outcome = {201: 'sold', 400: 'rejected'}.get(status_code, 'errors')
+                    with lock:
+                        latencies.append(elapsed)
+                        outcomes[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=cashier) for _ in range(options['threads'])]
+        wall_start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - wall_start
+
+        final_stock = Inventory.objects.get(product=product).quantity
+        units_sold = SaleItem.objects.filter(product=product).aggregate(total=Sum('quantity'))['total'] or 0
+        expected_stock = options['stock'] - units_sold
+        consistent = final_stock == expected_stock and final_stock >= 0
+        latencies.sort()
+
+        self.stdout.write(f"Requests:        {len(latencies)} in {wall:.2f}s "
+                          f"({len(latencies) / wall:.1f} req/s)")
+        self.stdout.write(f"Outcomes:        {outcomes['sold']} sold, {outcomes['rejected']} rejected "
+                          f"(out of stock), {outcomes['errors']} errors")
+        self.stdout.write(f"Latency:         p50 {self.percentile(latencies, 50) * 1000:.1f}ms, "
+                          f"p99 {self.percentile(latencies, 99) * 1000:.1f}ms, "
+                          f"mean {statistics.mean(latencies) * 1000:.1f}ms")
+        self.stdout.write(f"Stock:           start {options['stock']}, sold {units_sold}, "
+                          f"final {final_stock}, expected {expected_stock}")
+        if consistent:
+            self.stdout.write(self.style.SUCCESS('Stock is consistent: no lost updates and no overselling.'))
+        else:
+            self.stdout.write(self.style.ERROR('Stock is INCONSISTENT with the recorded sales.'))
+
+        if not options['keep']:
+            Sale.objects.filter(user=user).delete()
+            InventoryTransaction.objects.filter(product=product).delete()
+            product.delete()
+            user.delete()
+
+    @staticmethod
+    def percentile(sorted_values, pct):
+        if not sorted_values:
+            return 0.0
+        index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+        return sorted_values[index]
@@ -0,0 +1,181 @@
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from products.models import Product
+from sales.models import Sale
+from users.models import User
+
+ENDPOINTS = ['product-list', 'scan', 'checkout', 'inventory-list', 'inventory-summary', 'receipt']
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the hot endpoints of a running server and report throughput, p50/p95/p99 '
+        'latency and SQL queries per request for each one. Run generate_dataset first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api/v1/', help='API root of the server under test')
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help=f"Comma-separated subset of {', '.join(ENDPOINTS)}")
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of load per endpoint')
+        parser.add_argument('--username', default='bench-http', help='User to authenticate as (created if missing)')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        endpoints = [name for name in options['endpoints'].split(',') if name]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoint(s): {', '.join(sorted(unknown))}")
+
+        url = urlsplit(options['url'])
+        self.host, self.port = url.hostname, url.port or 80
+        self.prefix = url.path.rstrip('/') + '/'
+        self.rng = random.Random(options['seed'])
+        self.token = str(AccessToken.for_user(self.bench_user(options['username'])))
+        self.load_samples()
+
+        results = []
+        for name in endpoints:
+            queries = self.count_queries(name)
+            stats = self.run_load(name, options['threads'], options['duration'])
+            stats.update(endpoint=name, queries=queries)
+            results.append(stats)
+            self.report(stats)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+
+    def bench_user(self, username):
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            user = User.objects.create_user(
+                username=username, password=None, role='manager',
+                name='HTTP Benchmark', email=f'{username}@example.com'
+            )
+        return user
+
+    def load_samples(self):
+        self.products = list(
+            Product.objects.filter(inventory__quantity__gt=0)
+            .order_by('?').values('id', 'sku', 'barcode', 'price')[:1000]
+        )
+        if not self.products:
+            raise CommandError('No products in stock; run generate_dataset first.')
+        self.pages = max(1, Product.objects.count() // 10)
+        self.sale_ids = list(Sale.objects.order_by('-pk').values_list('pk', flat=True)[:1000])
+
+    def build_request(self, name):
+        """Return (method, path relative to the API root, JSON body or None)."""
+        rng = self.rng
+        if name == 'product-list':
+            return 'GET', f'products/products/?page={rng.randint(1, self.pages)}', None
+        if name == 'scan':
+            product = rng.choice(self.products)
+            return 'GET', f"sales/products/scan/{product['barcode'] or product['sku']}/", None
+        if name == 'checkout':
+            items = [
+                {'product_id': product['id'], 'quantity': 1,
+                 'unit_price': str(product['price']), 'total_price': str(product['price'])}
+                for product in rng.sample(self.products, min(len(self.products), rng.randint(1, 4)))
+            ]
+            return 'POST', 'sales/create/', {'items': items, 'payment_method': 'cash'}
+        if name == 'inventory-list':
+            return 'GET', f'products/inventory/?page={rng.randint(1, self.pages)}', None
+        if name == 'inventory-summary':
+            return 'GET', 'products/inventory/summary/', None
+        if not self.sale_ids:
+            raise CommandError('No sales to fetch receipts for; run generate_dataset first.')
+        return 'GET', f'sales/{rng.choice(self.sale_ids)}/receipt/', None
+
+    def count_queries(self, name):
+        """SQL queries for one request, measured in-process against the same database."""
+        method, path, body = self.build_request(name)
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        with CaptureQueriesContext(connection) as ctx:
+            client.generic(method, self.prefix + path, json.dumps(body) if body else '', content_type='application/json')
+        return len(ctx.captured_queries)
+
+    def run_load(self, name, threads, duration):
+        latencies, statuses = [], {}
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads)
+        headers = {'Authorization': f'Bearer {self.token}', 'Content-Type': 'application/json'}
+        failure = []
+
+        def client():
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            barrier.wait()
+            deadline = time.perf_counter() + duration
+            try:
+                while time.perf_counter() < deadline:
+                    with lock:
+                        method, path, body = self.build_request(name)
+                    started = time.perf_counter()
+                    try:
+                        conn.request(method, self.prefix + path, json.dumps(body) if body else None, headers)
+                        response = conn.getresponse()
+                        response.read()
+                        status = response.status
+                    except (OSError, http.client.HTTPException) as exc:
+                        conn.close()
+                        status = 'error'
+                        if isinstance(exc, ConnectionRefusedError):
+                            failure.append(exc)
+                            return
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+                        statuses[status] = statuses.get(status, 0) + 1
+            finally:
+                conn.close()
+
+        workers = [threading.Thread(target=client) for _ in range(threads)]
+        wall_start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        wall = time.perf_counter() - wall_start
+        if failure:
+            raise CommandError(f'Cannot reach {self.host}:{self.port}: {failure[0]}')
+
+        latencies.sort()
+        ok = sum(count for status, count in statuses.items() if status != 'error' and status < 400)
+        return {
+            'requests': len(latencies),
+            'throughput': len(latencies) / wall if wall else 0.0,
+            'ok': ok,
+            'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+            'p50_ms': self.percentile(latencies, 50) * 1000,
+            'p95_ms': self.percentile(latencies, 95) * 1000,
+            'p99_ms': self.percentile(latencies, 99) * 1000,
+            'mean_ms': statistics.mean(latencies) * 1000 if latencies else 0.0,
+        }
+
+    def report(self, stats):
+        style = self.style.SUCCESS if stats['ok'] == stats['requests'] else self.style.WARNING
+        self.stdout.write(style(
+            f"{stats['endpoint']:<18} {stats['requests']:>7} req {stats['throughput']:>8.1f} req/s  "
+            f"p50 {stats['p50_ms']:>7.1f}ms  p95 {stats['p95_ms']:>7.1f}ms  p99 {stats['p99_ms']:>7.1f}ms  "
+            f"{stats['queries']:>3} queries  statuses {stats['statuses']}"
+        ))
+
+    @staticmethod
+    def percentile(sorted_values, pct):
+        if not sorted_values:
+            return 0.0
+        index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+        return sorted_values[index]
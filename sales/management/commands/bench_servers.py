@@ -0,0 +1,159 @@
+import http.client
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from operator import itemgetter
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from .bench_http import ENDPOINTS
+
+SERVERS = {
+    'wsgi': ['grocery_pos_backend.wsgi:application'],
+    'asgi': ['grocery_pos_backend.asgi:application', '-k', 'uvicorn.workers.UvicornWorker'],
+}
+
+class Command(BaseCommand):
+    help = (
+        'Start the API under gunicorn as WSGI (sync workers) and as ASGI (uvicorn workers) '
+        'with the same memory budget, load both with bench_http and report them side by side. '
+        'Run generate_dataset first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--memory-mb', type=int, default=1024, help='Memory budget for each server (PSS of all workers)')
+        parser.add_argument('--wsgi-workers', type=int, help='Skip calibration and use this many WSGI workers')
+        parser.add_argument('--asgi-workers', type=int, help='Skip calibration and use this many ASGI workers')
+        parser.add_argument('--endpoints', default='product-list,scan,inventory-list,inventory-summary,receipt',
+                            help=f"Comma-separated subset of {', '.join(ENDPOINTS)}")
+        parser.add_argument('--threads', type=int, default=64, help='Concurrent terminals')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of load per endpoint')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        results = []
+        for mode in SERVERS:
+            workers = options[f'{mode}_workers'] or self.calibrate(mode, options)
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{mode.upper()}: {workers} worker(s)'))
+            with _Server(mode, workers, options['port']) as pids:
+                stats = self.load(options, options['endpoints'], options['threads'], options['duration'], self.stdout)
+                memory = self.memory_mb(pids())
+            for entry in stats:
+                entry.update(server=mode, workers=workers, memory_mb=round(memory, 1))
+            results.extend(stats)
+
+        self.report(results)
+        if options['json_path']:
+            with open(options['json_path'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+
+    def calibrate(self, mode, options):
+        """Workers that fit the budget, from the memory of one worker after a short warm-up."""
+        with _Server(mode, 1, options['port']) as pids:
+            self.load(options, options['endpoints'], threads=1, duration=1, stdout=io.StringIO())
+            per_worker = self.memory_mb(pids(include_master=False))
+        workers = max(1, int(options['memory_mb'] // max(per_worker, 1)))
+        self.stdout.write(f'{mode}: {per_worker:.1f} MB per worker -> {workers} worker(s) in {options["memory_mb"]} MB')
+        return workers
+
+    def load(self, options, endpoints, threads, duration, stdout):
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command(
+                'bench_http', url=f"http://127.0.0.1:{options['port']}/api/v1/", endpoints=endpoints,
+                threads=threads, duration=duration, json_path=output.name, stdout=stdout,
+            )
+            with open(output.name) as handle:
+                return json.load(handle)
+
+    @staticmethod
+    def memory_mb(pids):
+        """Proportional set size of the processes (shared pages split between them), falling back to RSS."""
+        total = 0
+        for pid in pids:
+            for path, field in ((f'/proc/{pid}/smaps_rollup', 'Pss:'), (f'/proc/{pid}/status', 'VmRSS:')):
+                try:
+                    with open(path) as handle:
+                        line = next((line for line in handle if line.startswith(field)), None)
+                except OSError:
+                    continue
+                if line:
+                    total += int(line.split()[1])
+                    break
+        return total / 1024
+
+    def report(self, results):
+        self.stdout.write('')
+        self.stdout.write(f"{'endpoint':<18} {'server':<5} {'workers':>7} {'memory':>9} {'req/s':>9} "
+                          f"{'p50':>9} {'p95':>9} {'p99':>9} {'ok':>7}")
+        for entry in sorted(results, key=itemgetter('endpoint', 'server')):
+            self.stdout.write(
+                f"{entry['endpoint']:<18} {entry['server']:<5} {entry['workers']:>7} {entry['memory_mb']:>6.0f} MB "
+                f"{entry['throughput']:>9.1f} {entry['p50_ms']:>7.1f}ms {entry['p95_ms']:>7.1f}ms "
+                f"{entry['p99_ms']:>7.1f}ms {entry['ok']:>7}"
+            )
+
+
+class _Server:
+    """A gunicorn process serving the API for the duration of a `with` block."""
+
+    def __init__(self, mode, workers, port):
+        self.port = port
+        env = dict(os.environ)
+        # The entry point picks its own URL configuration.
+        env.pop('DJANGO_ROOT_URLCONF', None)
+        self.args = [
+            sys.executable, '-m', 'gunicorn', *SERVERS[mode],
+            '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--log-level', 'warning',
+            # Workers fork from a loaded app, so they are ready at once and share its pages.
+            '--preload',
+        ]
+        self.env = env
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.args, env=self.env)
+        deadline = time.monotonic() + 30
+        while True:
+            if self.process.poll() is not None:
+                raise CommandError(f"Server exited with status {self.process.returncode}: {' '.join(self.args)}")
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+                connection.request('GET', '/metrics')
+                connection.getresponse().read()
+                connection.close()
+                break
+            except (OSError, http.client.HTTPException):
+                if time.monotonic() > deadline:
+                    self.__exit__()
+                    raise CommandError(f'Server did not start listening on port {self.port}')
+                time.sleep(0.2)
+        return self.pids
+
+    def __exit__(self, *exc_info):
+        self.process.send_signal(signal.SIGTERM)
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def pids(self, include_master=True):
+        children = []
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/stat') as handle:
+                    # The parent pid is the second field after the parenthesised command name.
+                    ppid = int(handle.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            if ppid == self.process.pid:
+                children.append(int(entry))
+        return [self.process.pid, *children] if include_master else children
@@ -0,0 +1,34 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError, OutputWrapper
+from sales import exports
+
+class Command(BaseCommand):
+    help = 'Stream sales, sale items or inventory to a CSV or NDJSON file with flat memory use'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(exports.DATASETS))
+        parser.add_argument('--format', choices=sorted(exports.FORMATS), default='csv')
+        parser.add_argument('--start', type=date.fromisoformat, help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument('--output', help='File to write; defaults to stdout')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip')
+
+    def handle(self, *args, **options):
+        chunks = exports.export(
+            options['dataset'], options['format'],
+            start=options['start'], end=options['end'], chunk_size=options['chunk_size']
+        )
+        try:
+            output = open(options['output'], 'w', newline='') if options['output'] else None
+        except OSError as exc:
+            raise CommandError(f"Cannot write {options['output']}: {exc}")
+        target = OutputWrapper(output) if output else self.stdout
+        try:
+            for chunk in chunks:
+                target.write(chunk, ending='')
+        finally:
+            if output:
+                output.close()
+        if output:
+            self.stderr.write(self.style.SUCCESS(f"Exported {options['dataset']} to {options['output']}."))
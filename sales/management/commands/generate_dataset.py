@@ -0,0 +1,210 @@
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from products.importer import CatalogImporter
+from products.models import Product
+from sales import receipts, rollups
+from sales.models import Customer, Receipt, Sale, SaleItem
+from suppliers.models import ProductSupplier, Supplier
+from users.models import User
+
+CATEGORY_NAMES = [
+    'Beverages', 'Snacks', 'Dairy', 'Bakery', 'Produce', 'Meat', 'Seafood', 'Frozen Foods',
+    'Pantry', 'Personal Care', 'Household', 'Confectionery', 'Baby Products', 'Pet Supplies',
+]
+ADJECTIVES = ['Fresh', 'Organic', 'Classic', 'Premium', 'Lite', 'Family', 'Spicy', 'Sweet', 'Crunchy', 'Natural']
+NOUNS = ['Cola', 'Chips', 'Milk', 'Bread', 'Apples', 'Rice', 'Coffee', 'Yogurt', 'Cookies', 'Soap',
+         'Juice', 'Pasta', 'Cheese', 'Noodles', 'Tuna', 'Cereal', 'Butter', 'Tea', 'Eggs', 'Sauce']
+SIZES = ['100g', '250g', '500g', '1kg', '330ml', '500ml', '1L', '2L', '6-pack', '12-pack']
+TAX_RATES = [Decimal('0'), Decimal('5'), Decimal('12')]
+PAYMENT_METHODS = ['cash', 'credit', 'debit']
+PAYMENT_WEIGHTS = [50, 30, 20]
+# Relative store traffic for each hour of the day, peaking at lunch and after work.
+HOUR_WEIGHTS = [0, 0, 0, 0, 0, 0, 1, 3, 5, 6, 7, 9, 10, 8, 6, 6, 7, 9, 10, 8, 6, 4, 2, 1]
+
+class Command(BaseCommand):
+    help = (
+        'Generate a synthetic store: categories, products with stock, suppliers, customers, '
+        'cashiers and historical sales whose product popularity follows a Zipf distribution'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=25)
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--suppliers', type=int, default=50)
+        parser.add_argument('--customers', type=int, default=2000)
+        parser.add_argument('--cashiers', type=int, default=8)
+        parser.add_argument('--sales', type=int, default=20000)
+        parser.add_argument('--mean-lines', type=float, default=4.0, help='Average line items per sale')
+        parser.add_argument('--max-lines', type=int, default=40)
+        parser.add_argument('--days', type=int, default=90, help='Spread sales over this many past days')
+        parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent for product popularity')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.tag = uuid.UUID(int=self.rng.getrandbits(128)).hex[:6]
+        self.chunk_size = options['chunk_size']
+        started = time.perf_counter()
+
+        products = self.create_products(options['products'], options['categories'])
+        self.create_suppliers(options['suppliers'], products)
+        customers = self.create_customers(options['customers'])
+        cashiers = self.create_cashiers(options['cashiers'])
+        first_day = self.create_sales(options, products, customers, cashiers)
+        if first_day:
+            rollups.rebuild(since=first_day)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated dataset '{self.tag}' in {time.perf_counter() - started:.1f}s: "
+            f"{len(products)} products, {options['suppliers']} suppliers, {len(customers)} customers, "
+            f"{len(cashiers)} cashiers, {options['sales']} sales."
+        ))
+
+    def create_products(self, count, category_count):
+        categories = [
+            CATEGORY_NAMES[i % len(CATEGORY_NAMES)] + (f' {i // len(CATEGORY_NAMES) + 1}' if i >= len(CATEGORY_NAMES) else '')
+            for i in range(max(1, category_count))
+        ]
+        rng = self.rng
+
+        def rows():
+            for i in range(count):
+                # Log-normal prices: mostly cheap staples with a long tail of expensive items.
+                price = Decimal(str(round(min(max(rng.lognormvariate(1.2, 0.8), 0.25), 500), 2)))
+                cost = (price * Decimal(str(rng.uniform(0.55, 0.85)))).quantize(Decimal('0.01'))
+                yield i + 2, {
+                    'sku': f'GEN-{self.tag}-{i:07d}',
+                    'barcode': f'G{self.tag}{i:07d}',
+                    'name': f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.choice(SIZES)}',
+                    'category': rng.choice(categories),
+                    'price': price,
+                    'cost': cost,
+                    'tax_rate': rng.choice(TAX_RATES),
+                    'quantity': rng.randint(0, 500),
+                    'reorder_level': rng.choice([5, 10, 20]),
+                }, None
+
+        importer = CatalogImporter(chunk_size=self.chunk_size)
+        importer.run(rows(), progress=lambda counts: self.stdout.write(f"products: {counts['created']} created"))
+        return list(
+            Product.objects.filter(sku__startswith=f'GEN-{self.tag}-')
+            .order_by('pk').only('id', 'name', 'sku', 'price', 'cost', 'tax_rate')
+        )
+
+    def create_suppliers(self, count, products):
+        if not count:
+            return
+        suppliers = Supplier.objects.bulk_create([
+            Supplier(
+                name=f'Supplier {self.tag}-{i}', contact_person=f'Contact {i}', phone=f'555-{i:04d}',
+                email=f'supplier-{self.tag}-{i}@example.com', address=f'{i} Warehouse Road',
+            )
+            for i in range(count)
+        ])
+        links = []
+        for product in products:
+            for supplier in self.rng.sample(suppliers, min(len(suppliers), self.rng.choice([1, 1, 2]))):
+                links.append(ProductSupplier(
+                    product=product, supplier=supplier,
+                    supplier_sku=f'{supplier.pk}-{product.sku}', lead_time_days=self.rng.randint(2, 14),
+                ))
+        ProductSupplier.objects.bulk_create(links, batch_size=self.chunk_size)
+        self.stdout.write(f'suppliers: {count} created, {len(links)} product links')
+
+    def create_customers(self, count):
+        customers = Customer.objects.bulk_create([
+            Customer(name=f'Customer {self.tag}-{i}', email=f'customer-{self.tag}-{i}@example.com',
+                     loyalty_points=self.rng.randint(0, 500))
+            for i in range(count)
+        ], batch_size=self.chunk_size)
+        self.stdout.write(f'customers: {len(customers)} created')
+        return customers
+
+    def create_cashiers(self, count):
+        cashiers = []
+        for i in range(max(1, count)):
+            username = f'gen-cashier-{i}'
+            user = User.objects.filter(username=username).first() or User.objects.create_user(
+                username=username, password=uuid.uuid4().hex, role='cashier',
+                name=f'Cashier {i}', email=f'{username}@example.com'
+            )
+            cashiers.append(user)
+        return cashiers
+
+    def create_sales(self, options, products, customers, cashiers):
+        if not options['sales'] or not products:
+            return None
+        rng = self.rng
+        # Popularity rank is independent of catalog order.
+        ranked = products[:]
+        rng.shuffle(ranked)
+        cum_weights = list(accumulate(1 / rank ** options['zipf'] for rank in range(1, len(ranked) + 1)))
+        hour_weights = list(accumulate(HOUR_WEIGHTS))
+        # History ends yesterday so no sale lies in the future.
+        first_day = timezone.localdate() - timedelta(days=max(1, options['days']))
+
+        created = 0
+        while created < options['sales']:
+            count = min(self.chunk_size, options['sales'] - created)
+            sales, lines = [], []
+            for n in range(created, created + count):
+                day = first_day + timedelta(days=rng.randrange(max(1, options['days'])))
+                hour = rng.choices(range(24), cum_weights=hour_weights)[0]
+                moment = timezone.make_aware(datetime(
+                    day.year, day.month, day.day, hour, rng.randrange(60), rng.randrange(60)
+                ))
+                line_count = min(options['max_lines'], 1 + int(rng.expovariate(1 / max(options['mean_lines'] - 1, 0.01))))
+                quantities = {}
+                for product in rng.choices(ranked, cum_weights=cum_weights, k=line_count):
+                    quantities[product] = quantities.get(product, 0) + rng.choice([1, 1, 1, 1, 2, 2, 3, 5])
+                items = [
+                    SaleItem(product=product, quantity=quantity, unit_price=product.price, unit_cost=product.cost,
+                             tax_rate=product.tax_rate, total_price=product.price * quantity)
+                    for product, quantity in quantities.items()
+                ]
+                sale = Sale(
+                    invoice_number=f'GEN-{self.tag}-{n:08d}',
+                    user=rng.choice(cashiers),
+                    customer=rng.choice(customers) if customers and rng.random() < 0.4 else None,
+                    payment_method=rng.choices(PAYMENT_METHODS, weights=PAYMENT_WEIGHTS)[0],
+                    payment_status='cancelled' if rng.random() < 0.01 else 'paid',
+                )
+                sale.calculate_totals(items, save=False)
+                sale.sale_date = moment
+                sales.append(sale)
+                lines.append(items)
+            self.save_sales(sales, lines)
+            created += count
+            self.stdout.write(f'sales: {created} created')
+        return first_day
+
+    @transaction.atomic
+    def save_sales(self, sales, lines):
+        moments = [sale.sale_date for sale in sales]
+        Sale.objects.bulk_create(sales)
+        # bulk_create stamps auto_now_add fields; restore the historical dates.
+        for sale, moment in zip(sales, moments):
+            sale.sale_date = sale.created_at = moment
+        Sale.objects.bulk_update(sales, ['sale_date', 'created_at'])
+
+        items = []
+        for sale, sale_items in zip(sales, lines):
+            for item in sale_items:
+                item.sale = sale
+            items.extend(sale_items)
+        SaleItem.objects.bulk_create(items, batch_size=self.chunk_size)
+        Receipt.objects.bulk_create([
+            Receipt(sale=sale, receipt_number=receipts.receipt_number(sale),
+                    receipt_data=receipts.build(sale, sale_items))
+            for sale, sale_items in zip(sales, lines)
+        ], batch_size=self.chunk_size)
@@ -0,0 +1,23 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales import rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the day and hour sales rollups from the raw sales tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First day to rebuild (YYYY-MM-DD); default is all history')
+        parser.add_argument('--until', help='Day to stop before (YYYY-MM-DD, exclusive)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            since = date.fromisoformat(options['since']) if options['since'] else None
+            until = date.fromisoformat(options['until']) if options['until'] else None
+        except ValueError as exc:
+            raise CommandError(f'Invalid date: {exc}')
+        created = rollups.rebuild(since=since, until=until, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} sales rollup buckets.'))
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.20 on 2026-10-18 09:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('products', '0002_product_search_indexes'),
+        ('sales', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grain', models.CharField(choices=[('day', 'Day'), ('hour', 'Hour')], max_length=10)),
+                ('period_start', models.DateTimeField()),
+                ('payment_method', models.CharField(choices=[('cash', 'Cash'), ('credit', 'Credit Card'), ('debit', 'Debit Card')], max_length=20)),
+                ('tax_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('units', models.IntegerField(default=0)),
+                ('line_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('tax', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('cashier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='products.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='products.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(fields=('grain', 'period_start', 'product', 'cashier', 'payment_method', 'tax_rate'), name='unique_sales_rollup_bucket'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.20 on 2026-10-18 09:48
+
+import ast
+
+from django.db import migrations, models
+
+
+def parse_legacy_receipts(apps, schema_editor):
+    # Checkout used to store str(dict); recover the structured data where possible.
+    Receipt = apps.get_model('sales', 'Receipt')
+    for receipt in Receipt.objects.filter(receipt_data__isnull=True).iterator(chunk_size=1000):
+        try:
+            data = ast.literal_eval(receipt.receipt_content)
+        except (ValueError, SyntaxError):
+            continue
+        if not isinstance(data, dict) or 'items' not in data:
+            continue
+        for key in ('subtotal', 'tax_amount', 'total_amount'):
+            data[key] = f"{data.get(key, 0):.2f}"
+        for item in data['items']:
+            item['unit_price'] = f"{item['unit_price']:.2f}"
+            item['total'] = f"{item['total']:.2f}"
+        receipt.receipt_data = data
+        receipt.receipt_content = ''
+        receipt.save(update_fields=['receipt_data', 'receipt_content'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0003_salesrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receipt',
+            name='receipt_data',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='receipt',
+            name='receipt_content',
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(parse_legacy_receipts, migrations.RunPython.noop),
+    ]
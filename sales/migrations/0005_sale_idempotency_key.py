@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 09:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_structured_receipts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
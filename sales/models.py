@@ -1,6 +1,6 @@
 from django.db import models
 from django.conf import settings
-from products.models import Product
+from products.models import Category, Product
 from decimal import Decimal
 
 
@@ -31,6 +31,8 @@ class Sale(models.Model):
     ]
 
     invoice_number = models.CharField(max_length=50, unique=True)
+    # Client-generated key for replayed offline sales; the unique index makes retries cheap to detect.
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name="sales"
     )
@@ -52,44 +54,34 @@ class Sale(models.Model):
     def __str__(self):
         return f"Invoice #{self.invoice_number} - {self.total_amount}"
     
-    def calculate_totals(self):
-        items = self.items.all()
-        self.subtotal = sum(item.total_price for item in items)
-        self.tax_amount = sum(item.total_price * (item.tax_rate / Decimal("100")) for item in items)
+    def calculate_totals(self, items=None, save=True):
+        """Calculate totals from `items`, or from the saved sale items if not given."""
+        if items is None:
+            items = self.items.all()
+        self.subtotal = sum(Decimal(item.total_price) for item in items)
+        self.tax_amount = sum(Decimal(item.total_price) * (Decimal(item.tax_rate) / Decimal("100")) for item in items)
         self.total_amount = self.subtotal + self.tax_amount - Decimal(self.discount_amount)
-        self.save()
+        if save:
+            self.save()
 
     def generate_receipt(self):
         """Generate receipt for the sale"""
+        from . import receipts
+
         receipt, created = Receipt.objects.get_or_create(
             sale=self,
             defaults={
-                'receipt_number': f"RCPT-{self.invoice_number}",
-                'receipt_content': self.get_receipt_content()
+                'receipt_number': receipts.receipt_number(self),
+                'receipt_data': receipts.build(self, self.items.select_related('product'))
             }
         )
         return receipt
 
     def get_receipt_content(self):
         """Generate detailed receipt content"""
-        items = []
-        for item in self.items.all():
-            items.append(f"{item.quantity}x {item.product.name} @ {item.unit_price} = {item.total_price}")
-        
-        receipt_lines = [
-            f"Receipt for Invoice #{self.invoice_number}",
-            f"Date: {self.sale_date.strftime('%Y-%m-%d %H:%M:%S')}",
-            "----------------------------------------",
-            *items,
-            "----------------------------------------",
-            f"Subtotal: {self.subtotal}",
-            f"Tax: {self.tax_amount}",
-            f"Discount: {self.discount_amount}",
-            f"Total: {self.total_amount}",
-            f"Payment Method: {self.get_payment_method_display()}",
-            "Thank you for your business!"
-        ]
-        return "\n".join(receipt_lines)
+        from . import receipts
+
+        return receipts.render_text(receipts.build(self, self.items.select_related('product')))
 
 
 class SaleItem(models.Model):
@@ -113,9 +105,54 @@ class SaleItem(models.Model):
 class Receipt(models.Model):
     sale = models.OneToOneField(Sale, on_delete=models.CASCADE, related_name="receipt")
     receipt_number = models.CharField(max_length=50, unique=True)
-    receipt_content = models.TextField()
+    # Structured snapshot written at checkout; see sales.receipts.
+    receipt_data = models.JSONField(null=True, blank=True)
+    # Pre-rendered text, only kept for receipts created before receipt_data.
+    receipt_content = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Receipt #{self.receipt_number} for Sale #{self.sale.invoice_number}"
+
+
+class SalesRollup(models.Model):
+    """Pre-aggregated sale lines, maintained incrementally at checkout by sales.rollups."""
+
+    GRAINS = [
+        ("day", "Day"),
+        ("hour", "Hour"),
+    ]
+
+    grain = models.CharField(max_length=10, choices=GRAINS)
+    period_start = models.DateTimeField()
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="sales_rollups"
+    )
+    # The product's category when the first sale in the bucket was recorded.
+    category = models.ForeignKey(
+        Category, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    cashier = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    payment_method = models.CharField(max_length=20, choices=Sale.PAYMENT_METHODS)
+    tax_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    units = models.IntegerField(default=0)
+    line_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    tax = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["grain", "period_start", "product", "cashier", "payment_method", "tax_rate"],
+                name="unique_sales_rollup_bucket",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.grain} {self.period_start:%Y-%m-%d %H:00} - {self.product_id}: {self.units} units"
@@ -0,0 +1,125 @@
+"""
+Structured sale receipts.
+
+Checkout stores a compact snapshot of the sale in Receipt.receipt_data, built
+from the sale and line items already in memory. The text rendering is produced
+on read, and the whole receipt payload is cached per sale, so a reprint costs
+at most one query.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Receipt
+
+CACHE_TIMEOUT = getattr(settings, "RECEIPT_CACHE_TIMEOUT", 3600)
+RULE = "-" * 40
+CENT = Decimal("0.01")
+
+
+def cache_key(sale_id):
+    return f"receipt:sale:{sale_id}"
+
+
+def receipt_number(sale):
+    return f"RCPT-{sale.invoice_number}"
+
+
+def amount(value):
+    return str(Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP))
+
+
+def build(sale, items):
+    """Snapshot `sale` and its in-memory `items` (with products attached). Amounts are strings."""
+    return {
+        "invoice_number": sale.invoice_number,
+        "date": sale.sale_date.isoformat(),
+        "cashier": sale.user.get_full_name() or sale.user.username,
+        "customer": sale.customer.name if sale.customer else "Walk-in Customer",
+        "items": [
+            {
+                "name": item.product.name,
+                "sku": item.product.sku,
+                "quantity": item.quantity,
+                "unit_price": amount(item.unit_price),
+                "tax_rate": amount(item.tax_rate),
+                "total": amount(item.total_price),
+            }
+            for item in items
+        ],
+        "subtotal": amount(sale.subtotal),
+        "tax_amount": amount(sale.tax_amount),
+        "discount_amount": amount(sale.discount_amount),
+        "total_amount": amount(sale.total_amount),
+        "payment_method": sale.get_payment_method_display(),
+    }
+
+
+def render_text(data):
+    """Printable receipt text for a `build` snapshot."""
+    lines = [
+        f"Receipt for Invoice #{data['invoice_number']}",
+        f"Date: {data['date'][:19].replace('T', ' ')}",
+        f"Cashier: {data['cashier']}",
+        f"Customer: {data['customer']}",
+        RULE,
+        *(f"{item['quantity']}x {item['name']} @ {item['unit_price']} = {item['total']}"
+          for item in data["items"]),
+        RULE,
+        f"Subtotal: {data['subtotal']}",
+        f"Tax: {data['tax_amount']}",
+        f"Discount: {data.get('discount_amount', '0.00')}",
+        f"Total: {data['total_amount']}",
+        f"Payment Method: {data['payment_method']}",
+        "Thank you for your business!",
+    ]
+    return "\n".join(lines)
+
+
+def to_payload(receipt):
+    # Receipts stored before structured data existed only have their text.
+    data = receipt.receipt_data
+    return {
+        "id": receipt.id,
+        "sale": receipt.sale_id,
+        "receipt_number": receipt.receipt_number,
+        "receipt": data,
+        "receipt_content": render_text(data) if data else receipt.receipt_content,
+        "created_at": receipt.created_at.isoformat(),
+    }
+
+
+def for_sale(sale_id):
+    """Return the rendered receipt payload for a sale, or None if it has no receipt."""
+    key = cache_key(sale_id)
+    payload = cache.get(key)
+    if payload is None:
+        receipt = Receipt.objects.filter(sale_id=sale_id).first()
+        if receipt is None:
+            return None
+        payload = to_payload(receipt)
+        cache.set(key, payload, CACHE_TIMEOUT)
+    return payload
+
+
+async def afor_sale(sale_id):
+    """for_sale() for async views."""
+    key = cache_key(sale_id)
+    payload = await cache.aget(key)
+    if payload is None:
+        receipt = await Receipt.objects.filter(sale_id=sale_id).afirst()
+        if receipt is None:
+            return None
+        payload = to_payload(receipt)
+        await cache.aset(key, payload, CACHE_TIMEOUT)
+    return payload
+
+
+@receiver([post_save, post_delete], sender=Receipt)
+def receipt_changed(sender, instance, **kwargs):
+    key = cache_key(instance.sale_id)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,190 @@
+"""
+Maintenance and querying of the SalesRollup reporting buckets.
+
+`record_sale` folds a sale's lines into its day and hour buckets with a single
+INSERT ... ON CONFLICT DO UPDATE inside the checkout transaction. `rebuild`
+recomputes a date range from the raw Sale/SaleItem tables. `report` answers
+revenue, margin and tax questions from the buckets alone.
+"""
+from datetime import datetime, time, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Round, TruncDay, TruncHour
+from django.utils import timezone
+
+from .models import SaleItem, SalesRollup
+
+KEY_FIELDS = ["grain", "period_start", "product", "cashier", "payment_method", "tax_rate"]
+SUM_FIELDS = ["units", "line_count", "revenue", "tax", "cost"]
+CENT = Decimal("0.01")
+# Bucket rows per INSERT, keeping the parameter count within backend limits.
+UPSERT_BATCH = 1000
+
+# Report dimensions and the rollup columns each one groups by.
+GROUP_FIELDS = {
+    "period": ["period_start"],
+    "product": ["product_id", "product__name"],
+    "category": ["category_id", "category__name"],
+    "cashier": ["cashier_id", "cashier__username"],
+    "payment_method": ["payment_method"],
+    "tax_rate": ["tax_rate"],
+}
+
+
+def period_starts(moment):
+    moment = timezone.localtime(moment)
+    hour = moment.replace(minute=0, second=0, microsecond=0)
+    return {"day": hour.replace(hour=0), "hour": hour}
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def line_tax(item):
+    """Per-line tax rounded to cents, matching the ROUND() used by `rebuild`."""
+    tax = Decimal(item.total_price) * Decimal(item.tax_rate) / Decimal("100")
+    return tax.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def record_sale(sale, items):
+    """Add the sale's lines to their day and hour buckets. Call inside the sale's transaction."""
+    record_sales([(sale, items)])
+
+
+def record_sales(sales):
+    """Fold several (sale, items) pairs into the buckets with one upsert per UPSERT_BATCH buckets."""
+    buckets = {}
+    for sale, items in sales:
+        for grain, period_start in period_starts(sale.sale_date).items():
+            for item in items:
+                key = (grain, period_start, item.product_id, sale.user_id,
+                       sale.payment_method, Decimal(item.tax_rate))
+                bucket = buckets.setdefault(key, {
+                    "category": item.product.category_id,
+                    "units": 0, "line_count": 0,
+                    "revenue": Decimal("0"), "tax": Decimal("0"), "cost": Decimal("0"),
+                })
+                bucket["units"] += item.quantity
+                bucket["line_count"] += 1
+                bucket["revenue"] += Decimal(item.total_price)
+                bucket["tax"] += line_tax(item)
+                bucket["cost"] += Decimal(item.unit_cost) * item.quantity
+    # Sorted so concurrent checkouts touch bucket rows in the same order.
+    keys = sorted(buckets)
+    for start in range(0, len(keys), UPSERT_BATCH):
+        _upsert_increment({key: buckets[key] for key in keys[start:start + UPSERT_BATCH]})
+
+
+def _upsert_increment(buckets):
+    if not buckets:
+        return
+    meta = SalesRollup._meta
+    quote = connection.ops.quote_name
+    table = quote(meta.db_table)
+    fields = [meta.get_field(name) for name in (*KEY_FIELDS, "category", *SUM_FIELDS, "created_at", "updated_at")]
+    now = timezone.now()
+
+    params = []
+    for key in sorted(buckets):
+        values = dict(zip(KEY_FIELDS, key), created_at=now, updated_at=now, **buckets[key])
+        params.extend(field.get_db_prep_save(values[field.name], connection) for field in fields)
+
+    row_sql = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    updates = [
+        f"{quote(column)} = {table}.{quote(column)} + excluded.{quote(column)}"
+        for column in (meta.get_field(name).column for name in SUM_FIELDS)
+    ]
+    updates.append(f"{quote('updated_at')} = excluded.{quote('updated_at')}")
+    sql = (
+        f"INSERT INTO {table} ({', '.join(quote(field.column) for field in fields)}) "
+        f"VALUES {', '.join([row_sql] * len(buckets))} "
+        f"ON CONFLICT ({', '.join(quote(meta.get_field(name).column) for name in KEY_FIELDS)}) "
+        f"DO UPDATE SET {', '.join(updates)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+@transaction.atomic
+def rebuild(since=None, until=None, batch_size=5000):
+    """Recompute every bucket for sales on days in [since, until) from the raw sales tables.
+
+    Buckets are rebuilt with each product's current category.
+    """
+    rollups = SalesRollup.objects.all()
+    lines = SaleItem.objects.exclude(sale__payment_status="cancelled")
+    if since:
+        rollups = rollups.filter(period_start__gte=day_start(since))
+        lines = lines.filter(sale__sale_date__gte=day_start(since))
+    if until:
+        rollups = rollups.filter(period_start__lt=day_start(until))
+        lines = lines.filter(sale__sale_date__lt=day_start(until))
+    rollups.delete()
+
+    money = DecimalField(max_digits=14, decimal_places=2)
+    created = 0
+    for grain, trunc in (("day", TruncDay), ("hour", TruncHour)):
+        rows = (
+            lines.annotate(period=trunc("sale__sale_date"))
+            .values("period", "product_id", "product__category_id", "sale__user_id",
+                    "sale__payment_method", "tax_rate")
+            .annotate(
+                units_sum=Sum("quantity"),
+                line_total=Count("id"),
+                revenue_sum=Sum("total_price"),
+                tax_sum=Sum(Round(F("total_price") * F("tax_rate") / Value(Decimal("100")), 2), output_field=money),
+                cost_sum=Sum(F("unit_cost") * F("quantity"), output_field=money),
+            )
+            .order_by()
+        )
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(SalesRollup(
+                grain=grain,
+                period_start=row["period"],
+                product_id=row["product_id"],
+                category_id=row["product__category_id"],
+                cashier_id=row["sale__user_id"],
+                payment_method=row["sale__payment_method"],
+                tax_rate=row["tax_rate"],
+                units=row["units_sum"],
+                line_count=row["line_total"],
+                revenue=row["revenue_sum"],
+                tax=row["tax_sum"],
+                cost=row["cost_sum"],
+            ))
+            if len(batch) >= batch_size:
+                SalesRollup.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        SalesRollup.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def report(start, end, grain="day", group_by=()):
+    """Aggregate buckets for days in [start, end] by the requested dimensions."""
+    columns = [column for dimension in group_by for column in GROUP_FIELDS[dimension]]
+    queryset = SalesRollup.objects.filter(
+        grain=grain,
+        period_start__gte=day_start(start),
+        period_start__lt=day_start(end + timedelta(days=1)),
+    )
+    sums = {f"total_{name}": Sum(name) for name in SUM_FIELDS}
+    rows = list(queryset.values(*columns).annotate(**sums).order_by(*columns)) if columns else []
+    totals = queryset.aggregate(**sums)
+    return {
+        "rows": [{**{c: row[c] for c in columns}, **_measures(row)} for row in rows],
+        "totals": _measures(totals),
+    }
+
+
+def _measures(row):
+    measures = {name: row[f"total_{name}"] or 0 for name in ("units", "line_count")}
+    for name in ("revenue", "tax", "cost"):
+        measures[name] = Decimal(row[f"total_{name}"] or 0).quantize(CENT)
+    measures["margin"] = measures["revenue"] - measures["cost"]
+    return measures
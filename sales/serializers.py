@@ -3,6 +3,9 @@ from rest_framework import serializers
 from .models import Customer, Sale, SaleItem, Receipt
 from products.models import Inventory, Product
 from django.conf import settings
+from collections import defaultdict
+from datetime import timedelta
+from django.utils import timezone
 
 class CustomerSerializer(serializers.ModelSerializer):
     class Meta:
@@ -23,39 +26,30 @@ class ProductSerializer(serializers.ModelSerializer):
         except Inventory.DoesNotExist:
             return 0
 
+class SaleItemListSerializer(serializers.ListSerializer):
+    def get_attribute(self, instance):
+        # A sale the parent serializer just created lists the items it inserted
+        created_items = getattr(self.parent, 'created_items', None)
+        if created_items is not None and instance is self.parent.instance:
+            return created_items
+        return super().get_attribute(instance)
+
 class SaleItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
-    product_id = serializers.PrimaryKeyRelatedField(
-        queryset=Product.objects.all(),
-        source='product',
-        write_only=True
-    )
+    # Resolved to a Product in bulk by SaleSerializer.validate_items.
+    product_id = serializers.IntegerField(write_only=True)
     
     class Meta:
         model = SaleItem
         fields = ['id', 'product', 'product_id', 'quantity', 'unit_price', 
                  'total_price', 'tax_rate', 'discount_percent']
-    
-    def validate(self, data):
-        product = data['product']
-        quantity = data['quantity']
-        
-        try:
-            inventory = product.inventory
-            if inventory.quantity < quantity:
-                raise serializers.ValidationError(
-                    f"Insufficient stock for {product.name}. Only {inventory.quantity} available."
-                )
-        except Inventory.DoesNotExist:
-            raise serializers.ValidationError(
-                f"No inventory record found for {product.name}"
-            )
-        
-        return data
+        list_serializer_class = SaleItemListSerializer
 
 class SaleSerializer(serializers.ModelSerializer):
     items = SaleItemSerializer(many=True)
     customer = CustomerSerializer(required=False, allow_null=True)
+    # The SaleItems inserted by create(), reused by the view and the response.
+    created_items = None
     
     class Meta:
         model = Sale
@@ -65,6 +59,33 @@ class SaleSerializer(serializers.ModelSerializer):
         read_only_fields = ['invoice_number', 'user', 'subtotal', 'tax_amount', 
                           'discount_amount', 'total_amount', 'sale_date']
 
+    def validate_items(self, items):
+        """Resolve every line's product and inventory in one query and check stock per product."""
+        product_ids = {item['product_id'] for item in items}
+        products = Product.objects.select_related('inventory').in_bulk(product_ids)
+        missing = sorted(product_ids - products.keys())
+        if missing:
+            raise serializers.ValidationError(f"Invalid product id(s): {missing}")
+
+        requested = defaultdict(int)
+        for item in items:
+            item['product'] = products[item.pop('product_id')]
+            requested[item['product'].pk] += item['quantity']
+
+        for product_id, quantity in requested.items():
+            product = products[product_id]
+            try:
+                inventory = product.inventory
+            except Inventory.DoesNotExist:
+                raise serializers.ValidationError(
+                    f"No inventory record found for {product.name}"
+                )
+            if inventory.quantity < quantity:
+                raise serializers.ValidationError(
+                    f"Insufficient stock for {product.name}. Only {inventory.quantity} available."
+                )
+        return items
+
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         customer_data = validated_data.pop('customer', None)
@@ -77,35 +98,69 @@ class SaleSerializer(serializers.ModelSerializer):
                 defaults=customer_data
             )
         
-        # Create sale
-        sale = Sale.objects.create(
-            customer=customer,
-            user=self.context['request'].user,
-            **validated_data
-        )
-        
-        # Create sale items
-        for item_data in items_data:
-            product = item_data['product']
-            SaleItem.objects.create(
-                sale=sale,
-                product=product,
+        # Build the sale items in memory so totals need no reload
+        items = [
+            SaleItem(
+                product=item_data['product'],
                 quantity=item_data['quantity'],
-                unit_price=product.price,
-                unit_cost=product.cost,  # <-- Fix here
+                unit_price=item_data['product'].price,
+                unit_cost=item_data['product'].cost,
                 tax_rate=item_data.get('tax_rate', 0.0),
                 discount_percent=item_data.get('discount_percent', 0.0),
-                total_price=product.price * item_data['quantity']
+                total_price=item_data['product'].price * item_data['quantity']
             )
-        
-        # Calculate totals
-        sale.calculate_totals()
+            for item_data in items_data
+        ]
+
+        # Create sale with its totals already calculated
+        sale = Sale(
+            customer=customer,
+            user=self.context['request'].user,
+            **validated_data
+        )
+        sale.calculate_totals(items, save=False)
+        sale.save()
+
+        # Insert all sale items in a single statement
+        for item in items:
+            item.sale = sale
+        SaleItem.objects.bulk_create(items)
+        self.created_items = items
         return sale
 
 class ReceiptSerializer(serializers.ModelSerializer):
-    sale = SaleSerializer(read_only=True)
+    sale = serializers.PrimaryKeyRelatedField(read_only=True)
     
     class Meta:
         model = Receipt
-        fields = ['id', 'sale', 'receipt_number', 'receipt_content', 'created_at']
-        read_only_fields = ['receipt_number', 'receipt_content']
\ No newline at end of file
+        fields = ['id', 'sale', 'receipt_number', 'receipt_data', 'receipt_content', 'created_at']
+        read_only_fields = ['receipt_number', 'receipt_data', 'receipt_content']
+
+class BatchSaleItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+    tax_rate = serializers.DecimalField(max_digits=5, decimal_places=2, required=False, default=0)
+    discount_percent = serializers.DecimalField(max_digits=5, decimal_places=2, required=False, default=0)
+
+class BatchSaleSerializer(serializers.Serializer):
+    """One queued sale in a batch. Validation touches no tables; products are resolved per batch."""
+    idempotency_key = serializers.CharField(max_length=64)
+    items = BatchSaleItemSerializer(many=True, allow_empty=False)
+    payment_method = serializers.ChoiceField(choices=Sale.PAYMENT_METHODS)
+    # Sale-level discounts are not taken at checkout (read-only on SaleSerializer),
+    # so the line totals the reports fold stay the whole of the sale's revenue.
+    discount_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, default=0)
+    customer = CustomerSerializer(required=False, allow_null=True)
+    # When the terminal rang up the sale; defaults to the time it is ingested.
+    sale_date = serializers.DateTimeField(required=False)
+
+    def validate_discount_amount(self, value):
+        if value:
+            raise serializers.ValidationError("Sale discounts are not accepted.")
+        return value
+
+    def validate_sale_date(self, value):
+        # Allow for terminal clock drift, but not for sales dated in the future.
+        if value > timezone.now() + timedelta(minutes=5):
+            raise serializers.ValidationError("Sale date is in the future.")
+        return value
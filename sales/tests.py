@@ -2,8 +2,23 @@ from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from users.models import User
-from products.models import Category, Product, Inventory
-from sales.models import Customer
+from products.models import Category, Product, Inventory, InventorySummary
+from sales.models import Customer, Receipt, Sale, SaleItem, SalesRollup
+from sales import rollups
+from django.utils import timezone
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from products import scan_cache
+from django.core.management import call_command
+from datetime import timedelta
+from io import StringIO
+import json
+from unittest import mock
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.tokens import AccessToken
+from django.db.models import Sum
+from procurement.models import InventoryTransaction
 
 class SalesAPITestCase(APITestCase):
     def setUp(self):
@@ -72,4 +87,332 @@ class SalesAPITestCase(APITestCase):
         sale_id = sale_response.data['id']
         receipt_url = reverse('sale-receipt', kwargs={'sale_id': sale_id})
         response = self.client.get(receipt_url)
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_receipt_is_structured_and_cached(self):
+        cache.clear()
+        response, _ = self._checkout([self.product], quantity=2)
+        url = reverse('sale-receipt', kwargs={'sale_id': response.data['id']})
+        with self.assertNumQueries(1):
+            receipt = self.client.get(url).data
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).data, receipt)
+
+        self.assertEqual(receipt['receipt']['items'], [{
+            'name': 'Lays', 'sku': 'SKU3', 'quantity': 2,
+            'unit_price': '15.00', 'tax_rate': '0.00', 'total': '30.00',
+        }])
+        self.assertEqual(receipt['receipt']['total_amount'], '30.00')
+        self.assertIn('2x Lays @ 15.00 = 30.00', receipt['receipt_content'])
+        self.assertEqual(self.client.get(reverse('sale-receipt', kwargs={'sale_id': 0})).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def _checkout(self, products, quantity=1):
+        data = {
+            "items": [
+                {
+                    "product_id": p.id,
+                    "quantity": quantity,
+                    "unit_price": str(p.price),
+                    "total_price": str(p.price * quantity)
+                }
+                for p in products
+            ],
+            "payment_method": "cash",
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('create-sale'), data, format='json')
+        return response, len(ctx.captured_queries)
+
+    def test_checkout_query_count_independent_of_cart_size(self):
+        products = []
+        for i in range(10):
+            product = Product.objects.create(
+                name=f'Item {i}', sku=f'CART{i}', barcode=f'7000{i}',
+                category=self.category, price=2, cost=1
+            )
+            Inventory.objects.create(product=product, quantity=10)
+            products.append(product)
+        # The first checkout in a process reserves a block of invoice numbers.
+        self._checkout(products[:1])
+
+        response, single_queries = self._checkout(products[:1])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response, cart_queries = self._checkout(products)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(single_queries, cart_queries)
+
+        self.assertEqual(Inventory.objects.get(product=products[0]).quantity, 7)
+        self.assertEqual(Inventory.objects.get(product=products[9]).quantity, 9)
+        sale = Sale.objects.get(pk=response.data['id'])
+        self.assertEqual(sale.items.count(), 10)
+        self.assertEqual(sale.subtotal, 20)
+        self.assertEqual(response.data['items'][0]['product']['stock_quantity'], 7)
+
+    def test_checkout_rejects_insufficient_stock_across_lines(self):
+        response, _ = self._checkout([self.product, self.product], quantity=30)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 50)
+
+    def test_checkout_rejects_unknown_product(self):
+        data = {
+            "items": [{"product_id": 999999, "quantity": 1, "unit_price": "1.00", "total_price": "1.00"}],
+            "payment_method": "cash"
+        }
+        response = self.client.post(reverse('create-sale'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_conditional_decrement_rejects_oversell(self):
+        from products.models import InsufficientStock
+        from django.db import transaction
+        with self.assertRaises(InsufficientStock) as ctx:
+            with transaction.atomic():
+                Inventory.objects.decrement_stock({self.product.id: 51})
+        self.assertEqual(ctx.exception.shortages, {self.product.id: 50})
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 50)
+
+        with transaction.atomic():
+            Inventory.objects.decrement_stock({self.product.id: 50})
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 0)
+
+
+    def test_checkout_updates_rollups(self):
+        self._checkout([self.product], quantity=2)
+        self._checkout([self.product], quantity=3)
+        day = SalesRollup.objects.get(grain='day')
+        hour = SalesRollup.objects.get(grain='hour')
+        for bucket in (day, hour):
+            self.assertEqual(bucket.units, 5)
+            self.assertEqual(bucket.line_count, 2)
+            self.assertEqual(bucket.revenue, 75)
+            self.assertEqual(bucket.cost, 35)
+            self.assertEqual(bucket.cashier, self.user)
+            self.assertEqual(bucket.category, self.category)
+
+        rollups.rebuild()
+        rebuilt = SalesRollup.objects.get(grain='day')
+        self.assertEqual((rebuilt.units, rebuilt.revenue, rebuilt.cost, rebuilt.tax),
+                         (day.units, day.revenue, day.cost, day.tax))
+
+    def test_sales_report(self):
+        self._checkout([self.product], quantity=2)
+        today = timezone.localdate().isoformat()
+        response = self.client.get(reverse('sales-report'), {
+            'start': today, 'end': today, 'group_by': 'category,tax_rate'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['rows']), 1)
+        self.assertEqual(response.data['totals']['revenue'], 30)
+        self.assertEqual(response.data['totals']['margin'], 16)
+        self.assertEqual(response.data['rows'][0]['category__name'], 'Snacks')
+
+        response = self.client.get(reverse('sales-report'), {'group_by': 'nope'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def export(self, dataset, fmt, **params):
+        url = reverse('sales-export', kwargs={'dataset': dataset, 'fmt': fmt})
+        return self.client.get(url, params)
+
+    def manager(self):
+        return User.objects.create_user(username='manager', password='testpass', role='manager', name='Manager', email='manager@example.com')
+
+    def test_streaming_exports(self):
+        self._checkout([self.product], quantity=2)
+        self._checkout([self.product], quantity=1)
+        today = timezone.localdate()
+
+        # Cashiers may not pull every sale and customer.
+        self.assertEqual(self.export('sales', 'csv').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.manager())
+
+        response = self.export('sale-items', 'csv', start=today.isoformat(), end=today.isoformat())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'sale_id', 'invoice_number'])
+        self.assertEqual(len(lines), 3)
+
+        response = self.export('sales', 'ndjson', end=(today - timedelta(days=1)).isoformat())
+        self.assertEqual(b''.join(response.streaming_content), b'')
+        response = self.export('inventory', 'ndjson')
+        record = json.loads(b''.join(response.streaming_content))
+        self.assertEqual((record['sku'], record['quantity']), ('SKU3', 47))
+
+        self.assertEqual(self.export('users', 'csv').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.export('sales', 'csv', start='yesterday').status_code, status.HTTP_400_BAD_REQUEST)
+
+        out = StringIO()
+        call_command('export_data', 'sales', format='ndjson', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+    async def test_exports_stream_asynchronously_under_asgi(self):
+        await sync_to_async(self._checkout)([self.product], quantity=2)
+        manager = await sync_to_async(self.manager)()
+        self.client.force_authenticate(user=manager)
+        url = reverse('sales-export', kwargs={'dataset': 'sale-items', 'fmt': 'csv'})
+        expected = await sync_to_async(lambda: b''.join(self.client.get(url).streaming_content))()
+        with self.settings(ROOT_URLCONF='grocery_pos_backend.asgi_urls'):
+            response = await self.async_client.get(
+                url, headers={'Authorization': f'Bearer {AccessToken.for_user(manager)}'})
+        self.assertTrue(response.is_async)
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), expected)
+
+
+class BatchSaleTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='terminal', password='testpass', role='cashier', name='Terminal', email='terminal@example.com')
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name='Snacks')
+        self.chips = Product.objects.create(name='Chips', sku='CH1', category=category, price=2, cost=1)
+        self.soda = Product.objects.create(name='Soda', sku='SO1', category=category, price=3, cost=1)
+        Inventory.objects.create(product=self.chips, quantity=5)
+        Inventory.objects.create(product=self.soda, quantity=10)
+
+    def entry(self, key, *lines, **extra):
+        return {
+            'idempotency_key': key,
+            'items': [{'product_id': product.id, 'quantity': quantity} for product, quantity in lines],
+            'payment_method': 'cash',
+            **extra,
+        }
+
+    def test_batch_ingestion_is_idempotent(self):
+        yesterday = timezone.now() - timedelta(days=1)
+        sales = [
+            self.entry('t1-1', (self.chips, 2), (self.soda, 1), sale_date=yesterday.isoformat()),
+            self.entry('t1-2', (self.chips, 3), customer={'name': 'Ann', 'email': 'ann@example.com'}),
+            self.entry('t1-3', (self.chips, 1)),
+            self.entry('t1-4', (self.soda, 1), payment_method='barter'),
+            self.entry('t1-1', (self.chips, 2)),
+            self.entry('t1-5', (self.soda, 1), discount_amount='1.00'),
+        ]
+        response = self.client.post(reverse('sale-batch'), {'sales': sales}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['created'], response.data['duplicates'], response.data['rejected']), (2, 1, 3))
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['created', 'created', 'rejected', 'rejected', 'duplicate', 'rejected'])
+        self.assertIn('Insufficient stock for Chips. Only 0 available.', results[2]['errors']['items'])
+        self.assertIn('discount_amount', results[5]['errors'])
+        self.assertEqual(results[4]['sale_id'], results[0]['sale_id'])
+
+        self.assertEqual(Inventory.objects.get(product=self.chips).quantity, 0)
+        self.assertEqual(Inventory.objects.get(product=self.soda).quantity, 9)
+        first = Sale.objects.get(pk=results[0]['sale_id'])
+        self.assertEqual((first.total_amount, first.sale_date.date()), (7, yesterday.date()))
+        self.assertEqual(Sale.objects.get(pk=results[1]['sale_id']).customer.email, 'ann@example.com')
+        self.assertEqual(Receipt.objects.filter(sale__idempotency_key__startswith='t1-').count(), 2)
+        self.assertEqual(
+            sorted(InventoryTransaction.objects.filter(transaction_type='sale').values_list('reference_id', 'quantity_change')),
+            sorted([(first.id, -2), (first.id, -1), (results[1]['sale_id'], -3)]),
+        )
+        self.assertEqual(SalesRollup.objects.filter(grain='day').aggregate(total=Sum('units'))['total'], 6)
+
+        with CaptureQueriesContext(connection) as ctx:
+            replay = self.client.post(reverse('sale-batch'), {'sales': sales[:2]}, format='json')
+        self.assertEqual([r['status'] for r in replay.data['results']], ['duplicate', 'duplicate'])
+        self.assertLessEqual(len(ctx.captured_queries), 6)
+        self.assertEqual(Sale.objects.count(), 2)
+
+    def test_repeat_of_a_rejected_sale_is_rejected(self):
+        sales = [self.entry('t2-1', (self.chips, 9)), self.entry('t2-1', (self.chips, 1))]
+        response = self.client.post(reverse('sale-batch'), {'sales': sales}, format='json')
+        self.assertEqual((response.data['created'], response.data['duplicates'], response.data['rejected']), (0, 0, 2))
+        first, repeat = response.data['results']
+        self.assertEqual(repeat, first)
+        self.assertIn('Insufficient stock for Chips. Only 5 available.', repeat['errors']['items'])
+
+    def test_batch_requires_sales_list(self):
+        response = self.client.post(reverse('sale-batch'), {'sales': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class GenerateDatasetTestCase(APITestCase):
+    def test_generates_consistent_history(self):
+        call_command(
+            'generate_dataset', categories=3, products=40, suppliers=3, customers=5, cashiers=2,
+            sales=60, days=5, seed=1, chunk_size=25, stdout=StringIO()
+        )
+        self.assertEqual(Product.objects.count(), 40)
+        self.assertEqual(Sale.objects.count(), 60)
+        self.assertEqual(Receipt.objects.count(), 60)
+        self.assertLess(Sale.objects.latest('sale_date').sale_date.date(), timezone.localdate())
+        sold = SaleItem.objects.exclude(sale__payment_status='cancelled').aggregate(total=Sum('quantity'))['total']
+        rolled = SalesRollup.objects.filter(grain='day').aggregate(total=Sum('units'))['total']
+        self.assertEqual(sold, rolled)
+        self.assertEqual(InventorySummary.objects.totals(), InventorySummary.objects.compute())
+
+
+class ProductScanTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        scan_cache.local_cache.clear()
+        self.user = User.objects.create_user(username='scanner', password='testpass', role='cashier', name='Scanner', email='scanner@example.com')
+        self.client.force_authenticate(user=self.user)
+        self.product = Product.objects.create(
+            name='Milk', sku='MILK1', barcode='4800001', price=3, cost=2, tax_rate=5
+        )
+        self.inventory = Inventory.objects.create(product=self.product, quantity=20)
+
+    def scan(self, code):
+        return self.client.get(reverse('product-scan', kwargs={'code': code}))
+
+    def test_scan_is_served_from_cache(self):
+        with self.assertNumQueries(1):
+            response = self.scan('4800001')
+        self.assertEqual(response.data['name'], 'Milk')
+        self.assertEqual(response.data['stock_quantity'], 20)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.scan('4800001').data['id'], self.product.id)
+            self.assertEqual(self.scan('MILK1').data['id'], self.product.id)
+
+    def test_scan_unknown_code(self):
+        self.assertEqual(self.scan('nope').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_product_save_invalidates_cache(self):
+        self.scan('4800001')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = 4
+            self.product.barcode = '4800002'
+            self.product.save()
+        self.assertEqual(self.scan('4800001').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.scan('4800002').data['price'], '4.00')
+
+    def test_stock_decrement_invalidates_cache(self):
+        from django.db import transaction
+        self.scan('4800001')
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Inventory.objects.decrement_stock({self.product.id: 3})
+        self.assertEqual(self.scan('4800001').data['stock_quantity'], 17)
+
+    def test_invalidation_during_a_miss_is_not_cached_over(self):
+        matching = scan_cache._matching
+
+        def racing(code):
+            matches = list(matching(code))
+            # A price change commits after the miss has read the product.
+            Product.objects.filter(pk=self.product.pk).update(price=4)
+            scan_cache.invalidate([self.product.pk])
+            return matches
+
+        with mock.patch.object(scan_cache, '_matching', racing):
+            self.assertEqual(self.scan('4800001').data['price'], '3.00')
+        self.assertEqual(self.scan('4800001').data['price'], '4.00')
+
+    def test_warm_loads_every_product(self):
+        self.assertEqual(scan_cache.warm(), 1)
+        # Only the shared tier is warmed; worker-local entries expire within seconds anyway.
+        self.assertIsNone(scan_cache.local_cache.get(scan_cache.code_key('MILK1')))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.scan('MILK1').status_code, status.HTTP_200_OK)
+
+    def test_warm_on_boot_is_opt_in_and_runs_once(self):
+        with mock.patch.object(scan_cache, 'warm', return_value=1) as warm:
+            self.assertIsNone(scan_cache.warm_on_boot())
+            with self.settings(SCAN_CACHE_WARM_ON_BOOT=True):
+                scan_cache.warm_on_boot().join()
+                # A second worker booting within the cache timeout skips it.
+                self.assertIsNone(scan_cache.warm_on_boot())
+        warm.assert_called_once_with()
@@ -2,14 +2,22 @@
 from django.urls import path
 from .views import (
     ProductListView,
+    ProductScanView,
     CreateSaleView,
+    BatchSaleView,
     ReceiptDetailView,
-    CustomerCreateView
+    CustomerCreateView,
+    SalesReportView,
+    ExportView
 )
 
 urlpatterns = [
     path('products/', ProductListView.as_view(), name='products'),
+    path('products/scan/<str:code>/', ProductScanView.as_view(), name='product-scan'),
     path('create/', CreateSaleView.as_view(), name='create-sale'),
+    path('batch/', BatchSaleView.as_view(), name='sale-batch'),
     path('<int:sale_id>/receipt/', ReceiptDetailView.as_view(), name='sale-receipt'),
     path('customers/create/', CustomerCreateView.as_view(), name='create-customer'),
+    path('reports/', SalesReportView.as_view(), name='sales-report'),
+    path('exports/<slug:dataset>.<slug:fmt>', ExportView.as_view(), name='sales-export'),
 ]
\ No newline at end of file
@@ -1,47 +1,74 @@
 # views.py
-from django.forms import ValidationError
+from rest_framework.exceptions import ValidationError
 from rest_framework import generics, status
+from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import Sale, SaleItem, Receipt, Customer
+from .models import Sale, SaleItem, Receipt, Customer, SalesRollup
+from . import batch, exports, receipts, rollups
 from .serializers import (
     ProductSerializer, 
     SaleSerializer, 
-    ReceiptSerializer,
     CustomerSerializer
 )
-from products.models import Inventory, Product
-from django.shortcuts import get_object_or_404
+from products.models import Inventory, InsufficientStock, Product
+from products import scan_cache, search
+from users.permissions import IsManager
+from django.conf import settings
 from django.db import transaction
-import random
-import string
-from datetime import datetime
+from django.db.models import Case, Value, When
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from api import numbering
+from datetime import date, timedelta
+from collections import Counter, defaultdict
+from functools import partial
 
 class ProductListView(generics.ListAPIView):
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('inventory')
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        queryset = super().get_queryset()
-        search_query = self.request.query_params.get('search', None)
-        barcode = self.request.query_params.get('barcode', None)
-        
+        return self.filter_products(
+            super().get_queryset(),
+            self.request.query_params.get('search', None),
+            self.request.query_params.get('barcode', None)
+        )
+    
+    @staticmethod
+    def filter_products(queryset, search_query, barcode):
         if search_query:
-            queryset = queryset.filter(name__icontains=search_query)
+            # Ranked, index-backed search instead of a sequential icontains scan
+            ids = [p.id for p in search.search_products(search_query, limit=100)]
+            if not ids:
+                return queryset.none()
+            queryset = queryset.filter(id__in=ids).order_by(
+                Case(*[When(id=pk, then=Value(rank)) for rank, pk in enumerate(ids)])
+            )
         if barcode:
             queryset = queryset.filter(barcode=barcode)
         
         return queryset
 
+class ProductScanView(APIView):
+    """Resolve a scanned barcode or SKU to a product through the two-tier scan cache."""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, code):
+        product = scan_cache.lookup(code)
+        if product is None:
+            return Response({"detail": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(product)
+
 class CreateSaleView(generics.CreateAPIView):
     serializer_class = SaleSerializer
     permission_classes = [IsAuthenticated]
     
     def generate_invoice_number(self):
-        date_str = datetime.now().strftime("%Y%m%d")
-        rand_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        return f"INV-{date_str}-{rand_str}"
+        # Sequential per store and register (X-Register-Id header); no collisions to retry
+        return numbering.next_invoice_number(self.request.headers.get('X-Register-Id'))
     
     @transaction.atomic
     def perform_create(self, serializer):
@@ -54,61 +81,142 @@ class CreateSaleView(generics.CreateAPIView):
             payment_status='paid'
         )
         
-        # Update inventory quantities
-        for item in sale.items.all():
-            product = item.product
-            try:
-                inventory = product.inventory
-                inventory.quantity -= item.quantity
-                if inventory.quantity < 0:
-                    raise ValidationError(f"Insufficient stock for {product.name}")
-                inventory.save()
-            except Inventory.DoesNotExist:
-                raise ValidationError(f"No inventory record found for {product.name}")
+        items = serializer.created_items
+        
+        # Fold the sale into the reporting rollups
+        rollups.record_sale(sale, items)
         
-        # Create receipt
-        receipt_content = self.generate_receipt_content(sale)
+        # Store the receipt as structured data; it is rendered when read
         Receipt.objects.create(
             sale=sale,
-            receipt_number=f"RCPT-{invoice_number}",
-            receipt_content=receipt_content
+            receipt_number=receipts.receipt_number(sale),
+            receipt_data=receipts.build(sale, items)
         )
+        
+        # Decrement stock last so the row locks are held as briefly as possible
+        self.decrement_inventory(sale, items)
     
-    def generate_receipt_content(self, sale):
-        items = []
-        for item in sale.items.all():
-            items.append({
-                'name': item.product.name,
-                'quantity': item.quantity,
-                'unit_price': float(item.unit_price),
-                'total': float(item.total_price)
+    def decrement_inventory(self, sale, items):
+        """Decrement stock for every product in `items` with one locked, conditional update."""
+        quantities = defaultdict(int)
+        products = {}
+        for item in items:
+            quantities[item.product_id] += item.quantity
+            products[item.product_id] = item.product
+        try:
+            Inventory.objects.decrement_stock(
+                quantities,
+                transaction_type='sale',
+                reference_id=sale.id,
+                user=sale.user,
+                notes=f"Sale {sale.invoice_number}",
+            )
+        except InsufficientStock as exc:
+            raise ValidationError({
+                'items': [
+                    f"Insufficient stock for {products[product_id].name}. Only {available} available."
+                    for product_id, available in exc.shortages.items()
+                ]
             })
+        for product_id, quantity in quantities.items():
+            products[product_id].inventory.quantity -= quantity
+    
+
+class BatchSaleView(APIView):
+    """Ingest sales queued by an offline terminal.
+    
+    Body: {"sales": [{"idempotency_key", "items": [{"product_id", "quantity", ...}],
+    "payment_method", "customer"?, "sale_date"?}, ...]}. A non-zero
+    "discount_amount" is rejected, as at checkout.
+    Each sale gets a result: created, duplicate (key already ingested, with the
+    existing sale) or rejected (with errors). Replaying a batch is safe.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        entries = request.data.get('sales') if isinstance(request.data, dict) else None
+        if not isinstance(entries, list) or not entries:
+            raise ValidationError({"sales": "Expected a non-empty list of sales."})
+        max_size = getattr(settings, 'SALES_BATCH_MAX_SIZE', 500)
+        if len(entries) > max_size:
+            raise ValidationError({"sales": f"At most {max_size} sales per batch."})
         
-        receipt_data = {
-            'invoice_number': sale.invoice_number,
-            'date': sale.sale_date.strftime("%Y-%m-%d %H:%M:%S"),
-            'cashier': sale.user.get_full_name() or sale.user.username,
-            'customer': sale.customer.name if sale.customer else "Walk-in Customer",
-            'items': items,
-            'subtotal': float(sale.subtotal),
-            'tax_amount': float(sale.tax_amount),
-            'total_amount': float(sale.total_amount),
-            'payment_method': sale.get_payment_method_display(),
-        }
-        
-        return str(receipt_data)
-class ReceiptDetailView(generics.RetrieveAPIView):
-    queryset = Receipt.objects.all()
-    serializer_class = ReceiptSerializer
+        register = request.headers.get('X-Register-Id')
+        results = batch.ingest(entries, request.user, iter(partial(numbering.next_invoice_number, register), None))
+        counts = Counter(result['status'] for result in results)
+        return Response({
+            "created": counts[batch.CREATED],
+            "duplicates": counts[batch.DUPLICATE],
+            "rejected": counts[batch.REJECTED],
+            "results": results,
+        })
+
+class ReceiptDetailView(APIView):
+    """Reprint a sale's receipt from its stored snapshot (cached; at most one query)."""
     permission_classes = [IsAuthenticated]
-    lookup_field = 'sale_id'
-    lookup_url_kwarg = 'sale_id'
     
-    def get_object(self):
-        sale_id = self.kwargs.get('sale_id')
-        return get_object_or_404(Receipt, sale__id=sale_id)
+    def get(self, request, sale_id):
+        payload = receipts.for_sale(sale_id)
+        if payload is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(payload)
 
 class CustomerCreateView(generics.CreateAPIView):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
-    permission_classes = [IsAuthenticated]
\ No newline at end of file
+    permission_classes = [IsAuthenticated]
+
+class SalesReportView(APIView):
+    """Revenue, tax and margin answered from the pre-aggregated sales rollups.
+    
+    Query params: start/end (YYYY-MM-DD, inclusive, default the last 30 days),
+    grain (day or hour) and group_by (comma-separated: period, product,
+    category, cashier, payment_method, tax_rate).
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        params = request.query_params
+        try:
+            end = date.fromisoformat(params['end']) if params.get('end') else timezone.localdate()
+            start = date.fromisoformat(params['start']) if params.get('start') else end - timedelta(days=29)
+        except ValueError:
+            raise ValidationError({"detail": "start and end must be dates in YYYY-MM-DD format."})
+        grain = params.get('grain', 'day')
+        if grain not in dict(SalesRollup.GRAINS):
+            raise ValidationError({"grain": "Must be 'day' or 'hour'."})
+        group_by = [g for g in params.get('group_by', '').split(',') if g]
+        unknown = [g for g in group_by if g not in rollups.GROUP_FIELDS]
+        if unknown:
+            raise ValidationError({"group_by": f"Unknown dimension(s): {', '.join(unknown)}"})
+        
+        data = rollups.report(start, end, grain=grain, group_by=group_by)
+        return Response({"start": start, "end": end, "grain": grain, "group_by": group_by, **data})
+
+class ExportView(APIView):
+    """Stream a dataset (sales, sale-items or inventory) as CSV or NDJSON.
+    
+    Optional query params start/end (YYYY-MM-DD, inclusive) limit the rows by
+    sale date, or by last update for inventory. Managers and admins only.
+    """
+    permission_classes = [IsAuthenticated, IsManager]
+    
+    def get(self, request, dataset, fmt):
+        if dataset not in exports.DATASETS or fmt not in exports.FORMATS:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            start, end = (
+                date.fromisoformat(request.query_params[name]) if request.query_params.get(name) else None
+                for name in ('start', 'end')
+            )
+        except ValueError:
+            raise ValidationError({"detail": "start and end must be dates in YYYY-MM-DD format."})
+        
+        # Under ASGI a sync iterator would be buffered whole before sending.
+        stream = exports.aexport if isinstance(request._request, ASGIRequest) else exports.export
+        response = StreamingHttpResponse(
+            stream(dataset, fmt, start=start, end=end),
+            content_type=exports.FORMATS[fmt]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+        return response
@@ -0,0 +1,53 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from products.importer import read_rows
+from suppliers.models import Supplier
+from suppliers.price_lists import PriceListError, PriceListSync
+
+class Command(BaseCommand):
+    help = (
+        "Sync a supplier's full CSV or JSON Lines price list into its product links, "
+        "writing only the rows that changed. Safe to re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('supplier_id', type=int)
+        parser.add_argument('path', help='Price list file. Columns: sku, supplier_sku, unit_cost, '
+                                         'lead_time_days, available')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--rejects', help='Write rejected rows (line, sku, reason) to this CSV file')
+
+    def handle(self, *args, **options):
+        try:
+            supplier = Supplier.objects.get(pk=options['supplier_id'])
+        except Supplier.DoesNotExist:
+            raise CommandError(f"Supplier {options['supplier_id']} does not exist")
+        try:
+            open(options['path']).close()
+        except OSError as exc:
+            raise CommandError(f"Cannot read {options['path']}: {exc}")
+
+        sync = PriceListSync(supplier)
+        started = time.perf_counter()
+        try:
+            counts = sync.run(read_rows(options['path'], options['format']))
+        except PriceListError as exc:
+            raise CommandError(str(exc))
+
+        if options['rejects']:
+            with open(options['rejects'], 'w', newline='') as rejects_file:
+                writer = csv.writer(rejects_file)
+                writer.writerow(['line', 'sku', 'reason'])
+                writer.writerows(sync.rejects)
+        else:
+            for line_number, sku, reason in sync.rejects[:20]:
+                self.stderr.write(f'line {line_number} ({sku or "no sku"}): {reason}')
+
+        style = self.style.WARNING if counts['rejected'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f"Synced {counts['rows']} rows for {supplier.name} in {time.perf_counter() - started:.1f}s: "
+            f"{counts['inserted']} inserted, {counts['updated']} updated, {counts['deleted']} deleted, "
+            f"{counts['unchanged']} unchanged, {counts['rejected']} rejected."
+        ))
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-18 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suppliers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productsupplier',
+            name='is_available',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='productsupplier',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
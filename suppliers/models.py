@@ -24,6 +24,9 @@ class ProductSupplier(models.Model):
     )
     supplier_sku = models.CharField(max_length=50, blank=True, null=True)
     lead_time_days = models.IntegerField(default=7)
+    # From the supplier's price list; purchase orders fall back to Product.cost when unset.
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    is_available = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -0,0 +1,202 @@
+"""
+Supplier price-list sync.
+
+A supplier's price list is a full file: one row per product it supplies, keyed
+by our `sku`, with any of supplier_sku, unit_cost, lead_time_days and
+available. Each row's fingerprint (a hash of the columns it carries) is
+compared with the fingerprint of the same columns on the supplier's existing
+ProductSupplier row, and only the difference is written in one transaction:
+new products are bulk-inserted, changed rows bulk-updated and products missing
+from the file unlinked. Re-sending an unchanged file writes nothing.
+
+A rejected row never unlinks its product: the existing link is kept as it is.
+"""
+import hashlib
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from products.models import Product
+from .models import ProductSupplier, Supplier
+
+# File column -> ProductSupplier field, in fingerprint order.
+COLUMNS = {
+    "supplier_sku": "supplier_sku",
+    "unit_cost": "unit_cost",
+    "lead_time_days": "lead_time_days",
+    "available": "is_available",
+}
+TRUE = {"1", "true", "yes", "y"}
+FALSE = {"0", "false", "no", "n"}
+MAX_COST = Decimal("99999999.99")
+
+
+class PriceListError(Exception):
+    """The file cannot be applied as a whole."""
+
+
+def _unit_cost(value):
+    try:
+        cost = Decimal(value).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ValueError("unit_cost must be a number")
+    if not 0 <= cost <= MAX_COST:
+        raise ValueError("unit_cost is out of range")
+    return cost
+
+
+def _lead_time(value):
+    try:
+        days = int(value)
+    except ValueError:
+        raise ValueError("lead_time_days must be a whole number")
+    if not 0 <= days <= 365:
+        raise ValueError("lead_time_days must be between 0 and 365")
+    return days
+
+
+def _flag(value):
+    if value.lower() in TRUE:
+        return True
+    if value.lower() in FALSE:
+        return False
+    raise ValueError("available must be yes or no")
+
+
+def _normalize(row):
+    return {str(key).strip().lower(): value for key, value in (row or {}).items() if key}
+
+
+def clean_row(row):
+    """Return {"sku", <fields present>} from a raw file row, or raise ValueError."""
+    row = _normalize(row)
+    sku = str(row.get("sku") or "").strip()
+    if not sku:
+        raise ValueError("sku is required")
+    cleaned = {"sku": sku}
+    for column, field in COLUMNS.items():
+        if column not in row:
+            continue
+        value = "" if row[column] is None else str(row[column]).strip()
+        if field == "supplier_sku":
+            if len(value) > 50:
+                raise ValueError("supplier_sku is longer than 50 characters")
+            cleaned[field] = value or None
+        elif not value:
+            # A blank cell leaves the current value alone.
+            continue
+        elif field == "unit_cost":
+            cleaned[field] = _unit_cost(value)
+        elif field == "lead_time_days":
+            cleaned[field] = _lead_time(value)
+        else:
+            cleaned[field] = _flag(value)
+    return cleaned
+
+
+def fingerprint(values, fields):
+    """Hash of `fields` of `values`; equal fingerprints mean nothing to write."""
+    canonical = "\x1f".join(
+        f"{field}={'' if values.get(field) is None else values[field]}" for field in fields
+    )
+    return hashlib.md5(canonical.encode()).hexdigest()
+
+
+class PriceListSync:
+    """Apply one supplier's full price list to its ProductSupplier rows."""
+
+    def __init__(self, supplier, chunk_size=2000):
+        self.supplier = supplier
+        self.chunk_size = chunk_size
+        self.counts = {"rows": 0, "inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "rejected": 0}
+        # (line_number, sku, reason) for every rejected row.
+        self.rejects = []
+
+    def reject(self, line_number, sku, reason):
+        self.counts["rejected"] += 1
+        self.rejects.append((line_number, sku, reason))
+
+    def product_ids(self, skus):
+        skus = list(skus)
+        found = {}
+        for start in range(0, len(skus), self.chunk_size):
+            found.update(Product.objects.filter(sku__in=skus[start:start + self.chunk_size]).values_list("sku", "id"))
+        return found
+
+    def run(self, rows):
+        """Sync from `rows` ((line_number, row, error) as read_rows yields them); return the counts."""
+        incoming, rejected_skus = {}, set()
+        for line_number, row, error in rows:
+            self.counts["rows"] += 1
+            if error is None:
+                try:
+                    cleaned = clean_row(row)
+                except ValueError as exc:
+                    error = str(exc)
+                else:
+                    # A later row for the same SKU wins; the earlier one is reported so the counts add up.
+                    superseded = incoming.get(cleaned["sku"])
+                    if superseded is not None:
+                        self.reject(superseded[0], cleaned["sku"], f"duplicate sku, superseded by line {line_number}")
+                    incoming[cleaned["sku"]] = (line_number, cleaned)
+                    continue
+            sku = str(_normalize(row).get("sku") or "").strip()
+            rejected_skus.add(sku)
+            self.reject(line_number, sku, error)
+
+        product_ids = self.product_ids(set(incoming) | rejected_skus)
+        for sku, (line_number, row) in list(incoming.items()):
+            if sku not in product_ids:
+                del incoming[sku]
+                rejected_skus.add(sku)
+                self.reject(line_number, sku, f"unknown sku {sku!r}")
+        kept = {product_ids[sku] for sku in rejected_skus if sku in product_ids}
+
+        with transaction.atomic():
+            # Two syncs of one supplier queue up instead of diffing against each other's writes.
+            list(Supplier.objects.select_for_update().filter(pk=self.supplier.pk).values_list("pk"))
+            existing = {
+                values["product_id"]: values
+                for values in ProductSupplier.objects.filter(supplier=self.supplier)
+                .values("id", "product_id", *COLUMNS.values()).iterator(chunk_size=self.chunk_size)
+            }
+            if not incoming and len(existing) > len(kept):
+                raise PriceListError("The price list has no usable rows; refusing to unlink every product.")
+
+            now = timezone.now()
+            inserts, updates, changed_fields = [], [], set()
+            for sku, (line_number, row) in incoming.items():
+                product_id = product_ids[sku]
+                fields = [field for field in COLUMNS.values() if field in row]
+                current = existing.pop(product_id, None)
+                if current is None:
+                    inserts.append(ProductSupplier(
+                        product_id=product_id, supplier=self.supplier, **{field: row[field] for field in fields}
+                    ))
+                elif fingerprint(row, fields) == fingerprint(current, fields):
+                    self.counts["unchanged"] += 1
+                else:
+                    # Start from the current values: bulk_update writes every changed field on every row.
+                    link = ProductSupplier(
+                        id=current["id"], product_id=product_id, supplier=self.supplier,
+                        **{field: current[field] for field in COLUMNS.values()}, updated_at=now,
+                    )
+                    for field in fields:
+                        setattr(link, field, row[field])
+                    updates.append(link)
+                    changed_fields.update(fields)
+            stale = [values["id"] for product_id, values in existing.items() if product_id not in kept]
+
+            ProductSupplier.objects.bulk_create(inserts, batch_size=self.chunk_size)
+            if updates:
+                ProductSupplier.objects.bulk_update(
+                    updates, [*sorted(changed_fields), "updated_at"], batch_size=self.chunk_size
+                )
+            for start in range(0, len(stale), self.chunk_size):
+                ProductSupplier.objects.filter(id__in=stale[start:start + self.chunk_size]).delete()
+
+        self.counts["inserted"] = len(inserts)
+        self.counts["updated"] = len(updates)
+        self.counts["deleted"] = len(stale)
+        return self.counts
@@ -1,3 +1,94 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from products.models import Product
+from users.models import User
+from .models import ProductSupplier, Supplier
+
+
+def price_list(rows, name='prices.csv'):
+    lines = ['sku,supplier_sku,unit_cost,lead_time_days,available'] + [','.join(row) for row in rows]
+    return SimpleUploadedFile(name, '\n'.join(lines).encode(), content_type='text/csv')
+
+
+class SupplierPriceListTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='testpass', role='manager', name='Buyer', email='buyer@example.com')
+        self.client.force_authenticate(user=self.user)
+        self.supplier = Supplier.objects.create(name='Fresh Farms', contact_person='F', phone='1', email='f@example.com', address='x')
+        other = Supplier.objects.create(name='Other', contact_person='O', phone='2', email='o@example.com', address='y')
+        self.products = [Product.objects.create(name=f'Item {i}', sku=f'ITEM{i}', price=4, cost=2) for i in range(5)]
+        ProductSupplier.objects.create(product=self.products[0], supplier=other, supplier_sku='O-0')
+        self.url = reverse('supplier-price-list', kwargs={'supplier_id': self.supplier.pk})
+        self.rows = [(f'ITEM{i}', f'FF-{i}', f'1.{i}0', '3', 'yes') for i in range(4)]
+
+    def links(self):
+        return {
+            link.product.sku: (link.supplier_sku, link.unit_cost, link.lead_time_days, link.is_available)
+            for link in ProductSupplier.objects.filter(supplier=self.supplier).select_related('product')
+        }
+
+    def test_cashiers_cannot_sync(self):
+        cashier = User.objects.create_user(username='till', password='testpass', role='cashier', name='Till', email='till@example.com')
+        self.client.force_authenticate(user=cashier)
+        response = self.client.post(self.url, {'file': price_list(self.rows)}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(ProductSupplier.objects.filter(supplier=self.supplier).exists())
+
+    def test_sync_writes_only_the_difference(self):
+        response = self.client.post(self.url, {'file': price_list(self.rows)}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['inserted'], response.data['updated'], response.data['deleted']), (4, 0, 0))
+        self.assertEqual(self.links()['ITEM1'], ('FF-1', Decimal('1.10'), 3, True))
+
+        # Unchanged file: read the links, write nothing.
+        with self.assertNumQueries(6):
+            response = self.client.post(self.url, {'file': price_list(self.rows)}, format='multipart')
+        self.assertEqual(response.data['unchanged'], 4)
+
+        rows = [
+            ('ITEM0', 'FF-0', '1.00', '3', 'yes'),   # unchanged ("1.00" == 1.0)
+            ('ITEM1', 'FF-1', '1.25', '', 'no'),     # new price and availability; lead time kept
+            ('ITEM2', 'FF-2', 'cheap', '3', 'yes'),  # rejected: the link is kept as it was
+            ('ITEM4', 'FF-4', '9.99', '5', 'yes'),   # new link
+            ('NOPE', 'FF-X', '1.00', '1', 'yes'),    # unknown product
+            ('ITEM4', 'FF-4', '9.99', '5', 'yes'),   # repeated: supersedes line 5
+        ]                                            # ITEM3 missing: unlinked
+        response = self.client.post(self.url, {'file': price_list(rows)}, format='multipart')
+        self.assertEqual(
+            {key: response.data[key] for key in ('rows', 'inserted', 'updated', 'deleted', 'unchanged', 'rejected')},
+            {'rows': 6, 'inserted': 1, 'updated': 1, 'deleted': 1, 'unchanged': 1, 'rejected': 3},
+        )
+        self.assertEqual(
+            [(reject['line'], reject['sku']) for reject in response.data['rejects']],
+            [(4, 'ITEM2'), (5, 'ITEM4'), (6, 'NOPE')],
+        )
+        self.assertEqual(response.data['rejects'][1]['reason'], 'duplicate sku, superseded by line 7')
+        self.assertEqual(self.links(), {
+            'ITEM0': ('FF-0', Decimal('1.00'), 3, True),
+            'ITEM1': ('FF-1', Decimal('1.25'), 3, False),
+            'ITEM2': ('FF-2', Decimal('1.20'), 3, True),
+            'ITEM4': ('FF-4', Decimal('9.99'), 5, True),
+        })
+        # Other suppliers' links are untouched.
+        self.assertEqual(ProductSupplier.objects.exclude(supplier=self.supplier).count(), 1)
+
+    def test_jsonl_and_empty_files(self):
+        jsonl = SimpleUploadedFile('prices.jsonl', b'{"sku": "ITEM0", "unit_cost": 2.5, "available": true}\n')
+        response = self.client.post(self.url, {'file': jsonl}, format='multipart')
+        self.assertEqual(response.data['inserted'], 1)
+        self.assertEqual(self.links()['ITEM0'], (None, Decimal('2.50'), 7, True))
+
+        response = self.client.post(self.url, {'file': price_list([])}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(self.links()), 1)
+
+        response = self.client.post(self.url, {}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        missing = reverse('supplier-price-list', kwargs={'supplier_id': 999})
+        response = self.client.post(missing, {'file': price_list(self.rows)}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
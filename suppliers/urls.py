@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .views import SupplierPriceListView
+
+urlpatterns = [
+    path('<int:supplier_id>/price-list/', SupplierPriceListView.as_view(), name='supplier-price-list'),
+]
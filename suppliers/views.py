@@ -1,3 +1,52 @@
-from django.shortcuts import render
+import io
 
-# Create your views here.
+from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from products.importer import file_format, read_stream
+from users.permissions import IsManager
+from .models import Supplier
+from .price_lists import PriceListError, PriceListSync
+
+# Rejected rows listed in the response; the counts cover all of them.
+MAX_REJECTS_SHOWN = 100
+
+
+class SupplierPriceListView(APIView):
+    """Sync a supplier's full price list into its product links.
+
+    Multipart upload: "file" (CSV or JSON Lines, by extension or "format").
+    Columns: sku, supplier_sku, unit_cost, lead_time_days, available.
+    Products missing from the file are unlinked from the supplier. Managers only.
+    """
+    permission_classes = [IsAuthenticated, IsManager]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, supplier_id):
+        supplier = get_object_or_404(Supplier, pk=supplier_id)
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({"file": ["A price list file is required."]})
+        fmt = request.data.get('format')
+        if fmt not in (None, '', 'csv', 'jsonl'):
+            raise ValidationError({"format": ["Expected csv or jsonl."]})
+
+        sync = PriceListSync(supplier)
+        handle = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            counts = sync.run(read_stream(handle, file_format(upload.name, fmt or None)))
+        except UnicodeDecodeError:
+            raise ValidationError({"file": ["The file is not UTF-8 text."]})
+        except PriceListError as exc:
+            raise ValidationError({"file": [str(exc)]})
+        return Response({
+            **counts,
+            "rejects": [
+                {"line": line_number, "sku": sku, "reason": reason}
+                for line_number, sku, reason in sync.rejects[:MAX_REJECTS_SHOWN]
+            ],
+        })
@@ -0,0 +1,125 @@
+"""
+JWT authentication without a user query on every request.
+
+simplejwt's JWTAuthentication loads the token's user from the database on each
+call. CachedJWTAuthentication keeps the user's fields (without the password
+hash) in the shared cache for AUTH_USER_CACHE_TIMEOUT seconds and rebuilds the
+instance from there.
+
+Saving or deleting a user bumps the user's generation number in the cache
+once the transaction commits. Entries carry the generation that was current
+before the user was read, so an entry written by a read that raced the save
+no longer matches and is never served. Deactivation, role and password
+changes therefore apply to the next request. Queryset .update() calls bypass
+the signal: call invalidate() after them.
+
+That only holds when every worker shares the cache. AUTH_USER_CACHE_ENABLED
+(on when REDIS_URL is set) gates the cache; without it this class behaves
+exactly like JWTAuthentication.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import User
+
+CACHE_TIMEOUT = getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 60)
+# The password hash stays out of the cache; it is loaded on access like any deferred field.
+FIELDS = [field.attname for field in User._meta.concrete_fields if field.attname != "password"]
+
+
+def enabled():
+    return getattr(settings, "AUTH_USER_CACHE_ENABLED", False)
+
+
+def cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def generation_key(user_id):
+    return f"auth:user:{user_id}:generation"
+
+
+def _current(values, user_id):
+    """The cached entry for `user_id` if it belongs to the current generation, and that generation."""
+    generation = values.get(generation_key(user_id), 0)
+    entry = values.get(cache_key(user_id))
+    return (entry if entry is not None and entry[0] == generation else None), generation
+
+
+def _bump(user_id):
+    if not cache.add(generation_key(user_id), 1, None):
+        cache.incr(generation_key(user_id))
+    cache.delete(cache_key(user_id))
+
+
+def invalidate(user_id):
+    if enabled():
+        transaction.on_commit(lambda: _bump(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if not enabled():
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        entry, generation = _current(cache.get_many([cache_key(user_id), generation_key(user_id)]), user_id)
+        if entry is None:
+            return self._load(validated_token, user_id, generation)
+        return self._from_entry(entry, validated_token)
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views; a cache hit needs no query."""
+        if not enabled():
+            return await sync_to_async(self.authenticate)(request)
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        entry, generation = _current(await cache.aget_many([cache_key(user_id), generation_key(user_id)]), user_id)
+        if entry is None:
+            user = await sync_to_async(self._load)(validated_token, user_id, generation)
+        else:
+            user = self._from_entry(entry, validated_token)
+        return user, validated_token
+
+    def _load(self, validated_token, user_id, generation):
+        """Load the user (the parent runs the lookup and checks) and cache it under `generation`.
+
+        `generation` was read before the user, so a save committing in between
+        leaves this entry behind the bumped generation.
+        """
+        user = super().get_user(validated_token)
+        revoke = get_md5_hash_password(user.password) if api_settings.CHECK_REVOKE_TOKEN else None
+        cache.set(cache_key(user_id), (generation, [getattr(user, name) for name in FIELDS], revoke), CACHE_TIMEOUT)
+        return user
+
+    def _from_entry(self, entry, validated_token):
+        _, values, revoke = entry
+        user = User.from_db(DEFAULT_DB_ALIAS, FIELDS, values)
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != revoke:
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate(getattr(instance, api_settings.USER_ID_FIELD))
@@ -0,0 +1,10 @@
+from rest_framework.permissions import BasePermission
+
+
+class IsManager(BasePermission):
+    """Allow managers and admins; cashiers are refused."""
+    roles = ("manager", "admin")
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and user.role in self.roles)
@@ -1,3 +1,82 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
-# Create your tests here.
+from products.models import Category, Inventory, Product
+from sales.models import Sale
+from users.authentication import cache_key
+from users.models import User
+
+
+@override_settings(AUTH_USER_CACHE_ENABLED=True)
+class CachedJWTAuthenticationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cashier', password='testpass', role='cashier', name='Cashier', email='cashier@example.com')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [q['sql'] for q in ctx.captured_queries if User._meta.db_table in q['sql']]
+
+    def test_user_is_loaded_once(self):
+        self.assertEqual(len(self.user_queries()), 1)
+        self.assertEqual(self.user_queries(), [])
+
+    def test_cached_user_is_usable(self):
+        self.user_queries()
+        product = Product.objects.create(name='Chips', sku='CH1', category=Category.objects.create(name='Snacks'), price=2, cost=1)
+        Inventory.objects.create(product=product, quantity=5)
+        sale = {'idempotency_key': 'u1', 'items': [{'product_id': product.id, 'quantity': 1}], 'payment_method': 'cash'}
+        response = self.client.post(reverse('sale-batch'), {'sales': [sale]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Sale.objects.get(idempotency_key='u1').user, self.user)
+
+    def test_deactivation_revokes_access(self):
+        self.user_queries()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertIsNone(cache.get(cache_key(self.user.pk)))
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_role_change_is_picked_up(self):
+        self.user_queries()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.role = 'manager'
+            self.user.save()
+        self.assertEqual(len(self.user_queries()), 1)
+        _, values, _ = cache.get(cache_key(self.user.pk))
+        self.assertIn('manager', values)
+
+    def test_entry_from_a_read_racing_a_save_is_ignored(self):
+        self.user_queries()
+        # A read that loaded the user before the save commits writes its entry after it.
+        stale = cache.get(cache_key(self.user.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        cache.set(cache_key(self.user.pk), stale)
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(AUTH_USER_CACHE_ENABLED=False)
+    def test_without_a_shared_cache_every_request_loads_the_user(self):
+        self.assertEqual(len(self.user_queries()), 1)
+        self.assertEqual(len(self.user_queries()), 1)
+        self.assertIsNone(cache.get(cache_key(self.user.pk)))
+
+    def test_deleted_user_is_rejected(self):
+        self.user_queries()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)